@@ -0,0 +1,103 @@
+"""Microbenchmarks de repositorios, servicios y serialización con pytest-benchmark.
+
+Uso (desde el directorio ``server``)::
+
+    python -m pytest benchmarks                          # base de datos de 10k logs
+    python -m pytest benchmarks --rows 10000,1000000,10000000
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+
+Cada tamaño se siembra una sola vez con ``src.tools.seed`` en ``.benchmarks/data`` y se reutiliza en las
+siguientes ejecuciones. Los resultados se guardan siempre como JSON en ``.benchmarks/``
+(``--benchmark-autosave``), con el commit actual en el nombre, para que
+``--benchmark-compare`` detecte regresiones respecto a la ejecución anterior.
+"""
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+from pytest_benchmark.utils import get_tag
+from sqlmodel import Session, create_engine, select
+
+from src.core.database import configure_sqlite, engine_options
+from src.models import Habit, User
+from src.tools.seed import SeedOptions, seed
+
+BENCH_PASSWORD = "benchmark-password"
+DAYS_PER_HABIT = 1000
+HABITS_PER_USER = 5
+START_DATE = date(2020, 1, 1)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("habitflow")
+    group.addoption("--rows", default="10000", help="Tamaños de la tabla de logs separados por comas")
+    group.addoption("--bench-data-dir", default=".benchmarks/data", help="Directorio de las bases sembradas")
+
+
+def pytest_configure(config):
+    if not (config.option.benchmark_save or config.option.benchmark_autosave):
+        config.option.benchmark_autosave = get_tag()
+
+
+def pytest_generate_tests(metafunc):
+    if "rows" in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption("rows").split(",")]
+        metafunc.parametrize("rows", sizes, ids=[f"{size}rows" for size in sizes], scope="session")
+
+
+def seed_options(rows: int) -> SeedOptions:
+    """Opciones de `src.tools.seed` que producen al menos `rows` logs (un log por día y hábito)."""
+    return SeedOptions(
+        users=-(-rows // (DAYS_PER_HABIT * HABITS_PER_USER)),
+        habits_per_user=HABITS_PER_USER,
+        days=DAYS_PER_HABIT,
+        end_date=START_DATE + timedelta(days=DAYS_PER_HABIT - 1),
+        missing_rate=0.0,
+        challenges=0,
+        password=BENCH_PASSWORD,
+        seed=rows,
+    )
+
+
+@pytest.fixture(scope="session")
+def seeded_engine(request, rows):
+    data_dir = Path(request.config.getoption("bench_data_dir"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / f"habitflow-{rows}.db"
+    url = f"sqlite:///{path}"
+    engine = configure_sqlite(create_engine(url, **engine_options(url)))
+    if not path.with_suffix(".ready").exists():
+        path.unlink(missing_ok=True)
+        seed(engine, seed_options(rows))
+        path.with_suffix(".ready").touch()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(seeded_engine):
+    """Sesión cuyos commits se deshacen al terminar, para que los benchmarks no alteren la base sembrada.
+
+    `configure_sqlite` deja que SQLAlchemy emita el BEGIN, así que la transacción externa envuelve
+    de verdad los SAVEPOINT de la sesión.
+    """
+    with seeded_engine.connect() as connection:
+        transaction = connection.begin()
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+            yield session
+        transaction.rollback()
+
+
+@pytest.fixture
+def sample(session, rows):
+    """Ids aleatorios (deterministas) de hábitos y usuarios existentes."""
+    habit_ids = session.exec(select(Habit.id).limit(1000)).all()
+    users = session.exec(select(User.id, User.email).limit(1000)).all()
+    return random.Random(0), habit_ids, users
+
+
+@pytest.fixture(autouse=True)
+def record_rows(request):
+    if "rows" in request.fixturenames and "benchmark" in request.fixturenames:
+        request.getfixturevalue("benchmark").extra_info["rows"] = request.getfixturevalue("rows")
@@ -0,0 +1,142 @@
+"""Compara el rendimiento de las rutas de logs de hábitos en modo síncrono y asíncrono.
+
+Uso (desde el directorio ``server``)::
+
+    python -m benchmarks.habit_logs --requests 2000 --concurrency 50
+
+Cada modo usa su propia base de datos SQLite en un directorio temporal; el modo
+asíncrono accede a ella mediante aiosqlite. Se reportan peticiones por segundo y
+latencia p50/p99 de cada ruta.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.config import Config
+from src.core.database import get_async_session, get_session
+from src.models import Habit, User
+from src.server import create_app
+
+
+def build_app(db_path: Path, use_async: bool):
+    url = f"sqlite:///{db_path}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine)
+
+    Config.DB_ASYNC = use_async
+    app = create_app({})
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    async def override_get_async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_async_session] = override_get_async_session
+
+    with Session(engine) as session:
+        user = User(
+            first_name="Bench",
+            last_name="Mark",
+            username=f"bench_{uuid4().hex[:8]}",
+            email=f"{uuid4().hex[:8]}@bench.dev",
+            password="benchmark-password"
+        )
+        session.add(user)
+        session.commit()
+        habit = Habit(user_id=user.id, title="Bench", category="Bench", goal_type="daily", goal_value=1)
+        session.add(habit)
+        session.commit()
+        ids = (str(user.id), str(habit.id))
+    return app, engine, async_engine, ids
+
+
+async def run_phase(client: httpx.AsyncClient, requests: list, concurrency: int) -> dict:
+    latencies = []
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+
+    async def worker():
+        while not queue.empty():
+            method, url, payload = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.request(method, url, json=payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+async def bench_mode(use_async: bool, total: int, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        app, engine, async_engine, (user_id, habit_id) = build_app(Path(tmp) / "bench.db", use_async)
+        transport = httpx.ASGITransport(app=app)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start_day = date(2020, 1, 1)
+            creates = [
+                ("POST", "/api/habits/logs", {
+                    "habit_id": habit_id,
+                    "user_id": user_id,
+                    "log_date": (start_day + timedelta(days=i)).isoformat(),
+                    "progress_value": i % 101,
+                    "status": "pending"
+                })
+                for i in range(total)
+            ]
+            results["POST /habits/logs"] = await run_phase(client, creates, concurrency)
+
+            first_log = (await client.get(f"/api/habits/{habit_id}/logs")).json()[0]["id"]
+            reads = [("GET", f"/api/habits/logs/{first_log}", None)] * total
+            results["GET /habits/logs/{id}"] = await run_phase(client, reads, concurrency)
+
+            updates = [("PATCH", f"/api/habits/logs/{first_log}", {"progress_value": i % 101}) for i in range(total)]
+            results["PATCH /habits/logs/{id}"] = await run_phase(client, updates, concurrency)
+
+            lists = [("GET", f"/api/habits/{habit_id}/logs", None)] * max(1, total // 20)
+            results["GET /habits/{id}/logs"] = await run_phase(client, lists, concurrency)
+        await async_engine.dispose()
+        engine.dispose()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'modo':<6} {'ruta':<26} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for use_async in (False, True):
+        results = asyncio.run(bench_mode(use_async, args.requests, args.concurrency))
+        mode = "async" if use_async else "sync"
+        for route, stats in results.items():
+            print(f"{mode:<6} {route:<26} {stats['rps']:>10.1f} {stats['p50_ms']:>10.2f} {stats['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Mide el throughput de ``POST /api/auth/login`` según el número de procesos de hashing.
+
+Uso (desde el directorio ``server``)::
+
+    python -m benchmarks.login --logins 64 --workers 1 2 4 8
+
+Para cada tamaño de pool se lanzan todos los logins de forma concurrente contra
+una base de datos SQLite en memoria y se reportan logins por segundo y la
+latencia p99. Con bcrypt fuera de los hilos de las peticiones, el throughput
+debería escalar con el número de núcleos disponibles.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from src.core.database import get_session
+from src.core.hashing import password_hasher
+from src.models import User
+from src.server import create_app
+
+PASSWORD = "benchmark-password"
+
+
+async def bench_workers(app, workers: int, logins: int) -> dict:
+    password_hasher.configure(workers=workers, max_pending=logins)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        payload = {"email": "bench@bench.dev", "password": PASSWORD}
+        # Calienta el pool para no medir el arranque de los procesos
+        await asyncio.gather(*(client.post("/api/auth/login", json=payload) for _ in range(workers)))
+
+        latencies = []
+
+        async def login():
+            start = time.perf_counter()
+            response = await client.post("/api/auth/login", json=payload)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "logins_per_s": logins / elapsed,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(
+            first_name="Bench",
+            last_name="Mark",
+            username="bench",
+            email="bench@bench.dev",
+            password=PASSWORD
+        ))
+        session.commit()
+
+    app = create_app({})
+
+    def override_get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+
+    print(f"CPUs: {os.cpu_count()}  rounds: {password_hasher.rounds}")
+    print(f"{'workers':>8} {'logins/s':>10} {'p99 ms':>10}")
+    try:
+        for workers in sorted(set(args.workers)):
+            stats = asyncio.run(bench_workers(app, workers, args.logins))
+            print(f"{workers:>8} {stats['logins_per_s']:>10.1f} {stats['p99_ms']:>10.1f}")
+    finally:
+        password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Coste por petición de los middlewares ASGI, medido sobre un endpoint vacío y sin base de datos."""
+import asyncio
+
+import pytest
+
+from src.core.middleware import MetricsMiddleware
+
+REQUESTS_PER_ROUND = 1000
+# Coste máximo por petición de MetricsMiddleware respecto a `bare`: se miden entre 4 y 5,5 µs y el
+# margen hasta 8 µs absorbe el ruido de la máquina sin dejar pasar una regresión real
+MAX_OVERHEAD_US = 8.0
+# Microsegundos por petición de cada variante de `test_metrics_middleware_overhead`
+US_PER_REQUEST: dict[str, float] = {}
+SCOPE = {"type": "http", "method": "GET", "path": "/"}
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 204, "headers": []})
+
+
+async def noop(message):
+    pass
+
+
+@pytest.fixture(scope="module")
+def runner():
+    with asyncio.Runner() as runner:
+        yield runner
+
+
+@pytest.mark.parametrize("middleware", ["bare", "metrics"])
+def test_metrics_middleware_overhead(benchmark, runner, middleware):
+    """La diferencia de medias entre `metrics` y `bare` es el coste de MetricsMiddleware.
+
+    `metrics` la guarda en `overhead_us` y falla si supera MAX_OVERHEAD_US: el objetivo es que
+    las métricas cuesten solo unos pocos microsegundos por petición.
+    """
+    app = MetricsMiddleware(endpoint) if middleware == "metrics" else endpoint
+
+    async def requests():
+        for _ in range(REQUESTS_PER_ROUND):
+            await app(dict(SCOPE), None, noop)
+
+    benchmark.group = "metrics_middleware"
+    benchmark(lambda: runner.run(requests()))
+    if benchmark.stats:  # None con --benchmark-disable
+        us = US_PER_REQUEST[middleware] = benchmark.stats.stats.mean / REQUESTS_PER_ROUND * 1e6
+        benchmark.extra_info["us_per_request"] = us
+        if middleware == "metrics" and "bare" in US_PER_REQUEST:
+            overhead = benchmark.extra_info["overhead_us"] = us - US_PER_REQUEST["bare"]
+            assert overhead <= MAX_OVERHEAD_US, f"MetricsMiddleware añade {overhead:.1f} µs por petición"
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+from src.models import Habit
+from src.repositories import HabitLogRepository, HabitRepository
+
+
+def test_create(benchmark, session, sample):
+    rng, _, users = sample
+    repository = HabitRepository(session)
+
+    def create():
+        user_id = rng.choice(users).id
+        return repository.create(Habit(user_id=user_id, title="Leer", category="Bench", goal_type="daily", goal_value=1))
+
+    benchmark(create)
+
+
+def test_get_by_id(benchmark, session, sample):
+    rng, habit_ids, _ = sample
+    repository = HabitRepository(session)
+    benchmark(lambda: repository.get_by_id(rng.choice(habit_ids)))
+
+
+def test_get_many(benchmark, session, sample):
+    rng, habit_ids, _ = sample
+    repository = HabitRepository(session)
+    size = min(100, len(habit_ids))
+    habits = benchmark(lambda: repository.get_many(rng.sample(habit_ids, size)))
+    assert len(habits) == size
+
+
+def test_get_by_id_loop(benchmark, session, sample):
+    """Línea base de `test_get_many`: los mismos 100 hábitos pedidos uno a uno."""
+    rng, habit_ids, _ = sample
+    repository = HabitRepository(session)
+    size = min(100, len(habit_ids))
+    benchmark(lambda: [repository.get_by_id(habit_id) for habit_id in rng.sample(habit_ids, size)])
+
+
+def test_update(benchmark, session, sample):
+    rng, habit_ids, _ = sample
+    repository = HabitRepository(session)
+    habits = [repository.get_by_id(habit_id) for habit_id in habit_ids[:100]]
+    benchmark(lambda: repository.update(rng.choice(habits), {"goal_value": rng.randint(1, 10)}))
+
+
+def test_update_by_id(benchmark, session, sample):
+    """`test_update` en una sola sentencia `UPDATE ... RETURNING`, sin cargar el hábito antes."""
+    rng, habit_ids, _ = sample
+    repository = HabitRepository(session)
+    ids = habit_ids[:100]
+    benchmark(lambda: repository.update_by_id(rng.choice(ids), {"goal_value": rng.randint(1, 10)}))
+
+
+def test_get_by_date_range(benchmark, session, sample):
+    rng, habit_ids, _ = sample
+    repository = HabitLogRepository(session)
+
+    def get_month():
+        start = date(2020, 1, 1) + timedelta(days=rng.randrange(900))
+        return repository.get_by_date_range(rng.choice(habit_ids), start, start + timedelta(days=30))
+
+    page = benchmark(get_month)
+    assert page.items
@@ -0,0 +1,49 @@
+from typing import List
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlmodel import select
+
+from src.core.serialization import dump_json
+from src.models import Habit, HabitLog, User
+from src.schemas import HabitLogRead, HabitRead, UserRead
+
+
+@pytest.fixture
+def loaded(session, sample):
+    _, habit_ids, _ = sample
+    return {
+        HabitLogRead: session.exec(select(HabitLog).where(HabitLog.habit_id == habit_ids[0]).limit(100)).all(),
+        HabitRead: session.exec(select(Habit).limit(100)).all(),
+        UserRead: session.exec(select(User).limit(100)).all(),
+    }
+
+
+@pytest.mark.parametrize("schema", [HabitLogRead, HabitRead, UserRead], ids=lambda schema: schema.__name__)
+def test_read_model(benchmark, loaded, schema):
+    rows = loaded[schema]
+    benchmark(lambda: [schema.model_validate(row).model_dump_json() for row in rows])
+
+
+@pytest.mark.parametrize("schema", [HabitLogRead, HabitRead, UserRead], ids=lambda schema: schema.__name__)
+def test_read_list(benchmark, loaded, schema):
+    adapter = TypeAdapter(list[schema])
+    rows = loaded[schema]
+    benchmark(lambda: adapter.dump_json(adapter.validate_python(rows, from_attributes=True)))
+
+
+@pytest.fixture
+def page_of_logs(session):
+    return session.exec(select(HabitLog).limit(10_000)).all()
+
+
+def test_logs_response_fastapi(benchmark, page_of_logs):
+    adapter = TypeAdapter(List[HabitLogRead])
+    body = benchmark(lambda: JSONResponse(jsonable_encoder(adapter.validate_python(page_of_logs, from_attributes=True))).body)
+    assert body == dump_json(List[HabitLogRead], page_of_logs)
+
+
+def test_logs_response_fast(benchmark, page_of_logs):
+    benchmark(lambda: dump_json(List[HabitLogRead], page_of_logs))
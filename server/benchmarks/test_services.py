@@ -0,0 +1,121 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import select
+
+from src.core.database import unit_of_work
+from src.core.hashing import password_hasher
+from src.models import Habit
+from src.schemas import (
+    ChallengeCreate, ChallengeFullCreate, ChallengeHabitCreate, ChallengeParticipantCreate, HabitLogBatchCreate, HabitLogCreate
+)
+from src.services import (
+    ChallengeHabitService, ChallengeParticipantService, ChallengeService, HabitLogService, UserService
+)
+
+from .conftest import BENCH_PASSWORD, DAYS_PER_HABIT, START_DATE
+
+LOGS_PER_ROUND = 100
+# El lote debe registrar al menos este múltiplo de logs por segundo respecto a la ingesta uno a uno
+MIN_BATCH_SPEEDUP = 20
+# Media por ronda de cada flujo de `test_log_ingestion`, por tamaño de la base
+INGESTION_MEANS: dict[tuple[int, str], float] = {}
+
+
+@pytest.fixture(scope="module")
+def runner():
+    with asyncio.Runner() as runner:
+        yield runner
+    password_hasher.shutdown()
+
+
+def test_login(benchmark, runner, session, sample):
+    rng, _, users = sample
+    service = UserService(session)
+    token = benchmark(lambda: runner.run(service.login(rng.choice(users).email, BENCH_PASSWORD)))
+    assert token.access_token
+
+
+def create_challenge_flow(session, data: ChallengeFullCreate) -> None:
+    """El mismo flujo que `create_full_challenge`, llamando a cada servicio por separado."""
+    challenge = ChallengeService(session).create_challenge(
+        ChallengeCreate(**data.model_dump(exclude={"habits", "enroll_creator"}))
+    )
+    for habit in data.habits:
+        ChallengeHabitService(session).create_challenge_habit(
+            ChallengeHabitCreate(challenge_id=challenge.id, **habit.model_dump())
+        )
+    ChallengeParticipantService(session).create_participant(
+        ChallengeParticipantCreate(challenge_id=challenge.id, user_id=data.created_by)
+    )
+
+
+@pytest.mark.parametrize("flow", ["separate", "unit_of_work"])
+def test_create_challenge_flow(benchmark, session, sample, flow):
+    """Compara los commits (y fsyncs) por flujo: uno por escritura frente a uno por unidad de trabajo."""
+    rng, _, users = sample
+    user_id = rng.choice(users).id
+    habit_ids = session.exec(select(Habit.id).where(Habit.user_id == user_id)).all()
+    data = ChallengeFullCreate(
+        created_by=user_id,
+        title="Reto",
+        start_date=date(2025, 1, 1),
+        end_date=date(2025, 2, 1),
+        habits=[{"habit_id": habit_id} for habit_id in habit_ids]
+    )
+    commits = []
+    event.listen(session, "after_commit", commits.append)
+
+    def run():
+        if flow == "separate":
+            create_challenge_flow(session, data)
+        else:
+            with unit_of_work(session):
+                create_challenge_flow(session, data)
+
+    run()
+    benchmark.extra_info["commits_per_flow"] = len(commits)
+    assert len(commits) == (len(habit_ids) + 2 if flow == "separate" else 1)
+    benchmark(run)
+
+
+@pytest.mark.parametrize("flow", ["single", "batch"])
+def test_log_ingestion(benchmark, session, sample, rows, flow):
+    """Registra LOGS_PER_ROUND logs uno a uno o en un solo lote.
+
+    Los días quedan fuera del rango sembrado: la primera ronda los crea y las siguientes los actualizan.
+    `batch` guarda en `speedup` cuántas veces más rápido es que `single` sobre la misma base y
+    falla si no llega a MIN_BATCH_SPEEDUP.
+    """
+    rng, habit_ids, _ = sample
+    habit = session.get(Habit, rng.choice(habit_ids))
+    items = [
+        HabitLogCreate(
+            habit_id=habit.id,
+            user_id=habit.user_id,
+            log_date=START_DATE + timedelta(days=DAYS_PER_HABIT + day),
+            progress_value=1,
+            status="completed"
+        )
+        for day in range(LOGS_PER_ROUND)
+    ]
+    service = HabitLogService(session)
+
+    def run():
+        if flow == "single":
+            for item in items:
+                service.create_log(item)
+        else:
+            service.create_logs(HabitLogBatchCreate(items=items))
+
+    benchmark.group = "log_ingestion"
+    benchmark(run)
+    if benchmark.stats:  # None con --benchmark-disable
+        mean = INGESTION_MEANS[rows, flow] = benchmark.stats.stats.mean
+        benchmark.extra_info["logs_per_second"] = LOGS_PER_ROUND / mean
+        single = INGESTION_MEANS.get((rows, "single"))
+        if flow == "batch" and single is not None:
+            speedup = benchmark.extra_info["speedup"] = single / mean
+            assert speedup >= MIN_BATCH_SPEEDUP, f"el lote solo es {speedup:.1f} veces más rápido"
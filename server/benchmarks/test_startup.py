@@ -0,0 +1,70 @@
+"""Arranque en frío de un worker: importación de ``main.py`` y tiempo hasta la primera respuesta.
+
+Cada ronda lanza un intérprete nuevo, así que los tiempos incluyen el arranque de Python;
+lo que interesa es su evolución entre commits (``--benchmark-compare``).
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+STARTUP_TIMEOUT = 30.0
+
+
+def environment(tmp_path: Path, name: str) -> dict:
+    return {**os.environ, "DB_URL": f"sqlite:///{tmp_path / name}"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_import_main(benchmark, tmp_path):
+    command = [sys.executable, "-c", "import main"]
+    env = environment(tmp_path, "import.db")
+    benchmark.pedantic(subprocess.run, args=(command,), kwargs={"cwd": SERVER_DIR, "env": env, "check": True},
+                       rounds=5, warmup_rounds=1)
+    # Importar la aplicación no debe crear la base de datos
+    assert not (tmp_path / "import.db").exists()
+
+
+def test_cold_start_to_first_response(benchmark, tmp_path):
+    pytest.importorskip("uvicorn")
+    processes = []
+
+    def setup():
+        for process in processes:
+            process.terminate()
+            process.wait()
+        port = free_port()
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+        env = environment(tmp_path, f"cold-{len(processes)}.db")
+        return (command, port, env), {}
+
+    def start(command: list[str], port: int, env: dict) -> None:
+        process = subprocess.Popen(command, cwd=SERVER_DIR, env=env)
+        processes.append(process)
+        deadline = time.perf_counter() + STARTUP_TIMEOUT
+        while time.perf_counter() < deadline and process.poll() is None:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", trust_env=False).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+        raise TimeoutError("El servidor no respondió a /health")
+
+    try:
+        benchmark.pedantic(start, setup=setup, rounds=3)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
@@ -0,0 +1,90 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+import anyio
+
+
+class ConcurrencyLimiter:
+    """Limita las peticiones simultáneas de un grupo de rutas con una cola de espera acotada.
+
+    Si ya hay `queue_size` peticiones esperando, o una petición espera más de `timeout`
+    segundos, `acquire` devuelve False para que la petición se rechace en lugar de acumularse.
+
+    Args:
+        limit (int): Peticiones que se atienden a la vez
+        queue_size (int): Peticiones que pueden esperar un hueco
+        timeout (float): Segundos máximos de espera en la cola
+    """
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.waiting = 0
+        self._semaphore = anyio.Semaphore(limit)
+
+    @property
+    def active(self) -> int:
+        return self.limit - self._semaphore.value
+
+    async def acquire(self) -> bool:
+        if self._semaphore.value > 0 and self.waiting == 0:
+            await self._semaphore.acquire()
+            return True
+        if self.waiting >= self.queue_size:
+            return False
+        self.waiting += 1
+        try:
+            with anyio.move_on_after(self.timeout):
+                await self._semaphore.acquire()
+                return True
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+class RateLimiter:
+    """Token bucket por clave (IP o usuario): `rate` peticiones por segundo con ráfagas de hasta `burst`.
+
+    Solo se guardan los `maxsize` buckets usados más recientemente; un bucket descartado
+    equivale a uno lleno, que es el estado al que habría vuelto tras `burst / rate` segundos.
+    Se usa solo desde el event loop, por lo que no necesita bloqueo.
+    """
+
+    def __init__(self, rate: float, burst: int, maxsize: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Consume un token del bucket de `key`
+
+        Args:
+            key (Hashable): Cliente al que se le cobra la petición
+            now (Optional[float], optional): Instante actual (`time.monotonic()` por defecto)
+
+        Returns:
+            float: 0 si la petición se admite; si no, segundos hasta que haya un token disponible
+        """
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+def retry_after(seconds: float) -> str:
+    """Valor de la cabecera Retry-After (segundos enteros, al menos 1)."""
+    return str(max(1, math.ceil(seconds)))
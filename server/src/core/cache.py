@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from src.core.metrics import Counter
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Caché LRU en memoria con expiración por entrada.
+
+    Args:
+        name (str): Prefijo de las métricas de aciertos y fallos de la caché
+        maxsize (int): Número máximo de entradas; al superarlo se descarta la menos usada
+        ttl (float): Segundos de vida por defecto de cada entrada
+        enabled (bool, optional): Si es False, la caché nunca guarda ni devuelve entradas
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = Counter(f"{name}_cache_hits_total", f"Aciertos de la caché {name}")
+        self._misses = Counter(f"{name}_cache_misses_total", f"Fallos de la caché {name}")
+
+    @property
+    def hits(self) -> int:
+        return int(self._hits.value)
+
+    @property
+    def misses(self) -> int:
+        return int(self._misses.value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self._hits.inc()
+                return entry[1]
+            if entry is not _MISSING:
+                self._evict(key)
+        self._misses.inc()
+        return default
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Como `get`, pero sin contar un acierto o fallo ni renovar la posición LRU; para escrituras sobre la entrada."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._evict(next(iter(self._data)))
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._evict(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def _evict(self, key: Hashable) -> None:
+        del self._data[key]
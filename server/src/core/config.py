@@ -7,15 +7,108 @@ class Config:
     ENVIRONMENT: str = config("ENVIRONMENT", default='production')
     SECRET_KEY: str = config("SECRET_KEY", default="dev-secret-key-change-in-production")
     DB_URL: str = config("DB_URL", default="sqlite:///./habit_tracker.db")
+    DB_ASYNC: bool = config("DB_ASYNC", cast=bool, default=False)
+    ASYNC_DB_URL: str = config("ASYNC_DB_URL", default="")
+    # En producción el esquema lo gestionan las migraciones; False evita el create_all al arrancar
+    DB_CREATE_SCHEMA: bool = config("DB_CREATE_SCHEMA", cast=bool, default=True)
+    DB_POOL_SIZE: int = config("DB_POOL_SIZE", cast=int, default=5)
+    DB_MAX_OVERFLOW: int = config("DB_MAX_OVERFLOW", cast=int, default=10)
+    DB_POOL_TIMEOUT: float = config("DB_POOL_TIMEOUT", cast=float, default=30.0)
+    DB_POOL_RECYCLE: int = config("DB_POOL_RECYCLE", cast=int, default=1800)
+    DB_POOL_PRE_PING: bool = config("DB_POOL_PRE_PING", cast=bool, default=True)
+    # Réplicas de solo lectura separadas por comas; vacío envía también las lecturas al primario
+    DB_REPLICA_URLS: str = config("DB_REPLICA_URLS", default="")
+    DB_REPLICA_HEALTH_INTERVAL: float = config("DB_REPLICA_HEALTH_INTERVAL", cast=float, default=5.0)
+    # Segundos que las lecturas de un cliente van al primario después de que escriba (lag máximo tolerado)
+    DB_READ_YOUR_WRITES_SECONDS: float = config("DB_READ_YOUR_WRITES_SECONDS", cast=float, default=5.0)
+    DB_READ_YOUR_WRITES_CLIENTS: int = config("DB_READ_YOUR_WRITES_CLIENTS", cast=int, default=100000)
+    # IPs de los proxies inversos cuyo X-Forwarded-For es de fiar, separadas por comas. Sin ellas, detrás
+    # de un proxy todos los clientes anónimos comparten su IP: el mismo límite por IP y, tras una escritura,
+    # las mismas lecturas fijadas al primario
+    TRUSTED_PROXIES: str = config("TRUSTED_PROXIES", default="")
+    SQLITE_JOURNAL_MODE: str = config("SQLITE_JOURNAL_MODE", default="WAL")
+    SQLITE_SYNCHRONOUS: str = config("SQLITE_SYNCHRONOUS", default="NORMAL")
+    SQLITE_CACHE_SIZE: int = config("SQLITE_CACHE_SIZE", cast=int, default=-64000)
+    SQLITE_MMAP_SIZE: int = config("SQLITE_MMAP_SIZE", cast=int, default=268435456)
+    SQLITE_BUSY_TIMEOUT: int = config("SQLITE_BUSY_TIMEOUT", cast=int, default=5000)
     CLIENT_URL: str = config("CLIENT_URL", default="*")
     CIPHER_KEY: str = config("CIPHER_KEY", default="dev-cipher-key-change-in-production")
 
+    BCRYPT_ROUNDS: int = config("BCRYPT_ROUNDS", cast=int, default=12)
+    HASH_WORKERS: int = config("HASH_WORKERS", cast=int, default=2)
+    HASH_QUEUE_SIZE: int = config("HASH_QUEUE_SIZE", cast=int, default=64)
+
+    DEFAULT_PAGE_SIZE: int = config("DEFAULT_PAGE_SIZE", cast=int, default=100)
+    MAX_PAGE_SIZE: int = config("MAX_PAGE_SIZE", cast=int, default=500)
+
+    HABIT_STATS_WINDOW_DAYS: int = config("HABIT_STATS_WINDOW_DAYS", cast=int, default=90)
+    EXPORT_BATCH_SIZE: int = config("EXPORT_BATCH_SIZE", cast=int, default=1000)
+    LOG_BATCH_MAX_SIZE: int = config("LOG_BATCH_MAX_SIZE", cast=int, default=5000)
+
+    # Los borrados con al menos este número de filas dependientes se completan en segundo plano; 0 lo desactiva
+    PURGE_BACKGROUND_THRESHOLD: int = config("PURGE_BACKGROUND_THRESHOLD", cast=int, default=0)
+    PURGE_CHUNK_SIZE: int = config("PURGE_CHUNK_SIZE", cast=int, default=5000)
+
+    PRINCIPAL_CACHE_ENABLED: bool = config("PRINCIPAL_CACHE_ENABLED", cast=bool, default=True)
+    PRINCIPAL_CACHE_SIZE: int = config("PRINCIPAL_CACHE_SIZE", cast=int, default=10000)
+    PRINCIPAL_CACHE_TTL: float = config("PRINCIPAL_CACHE_TTL", cast=float, default=300.0)
+
+    LEADERBOARD_CACHE_SIZE: int = config("LEADERBOARD_CACHE_SIZE", cast=int, default=64)
+    LEADERBOARD_CACHE_TTL: float = config("LEADERBOARD_CACHE_TTL", cast=float, default=600.0)
+    LEADERBOARD_MAX_LIMIT: int = config("LEADERBOARD_MAX_LIMIT", cast=int, default=100)
+
+    QUERY_TRACKING_ENABLED: bool = config("QUERY_TRACKING_ENABLED", cast=bool, default=True)
+    QUERY_REPEAT_THRESHOLD: int = config("QUERY_REPEAT_THRESHOLD", cast=int, default=5)
+
+    RESPONSE_CACHE_ENABLED: bool = config("RESPONSE_CACHE_ENABLED", cast=bool, default=True)
+    RESPONSE_CACHE_SIZE: int = config("RESPONSE_CACHE_SIZE", cast=int, default=1024)
+    RESPONSE_CACHE_TTL: float = config("RESPONSE_CACHE_TTL", cast=float, default=60.0)
+
+    # Peticiones simultáneas y en cola por grupo de rutas; writes + reads + exports = 40 hilos del threadpool
+    ADMISSION_CONTROL_ENABLED: bool = config("ADMISSION_CONTROL_ENABLED", cast=bool, default=True)
+    ADMISSION_QUEUE_TIMEOUT: float = config("ADMISSION_QUEUE_TIMEOUT", cast=float, default=2.0)
+    ADMISSION_AUTH_CONCURRENCY: int = config("ADMISSION_AUTH_CONCURRENCY", cast=int, default=16)
+    ADMISSION_AUTH_QUEUE: int = config("ADMISSION_AUTH_QUEUE", cast=int, default=32)
+    ADMISSION_WRITES_CONCURRENCY: int = config("ADMISSION_WRITES_CONCURRENCY", cast=int, default=12)
+    ADMISSION_WRITES_QUEUE: int = config("ADMISSION_WRITES_QUEUE", cast=int, default=48)
+    ADMISSION_READS_CONCURRENCY: int = config("ADMISSION_READS_CONCURRENCY", cast=int, default=24)
+    ADMISSION_READS_QUEUE: int = config("ADMISSION_READS_QUEUE", cast=int, default=96)
+    ADMISSION_EXPORTS_CONCURRENCY: int = config("ADMISSION_EXPORTS_CONCURRENCY", cast=int, default=4)
+    ADMISSION_EXPORTS_QUEUE: int = config("ADMISSION_EXPORTS_QUEUE", cast=int, default=4)
+
+    # Token bucket por IP y por usuario autenticado; una tasa de 0 desactiva el límite
+    RATE_LIMIT_IP_RATE: float = config("RATE_LIMIT_IP_RATE", cast=float, default=0.0)
+    RATE_LIMIT_IP_BURST: int = config("RATE_LIMIT_IP_BURST", cast=int, default=100)
+    RATE_LIMIT_USER_RATE: float = config("RATE_LIMIT_USER_RATE", cast=float, default=0.0)
+    RATE_LIMIT_USER_BURST: int = config("RATE_LIMIT_USER_BURST", cast=int, default=50)
+    RATE_LIMIT_MAX_CLIENTS: int = config("RATE_LIMIT_MAX_CLIENTS", cast=int, default=100000)
+
+    FAST_JSON_RESPONSES: bool = config("FAST_JSON_RESPONSES", cast=bool, default=False)
+
     RECAPTCHA_SECRET_KEY: str = config("RECAPTCHA_SECRET_KEY", default="")
 
     SMTP_SERVER: str = config("SMTP_SERVER", default="")
     SMTP_PORT: int = config("SMTP_PORT", default=587, cast=int)
     EMAIL_USER: str = config("EMAIL_USER", default="")
     EMAIL_PASSWORD: str = config("EMAIL_PASSWORD", default="")
+    EMAIL_FROM: str = config("EMAIL_FROM", default="")
+    SMTP_STARTTLS: bool = config("SMTP_STARTTLS", cast=bool, default=True)
+    SMTP_TIMEOUT: float = config("SMTP_TIMEOUT", cast=float, default=10.0)
+
+    # URL pública de la API para los enlaces de los correos
+    API_URL: str = config("API_URL", default="http://localhost:8000")
+    EMAIL_CONFIRMATION_TTL_HOURS: int = config("EMAIL_CONFIRMATION_TTL_HOURS", cast=int, default=48)
+
+    # El worker solo arranca si SMTP_SERVER está configurado; los correos se encolan siempre
+    EMAIL_OUTBOX_WORKER_ENABLED: bool = config("EMAIL_OUTBOX_WORKER_ENABLED", cast=bool, default=True)
+    EMAIL_OUTBOX_BATCH_SIZE: int = config("EMAIL_OUTBOX_BATCH_SIZE", cast=int, default=50)
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = config("EMAIL_OUTBOX_MAX_ATTEMPTS", cast=int, default=8)
+    EMAIL_OUTBOX_BACKOFF: float = config("EMAIL_OUTBOX_BACKOFF", cast=float, default=30.0)
+    EMAIL_OUTBOX_MAX_BACKOFF: float = config("EMAIL_OUTBOX_MAX_BACKOFF", cast=float, default=3600.0)
+    EMAIL_OUTBOX_POLL_INTERVAL: float = config("EMAIL_OUTBOX_POLL_INTERVAL", cast=float, default=5.0)
+    # Segundos que un lote queda reservado mientras se envía; 0 la calcula como
+    # EMAIL_OUTBOX_BATCH_SIZE * SMTP_TIMEOUT * 2 y un valor menor hace fallar el arranque
+    EMAIL_OUTBOX_LEASE: float = config("EMAIL_OUTBOX_LEASE", cast=float, default=0.0)
 
 
     def __new__(cls):
@@ -1,14 +1,492 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+from fastapi import Depends, Request
 from sqlmodel import create_engine, Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from src.core.cache import TTLCache
 from src.core.config import CONFIG
+from src.core.metrics import Counter, Gauge, Histogram
+from src.core.network import client_ip
+from src.core.security import token_username
 
-engine = create_engine(CONFIG.DB_URL, echo=False)
+logger = logging.getLogger(__name__)
+
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Tiempo de espera para obtener una conexión del pool",
+    labelnames=("engine",)
+)
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Conexiones del pool en uso",
+    labelnames=("engine",)
+)
+POOL_SATURATION = Gauge(
+    "db_pool_saturation",
+    "Conexiones en uso respecto al máximo del pool (pool_size + max_overflow)",
+    labelnames=("engine",)
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Peticiones de conexión que agotaron DB_POOL_TIMEOUT",
+    labelnames=("engine",)
+)
+DB_READS = Counter(
+    "db_read_sessions_total",
+    "Sesiones de lectura por destino (primary o replica)",
+    labelnames=("target",)
+)
+REPLICA_HEALTHY = Gauge(
+    "db_replica_healthy",
+    "1 si la última comprobación de la réplica tuvo éxito",
+    labelnames=("replica",)
+)
+
+
+class _TimedPoolMixin:
+    """Mide la espera de cada checkout y la ocupación del pool."""
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.labels(self.metrics_label).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(self.metrics_label).observe(time.perf_counter() - start)
+        self._observe_usage()
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._observe_usage()
+
+    def _observe_usage(self) -> None:
+        checked_out = self.checkedout()
+        capacity = self.size() + max(self._max_overflow, 0)
+        POOL_CHECKED_OUT.labels(self.metrics_label).set(checked_out)
+        POOL_SATURATION.labels(self.metrics_label).set(checked_out / capacity if capacity else 0.0)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def engine_options(url: str, is_async: bool = False, metrics_label: Optional[str] = None) -> dict:
+    """Obtiene los argumentos de `create_engine` para la URL con la configuración del pool.
+
+    Las bases SQLite en memoria conservan el pool por defecto de SQLAlchemy, ya que cada
+    conexión nueva abriría una base de datos distinta.
+
+    Args:
+        url (str): URL de conexión
+        is_async (bool, optional): Si el motor es asíncrono
+        metrics_label (Optional[str], optional): Etiqueta `engine` de las métricas del pool; por
+            defecto "sync" o "async". Cada motor adicional (p. ej. una réplica) necesita la suya
+
+    Returns:
+        dict: Argumentos para `create_engine` o `create_async_engine`
+    """
+    db_url = make_url(url)
+    options = {"echo": False, "pool_pre_ping": CONFIG.DB_POOL_PRE_PING}
+    if db_url.get_backend_name() == "sqlite" and db_url.database in (None, "", ":memory:"):
+        return options
+    poolclass = TimedAsyncQueuePool if is_async else TimedQueuePool
+    if metrics_label is not None:
+        # Subclase y no atributo de instancia: `engine.dispose()` recrea el pool a partir de su clase
+        poolclass = type(poolclass.__name__, (poolclass,), {"metrics_label": metrics_label})
+    return {
+        **options,
+        "poolclass": poolclass,
+        "pool_size": CONFIG.DB_POOL_SIZE,
+        "max_overflow": CONFIG.DB_MAX_OVERFLOW,
+        "pool_timeout": CONFIG.DB_POOL_TIMEOUT,
+        "pool_recycle": CONFIG.DB_POOL_RECYCLE,
+    }
+
+
+# Opción de ejecución con el modo del BEGIN de SQLite ("IMMEDIATE" o "DEFERRED") de una conexión
+SQLITE_BEGIN = "sqlite_begin"
+
+
+def configure_sqlite(engine: Engine, begin: str = "IMMEDIATE") -> Engine:
+    """Aplica los PRAGMA de rendimiento a cada conexión nueva de un motor SQLite.
+
+    WAL permite lecturas concurrentes con una escritura, `synchronous=NORMAL` evita un
+    fsync por commit (seguro en modo WAL) y `busy_timeout` hace que los escritores esperen
+    al bloqueo en lugar de fallar con `database is locked`. Las transacciones las abre
+    SQLAlchemy para que los SAVEPOINT de `unit_of_work` funcionen también en SQLite.
+
+    Por defecto se abren con `BEGIN IMMEDIATE`: una transacción diferida que lee y después
+    escribe falla al instante, sin esperar `busy_timeout`, si otra conexión confirmó entre
+    medias. Las sesiones que solo leen pueden pedir `BEGIN DEFERRED` con la opción de
+    ejecución `SQLITE_BEGIN` (ver `get_read_session`) para no bloquear a los escritores.
+
+    Args:
+        engine (Engine): Motor a configurar; si no es SQLite se devuelve sin cambios
+        begin (str, optional): Modo del BEGIN por defecto; "DEFERRED" para réplicas de solo lectura
+
+    Returns:
+        Engine: El mismo motor
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+    pragmas = (
+        f"PRAGMA journal_mode={CONFIG.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={CONFIG.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size={int(CONFIG.SQLITE_CACHE_SIZE)}",
+        f"PRAGMA mmap_size={int(CONFIG.SQLITE_MMAP_SIZE)}",
+        f"PRAGMA busy_timeout={int(CONFIG.SQLITE_BUSY_TIMEOUT)}",
+    )
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+        # pysqlite abre la transacción por su cuenta solo antes de un INSERT/UPDATE/DELETE, y un
+        # SAVEPOINT fuera de ella se confirmaría al liberarlo; SQLAlchemy emite el BEGIN en su lugar
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_transaction(connection):
+        connection.exec_driver_sql(f"BEGIN {connection.get_execution_options().get(SQLITE_BEGIN, begin)}")
 
-def get_engine():
     return engine
 
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+_engine: Engine | None = None
+_engine_lock = threading.Lock()
+_async_engine: AsyncEngine | None = None
+_async_session_factory: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_engine() -> Engine:
+    """Crea (una sola vez) el motor síncrono a partir de ``CONFIG.DB_URL``.
+
+    El motor no se construye al importar el módulo sino en el primer uso, de modo que
+    importar la aplicación no abre conexiones ni lee la configuración de la base de datos.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = configure_sqlite(create_engine(CONFIG.DB_URL, **engine_options(CONFIG.DB_URL)))
+    return _engine
+
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(get_engine())
+
+def get_session(request: Request):
+    with Session(get_engine()) as session:
+        session.info[_CLIENT_KEY] = client_key(request)
+        yield session
+
+
+class ReplicaRouter:
+    """Reparte las sesiones de lectura entre réplicas por turnos, saltando las que no responden.
+
+    La salud de cada réplica se comprueba con un `SELECT 1` como mucho una vez cada
+    `health_interval` segundos; entre comprobaciones se reutiliza el último resultado.
+
+    Args:
+        engines (List[Engine]): Motores de las réplicas
+        health_interval (float): Segundos durante los que vale una comprobación de salud
+    """
+
+    def __init__(self, engines: List[Engine], health_interval: float):
+        self.engines = engines
+        self.health_interval = health_interval
+        self._next = 0
+        self._checked: dict[int, tuple[float, bool]] = {}
+        self._lock = threading.Lock()
+
+    def choose(self) -> Optional[Engine]:
+        """Devuelve la siguiente réplica sana, o None si no hay ninguna."""
+        if not self.engines:
+            return None
+        with self._lock:
+            start = self._next
+            self._next = (start + 1) % len(self.engines)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if self.is_healthy(index):
+                return self.engines[index]
+        return None
+
+    def is_healthy(self, index: int) -> bool:
+        now = time.monotonic()
+        checked_at, healthy = self._checked.get(index, (None, False))
+        if checked_at is not None and now - checked_at < self.health_interval:
+            return healthy
+        healthy = self._ping(self.engines[index])
+        self._checked[index] = (now, healthy)
+        REPLICA_HEALTHY.labels(str(index)).set(1 if healthy else 0)
+        return healthy
+
+    def mark_down(self, engine: Engine) -> None:
+        """Excluye la réplica hasta la siguiente comprobación (p. ej. tras un error de conexión al leer)."""
+        index = self.engines.index(engine)
+        self._checked[index] = (time.monotonic(), False)
+        REPLICA_HEALTHY.labels(str(index)).set(0)
+
+    def dispose(self) -> None:
+        for engine in self.engines:
+            engine.dispose()
+
+    @staticmethod
+    def _ping(engine: Engine) -> bool:
+        try:
+            with engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
+            return True
+        except exc.DBAPIError:
+            logger.warning("Réplica no disponible: %s", engine.url.render_as_string(hide_password=True))
+            return False
+
+
+# Clientes que escribieron hace menos de DB_READ_YOUR_WRITES_SECONDS: sus lecturas van al primario
+read_your_writes = TTLCache(
+    "read_your_writes",
+    maxsize=CONFIG.DB_READ_YOUR_WRITES_CLIENTS,
+    ttl=CONFIG.DB_READ_YOUR_WRITES_SECONDS
+)
+
+# Cliente de la petición que abrió la sesión, para recordar sus escrituras
+_CLIENT_KEY = "read_your_writes_client"
+
+_replica_router: ReplicaRouter | None = None
+
+
+def client_key(request: Request) -> str:
+    """Identifica al cliente por el usuario de su token Bearer o, si es anónimo, por su IP (ver `client_ip`)."""
+    username = token_username(request.headers.get("authorization", ""))
+    if username:
+        return f"user:{username}"
+    return f"ip:{client_ip(request)}"
+
+
+def get_replica_router() -> ReplicaRouter:
+    """Crea (una sola vez) los motores de ``CONFIG.DB_REPLICA_URLS``; sin réplicas, todo va al primario."""
+    global _replica_router
+    if _replica_router is None:
+        with _engine_lock:
+            if _replica_router is None:
+                urls = [url.strip() for url in CONFIG.DB_REPLICA_URLS.split(",") if url.strip()]
+                _replica_router = ReplicaRouter(
+                    [
+                        configure_sqlite(
+                            create_engine(url, **engine_options(url, metrics_label=f"replica{index}")), begin="DEFERRED"
+                        )
+                        for index, url in enumerate(urls)
+                    ],
+                    CONFIG.DB_REPLICA_HEALTH_INTERVAL
+                )
+    return _replica_router
+
+
+def get_read_session(request: Request, session: Session = Depends(get_session)):
+    """Sesión para rutas GET que solo leen: una réplica sana si la hay, si no la del primario.
+
+    Un cliente que acaba de escribir sigue leyendo del primario durante
+    DB_READ_YOUR_WRITES_SECONDS, de modo que ve sus cambios aunque las réplicas vayan
+    con retraso. Las rutas que escriben (aunque sean GET) deben seguir usando `get_session`.
+    """
+    engine = None
+    if request.method in ("GET", "HEAD") and not read_your_writes.get(session.info.get(_CLIENT_KEY)):
+        engine = get_replica_router().choose()
+    request.state.read_replica = engine is not None
+    if engine is None:
+        DB_READS.labels("primary").inc()
+        if not session.in_transaction():
+            # Solo lee: en SQLite no reserva el bloqueo de escritura al empezar (BEGIN DEFERRED)
+            session.bind = session.get_bind().execution_options(**{SQLITE_BEGIN: "DEFERRED"})
+        yield session
+        return
+    DB_READS.labels("replica").inc()
+    with Session(engine) as replica_session:
+        try:
+            yield replica_session
+        except exc.DBAPIError as error:
+            if error.connection_invalidated or isinstance(error, exc.OperationalError):
+                get_replica_router().mark_down(engine)
+            raise
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session: Session) -> None:
+    key = session.info.get(_CLIENT_KEY)
+    if key is not None and get_replica_router().engines:
+        read_your_writes.set(key, True)
+
+
+# Profundidad de `unit_of_work` abierta en la sesión (0 o ausente: cada repositorio confirma por su cuenta)
+_UNIT_OF_WORK_DEPTH = "unit_of_work_depth"
+
+
+def commit(session: Session) -> None:
+    """Confirma la transacción de la sesión, o solo envía los cambios (flush) si hay una unidad de trabajo abierta.
+
+    Los repositorios lo usan en lugar de `session.commit()` para que una unidad de trabajo
+    pueda agrupar las escrituras de varios servicios en una sola transacción.
+    """
+    if session.info.get(_UNIT_OF_WORK_DEPTH):
+        session.flush()
+    else:
+        session.commit()
+
+
+# Llamadas pendientes del commit de la transacción externa y, por SAVEPOINT, cuántas había al abrirlo
+_AFTER_COMMIT = "after_commit_callbacks"
+_SAVEPOINT_MARKS = "after_commit_savepoints"
+
+
+def on_commit(session: Session, callback: Callable[[], None]) -> None:
+    """Ejecuta `callback` cuando se confirme la transacción externa de la sesión, o ya si no hay ninguna abierta.
+
+    Si la transacción, o el SAVEPOINT abierto en el momento de encolarla, se deshace, la llamada
+    se descarta. Sirve para reflejar en cachés en memoria solo los cambios que llegan a la base
+    de datos, también dentro de una `unit_of_work`.
+
+    Args:
+        session (Session): Sesión que hizo los cambios
+        callback (Callable[[], None]): Actualización que depende de que se confirmen
+    """
+    if not session.in_transaction():
+        callback()
+        return
+    session.info.setdefault(_AFTER_COMMIT, []).append(callback)
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session: Session, transaction) -> None:
+    if transaction.nested:
+        session.info.setdefault(_SAVEPOINT_MARKS, {})[transaction] = len(session.info.get(_AFTER_COMMIT, ()))
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    # También se emite al liberar un SAVEPOINT; sus llamadas pasan a la transacción que lo contiene
+    if session.in_nested_transaction():
+        session.info.get(_SAVEPOINT_MARKS, {}).pop(session.get_nested_transaction(), None)
+        return
+    callbacks = session.info.pop(_AFTER_COMMIT, [])
+    session.info.pop(_SAVEPOINT_MARKS, None)
+    for callback in callbacks:
+        callback()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_commit(session: Session, previous_transaction) -> None:
+    marks = session.info.get(_SAVEPOINT_MARKS, {})
+    if previous_transaction.nested:
+        if previous_transaction in marks:
+            del session.info.setdefault(_AFTER_COMMIT, [])[marks.pop(previous_transaction):]
+        return
+    session.info.pop(_AFTER_COMMIT, None)
+    session.info.pop(_SAVEPOINT_MARKS, None)
+
+
+@contextmanager
+def unit_of_work(session: Session) -> Iterator[Session]:
+    """Agrupa en una transacción todas las escrituras hechas con `session` dentro del bloque.
+
+    El bloque más externo confirma una sola vez al salir y deshace todo si se lanza una
+    excepción. Un bloque anidado (p. ej. un servicio llamado desde otro) abre un SAVEPOINT:
+    si falla, solo se deshacen sus cambios y la excepción sigue su curso, de modo que el
+    llamador puede capturarla y continuar con el resto de la transacción.
+
+    La sesión es la de la petición (`get_session`), así que la unidad de trabajo dura como
+    mucho la petición; se confirma dentro del manejador y no al cerrar la dependencia, que
+    en FastAPI ocurre después de enviar la respuesta.
+
+    Args:
+        session (Session): Sesión de la petición
+
+    Yields:
+        Iterator[Session]: La misma sesión
+    """
+    depth = session.info.get(_UNIT_OF_WORK_DEPTH, 0)
+    session.info[_UNIT_OF_WORK_DEPTH] = depth + 1
+    try:
+        if depth:
+            with session.begin_nested():
+                yield session
+        else:
+            try:
+                yield session
+                session.commit()
+            except BaseException:
+                session.rollback()
+                raise
+    finally:
+        session.info[_UNIT_OF_WORK_DEPTH] = depth
+
+
+def get_async_db_url(url: str) -> str:
+    """Obtiene la URL con el driver asíncrono equivalente al driver síncrono configurado.
+
+    Args:
+        url (str): URL de conexión síncrona (p. ej. ``sqlite:///./habit_tracker.db``)
+
+    Returns:
+        str: URL de conexión asíncrona (p. ej. ``sqlite+aiosqlite:///./habit_tracker.db``)
+    """
+    db_url = make_url(url)
+    if db_url.get_dialect().is_async:
+        return url
+    drivername = ASYNC_DRIVERS.get(db_url.get_backend_name())
+    if drivername is None:
+        raise ValueError(f"No hay un driver asíncrono para '{db_url.drivername}'")
+    return db_url.set(drivername=drivername).render_as_string(hide_password=False)
+
+def get_async_engine() -> AsyncEngine:
+    """Crea (una sola vez) el motor asíncrono a partir de ``CONFIG.ASYNC_DB_URL`` o de ``CONFIG.DB_URL``."""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        url = CONFIG.ASYNC_DB_URL or get_async_db_url(CONFIG.DB_URL)
+        _async_engine = create_async_engine(url, **engine_options(url, is_async=True))
+        configure_sqlite(_async_engine.sync_engine)
+        _async_session_factory = async_sessionmaker(
+            _async_engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+    return _async_engine
+
+async def dispose_engines() -> None:
+    """Cierra las conexiones de los motores creados; se volverán a crear si se usan de nuevo."""
+    global _engine, _replica_router, _async_engine, _async_session_factory
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+    if _replica_router is not None:
+        _replica_router.dispose()
+        _replica_router = None
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_session_factory = None
 
-def get_session():
-    with Session(engine) as session:
+async def get_async_session():
+    get_async_engine()
+    async with _async_session_factory() as session:
         yield session
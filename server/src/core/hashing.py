@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from src.core.config import CONFIG
+from src.core.metrics import Counter, Gauge, Histogram
+from src.core.security import hash_password, verify_password
+from src.exceptions import ServiceUnavailableError
+
+HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "Operaciones de bcrypt en ejecución o en espera en el pool de hashing"
+)
+HASH_LATENCY = Histogram(
+    "password_hash_seconds",
+    "Latencia de las operaciones de bcrypt, incluida la espera en cola",
+    labelnames=("operation",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+)
+HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Operaciones de bcrypt rechazadas porque la cola del pool estaba llena"
+)
+
+
+class PasswordHasher:
+    """Ejecuta bcrypt en un pool de procesos acotado para no bloquear los hilos de las peticiones.
+
+    Args:
+        workers (int): Número de procesos del pool
+        max_pending (int): Operaciones máximas en ejecución o en cola antes de rechazar con 503
+        rounds (int): Factor de coste de bcrypt usado al generar nuevos hashes
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        HASH_QUEUE_DEPTH.set_function(lambda: self._pending)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def hash(self, password: str) -> str:
+        """Genera el hash de la contraseña en el pool de procesos.
+
+        Raises:
+            ServiceUnavailableError: Si la cola del pool está llena
+        """
+        return await self._run("hash", hash_password, password, self.rounds)
+
+    async def verify(self, password: str, pwd_hash: str) -> bool:
+        """Verifica la contraseña contra su hash en el pool de procesos.
+
+        Raises:
+            ServiceUnavailableError: Si la cola del pool está llena
+        """
+        return await self._run("verify", verify_password, password, pwd_hash)
+
+    def configure(self, **settings) -> None:
+        """Cambia la configuración del pool; el pool actual se cierra y se vuelve a crear al usarse."""
+        self.shutdown()
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise AttributeError(f"Opción desconocida: '{name}'")
+            setattr(self, name, value)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _run(self, operation: str, function, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                HASH_REJECTED.inc()
+                raise ServiceUnavailableError()
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            executor = self._executor
+        start = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(executor.submit(function, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+            HASH_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+
+password_hasher = PasswordHasher(
+    workers=CONFIG.HASH_WORKERS,
+    max_pending=CONFIG.HASH_QUEUE_SIZE,
+    rounds=CONFIG.BCRYPT_ROUNDS
+)
@@ -0,0 +1,86 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Hashable, Iterable, NamedTuple, Optional
+
+
+class LeaderboardEntry(NamedTuple):
+    rank: int
+    member: Hashable
+    owner: Hashable
+    score: int
+
+
+class Leaderboard:
+    """Clasificación en memoria ordenada por puntuación descendente.
+
+    Guarda una lista ordenada de claves `(-puntuación, miembro)` para que el rango de un
+    miembro se obtenga con una búsqueda binaria. Los empates comparten rango (1, 2, 2, 4) y
+    se ordenan por miembro, igual que `ChallengeParticipantRepository.get_scores`.
+
+    Args:
+        rows (Iterable[tuple]): Tuplas (miembro, propietario, puntuación) iniciales
+    """
+
+    def __init__(self, rows: Iterable[tuple[Hashable, Hashable, int]] = ()):
+        self._lock = threading.Lock()
+        self._scores: dict[Hashable, int] = {}
+        self._owners: dict[Hashable, Hashable] = {}
+        self._members_by_owner: dict[Hashable, Hashable] = {}
+        for member, owner, score in rows:
+            self._scores[member] = score
+            self._owners[member] = owner
+            self._members_by_owner[owner] = member
+        self._keys = sorted((-score, member) for member, score in self._scores.items())
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, member: Hashable) -> bool:
+        return member in self._scores
+
+    def set(self, member: Hashable, owner: Hashable, score: int) -> None:
+        """Añade el miembro o cambia su puntuación."""
+        with self._lock:
+            self._discard(member)
+            self._scores[member] = score
+            self._owners[member] = owner
+            self._members_by_owner[owner] = member
+            insort(self._keys, (-score, member))
+
+    def remove(self, member: Hashable) -> None:
+        with self._lock:
+            self._discard(member)
+
+    def top(self, limit: int) -> list[LeaderboardEntry]:
+        with self._lock:
+            return self._entries(0, limit)
+
+    def around(self, owner: Hashable, neighbours: int) -> Optional[tuple[LeaderboardEntry, list[LeaderboardEntry]]]:
+        """Obtiene la posición del propietario y los `neighbours` miembros por encima y por debajo.
+
+        Returns:
+            Optional[tuple]: (entrada del propietario, entradas vecinas incluida la suya) o None si no participa
+        """
+        with self._lock:
+            member = self._members_by_owner.get(owner)
+            if member is None:
+                return None
+            index = bisect_left(self._keys, (-self._scores[member], member))
+            entries = self._entries(max(index - neighbours, 0), index + neighbours + 1)
+            return next(entry for entry in entries if entry.member == member), entries
+
+    def _entries(self, start: int, stop: int) -> list[LeaderboardEntry]:
+        entries = []
+        for negative_score, member in self._keys[start:stop]:
+            rank = bisect_left(self._keys, (negative_score,)) + 1
+            entries.append(LeaderboardEntry(rank, member, self._owners[member], -negative_score))
+        return entries
+
+    def _discard(self, member: Hashable) -> None:
+        score = self._scores.pop(member, None)
+        if score is None:
+            return
+        del self._keys[bisect_left(self._keys, (-score, member))]
+        owner = self._owners.pop(member)
+        if self._members_by_owner.get(owner) == member:
+            del self._members_by_owner[owner]
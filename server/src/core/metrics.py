@@ -0,0 +1,193 @@
+import threading
+from bisect import bisect_left
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """Métrica en memoria del proceso, sin dependencias externas.
+
+    Args:
+        name (str): Nombre de la métrica
+        documentation (str): Descripción de la métrica
+        labelnames (tuple[str, ...], optional): Nombres de las etiquetas de la métrica
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], "Metric"] = {}
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def labels(self, *values: str, **kwvalues: str):
+        """Obtiene (o crea) la serie correspondiente a los valores de las etiquetas."""
+        key = values or tuple(kwvalues[name] for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self):
+        """Series de la métrica como tuplas (etiquetas, serie)."""
+        if not self.labelnames:
+            return [({}, self)]
+        return [(dict(zip(self.labelnames, key)), child) for key, child in list(self._children.items())]
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0.0
+        self._function: Callable[[], float] | None = None
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function else self._value
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Calcula el valor de la métrica en el momento de leerla."""
+        self._function = function
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    observe = Histogram.observe
+
+
+REGISTRY: dict[str, Metric] = {}
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_text(registry: dict[str, Metric] = REGISTRY) -> str:
+    """Método para exportar las métricas en el formato de texto de Prometheus
+
+    Args:
+        registry (dict[str, Metric], optional): Métricas a exportar; por defecto, todas las registradas
+
+    Returns:
+        str: Cuerpo de la respuesta de `/metrics`
+    """
+    lines = []
+    for name, metric in sorted(registry.items()):
+        lines.append(f"# HELP {name} {_escape(metric.documentation, quotes=False)}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        for labels, series in metric.samples():
+            if metric.type == "histogram":
+                cumulative = 0
+                for bound, count in zip((*series.buckets, "+Inf"), series.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(series.sum)}")
+                lines.append(f"{name}_count{_labels(labels)} {series.count}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {_number(series.value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict, **extra) -> str:
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _escape(value: str, quotes: bool = True) -> str:
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quotes else value
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
@@ -0,0 +1,262 @@
+import logging
+import time
+from typing import Optional
+from anyio import to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from src.core.admission import ConcurrencyLimiter, RateLimiter, retry_after
+from src.core.config import CONFIG
+from src.core.metrics import Counter, Gauge, Histogram
+from src.core.network import client_ip
+from src.core.query_counter import track_queries
+from src.core.security import token_username
+
+logger = logging.getLogger(__name__)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Peticiones HTTP atendidas por método, ruta y código de estado",
+    labelnames=("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por método y ruta",
+    labelnames=("method", "route")
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Peticiones HTTP en curso"
+)
+
+THREADPOOL_BUSY = Gauge(
+    "threadpool_busy_threads",
+    "Hilos del threadpool de AnyIO ocupados por rutas y dependencias síncronas"
+)
+THREADPOOL_SATURATION = Gauge(
+    "threadpool_saturation",
+    "Hilos ocupados respecto al límite del threadpool de AnyIO"
+)
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Consultas SQL ejecutadas por petición",
+    labelnames=("route",),
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+DB_REPEATED_QUERIES = Counter(
+    "db_repeated_queries_total",
+    "Peticiones que repitieron una misma sentencia más veces que QUERY_REPEAT_THRESHOLD",
+    labelnames=("route",)
+)
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Peticiones rechazadas por límite de tasa (429) o por saturación del grupo de rutas (503)",
+    labelnames=("group", "reason")
+)
+ADMISSION_QUEUE_SECONDS = Histogram(
+    "admission_queue_seconds",
+    "Tiempo de espera en la cola de admisión por grupo de rutas",
+    labelnames=("group",)
+)
+ADMISSION_ACTIVE = Gauge(
+    "admission_active_requests",
+    "Peticiones en curso por grupo de rutas",
+    labelnames=("group",)
+)
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+# Rutas que calculan un hash bcrypt además del login
+PASSWORD_ROUTES = frozenset({("POST", "/api/users")})
+
+# Las rutas sin coincidencia se agrupan para no crear una serie por cada URL desconocida
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que registra el número, el código de estado y la latencia de cada petición.
+
+    La ruta se etiqueta con la plantilla de FastAPI (`/api/habits/{habit_id}`) y no con la URL,
+    de modo que el número de series está acotado por el número de rutas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._series: dict[tuple[str, str, int], tuple] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else UNMATCHED_ROUTE, status_code)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = (
+                    HTTP_REQUESTS.labels(key[0], key[1], str(status_code)),
+                    HTTP_LATENCY.labels(key[0], key[1])
+                )
+            series[0].inc()
+            series[1].observe(elapsed)
+
+
+class QueryCounterMiddleware:
+    """Middleware ASGI que cuenta las consultas SQL y el tiempo en base de datos de cada petición.
+
+    Los totales se envían en la cabecera `Server-Timing`. Si una petición ejecuta la misma
+    sentencia más de `repeat_threshold` veces se registra un aviso de posible N+1.
+
+    Args:
+        app: Aplicación ASGI
+        repeat_threshold (int): Repeticiones máximas de una sentencia antes de avisar
+    """
+
+    def __init__(self, app, repeat_threshold: int):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                route = route.path if route is not None else UNMATCHED_ROUTE
+                DB_QUERIES_PER_REQUEST.labels(route).observe(stats.count)
+                repeated = stats.repeated(self.repeat_threshold)
+                if repeated:
+                    DB_REPEATED_QUERIES.labels(route).inc()
+                    for shape, count in repeated.items():
+                        logger.warning("Posible N+1 en %s %s: %d ejecuciones de %s", scope["method"], route, count, shape)
+
+
+def route_group(method: str, path: str) -> Optional[str]:
+    """Grupo de admisión de una petición: auth, exports, writes o reads (None si no es de la API)."""
+    if not path.startswith("/api/"):
+        return None
+    if path.startswith("/api/auth/") or (method, path.rstrip("/")) in PASSWORD_ROUTES:
+        return "auth"
+    if path.endswith("/export"):
+        return "exports"
+    if method in WRITE_METHODS:
+        return "writes"
+    return "reads"
+
+
+def _client_user(headers: Headers) -> Optional[str]:
+    return token_username(headers.get("authorization", ""))
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que rechaza pronto las peticiones que el proceso no puede atender.
+
+    Primero aplica los token buckets por IP y por usuario (429 con Retry-After) y después
+    el límite de concurrencia del grupo de la ruta (ver `route_group`): si la cola del grupo
+    está llena o la espera supera `queue_timeout`, responde 503 sin llegar al threadpool.
+
+    Args:
+        app: Aplicación ASGI
+        limits (dict[str, tuple[int, int]]): (concurrencia, tamaño de cola) por grupo; los grupos ausentes no se limitan
+        queue_timeout (float): Segundos máximos de espera en la cola
+        ip_rate (Optional[RateLimiter]): Token buckets por IP del cliente
+        user_rate (Optional[RateLimiter]): Token buckets por usuario del token Bearer
+    """
+
+    def __init__(
+        self, 
+        app, 
+        limits: dict[str, tuple[int, int]], 
+        queue_timeout: float, 
+        ip_rate: Optional[RateLimiter] = None, 
+        user_rate: Optional[RateLimiter] = None
+    ):
+        self.app = app
+        self.limiters = {
+            group: ConcurrencyLimiter(limit, queue_size, queue_timeout)
+            for group, (limit, queue_size) in limits.items()
+        }
+        self.ip_rate = ip_rate
+        self.user_rate = user_rate
+
+    async def __call__(self, scope, receive, send):
+        group = route_group(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        wait = self._rate_limit_wait(scope)
+        if wait:
+            ADMISSION_REJECTED.labels(group, "rate_limited").inc()
+            response = JSONResponse(
+                status_code=429,
+                content={"status": 429, "message": "Demasiadas peticiones, intente de nuevo más tarde."},
+                headers={"Retry-After": retry_after(wait)}
+            )
+            await response(scope, receive, send)
+            return
+
+        limiter = self.limiters.get(group)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        if not await limiter.acquire():
+            ADMISSION_REJECTED.labels(group, "overloaded").inc()
+            response = JSONResponse(
+                status_code=503,
+                content={"status": 503, "message": "El servicio está saturado, intente de nuevo más tarde."},
+                headers={"Retry-After": retry_after(limiter.timeout)}
+            )
+            await response(scope, receive, send)
+            return
+        ADMISSION_QUEUE_SECONDS.labels(group).observe(time.perf_counter() - start)
+        active = ADMISSION_ACTIVE.labels(group)
+        active.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            active.dec()
+            limiter.release()
+
+    def _rate_limit_wait(self, scope) -> float:
+        wait = 0.0
+        if self.ip_rate is not None and scope.get("client"):
+            wait = self.ip_rate.acquire(client_ip(HTTPConnection(scope)))
+        if not wait and self.user_rate is not None:
+            user = _client_user(Headers(scope=scope))
+            if user is not None:
+                wait = self.user_rate.acquire(user)
+        return wait
+
+
+def observe_threadpool() -> None:
+    """Actualiza las métricas del threadpool; debe llamarse desde el event loop."""
+    limiter = to_thread.current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SATURATION.set(limiter.borrowed_tokens / limiter.total_tokens)
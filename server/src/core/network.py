@@ -0,0 +1,26 @@
+from starlette.requests import HTTPConnection
+from src.core.config import CONFIG
+
+
+def client_ip(connection: HTTPConnection) -> str:
+    """IP del cliente, tomada de X-Forwarded-For solo si la conexión llega de un proxy de TRUSTED_PROXIES.
+
+    Se recorre la cabecera de derecha a izquierda y se devuelve la primera dirección que no es
+    un proxy de confianza, ya que las de la izquierda las puede escribir el propio cliente.
+    Sin proxies de confianza, todos los clientes detrás de un proxy comparten su IP.
+
+    Args:
+        connection (HTTPConnection): Petición, o `HTTPConnection(scope)` desde un middleware ASGI
+
+    Returns:
+        str: IP del cliente, o "" si el servidor no la conoce
+    """
+    trusted = {proxy.strip() for proxy in CONFIG.TRUSTED_PROXIES.split(",") if proxy.strip()}
+    host = connection.client.host if connection.client else ""
+    if host not in trusted:
+        return host
+    for address in reversed(connection.headers.get("x-forwarded-for", "").split(",")):
+        host = address.strip() or host
+        if host not in trusted:
+            break
+    return host
@@ -0,0 +1,113 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Generic, List, NamedTuple, Optional, Sequence, TypeVar
+from uuid import UUID
+from fastapi import Query, Request, Response
+from src.core.config import CONFIG
+from src.core.serialization import fast_response
+from src.exceptions import BadRequest
+
+T = TypeVar("T")
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page(NamedTuple, Generic[T]):
+    """Página de resultados y cursor opaco para pedir la siguiente (None si es la última)."""
+    items: list[T]
+    next_cursor: Optional[str]
+
+
+class PageParams(NamedTuple):
+    cursor: Optional[str]
+    limit: int
+
+
+def page_params(
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor"),
+    limit: int = Query(CONFIG.DEFAULT_PAGE_SIZE, ge=1, le=CONFIG.MAX_PAGE_SIZE)
+) -> PageParams:
+    """Dependencia de FastAPI con los parámetros de paginación de las rutas de listado."""
+    return PageParams(cursor, limit)
+
+
+def ids_param(
+    ids: Optional[List[str]] = Query(
+        None, description="Ids separados por comas (o repetidos) para obtener esos registros en ese orden"
+    )
+) -> Optional[list[UUID]]:
+    """Dependencia de FastAPI con los ids pedidos en `?ids=`, o None si no se envió el parámetro.
+
+    Raises:
+        BadRequest: Si algún id no es un UUID o se piden más de MAX_PAGE_SIZE
+    """
+    if ids is None:
+        return None
+    values = [value.strip() for raw in ids for value in raw.split(",") if value.strip()]
+    if len(values) > CONFIG.MAX_PAGE_SIZE:
+        raise BadRequest(f"Se pueden pedir como máximo {CONFIG.MAX_PAGE_SIZE} ids.")
+    try:
+        return [UUID(value) for value in values]
+    except ValueError as e:
+        raise BadRequest("Lista de ids inválida.") from e
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Método para codificar las claves de ordenación del último registro de una página
+
+    Args:
+        values (Sequence): Valores de las columnas de ordenación (fechas, UUIDs...)
+
+    Returns:
+        str: Cursor opaco en base64 apto para URLs
+    """
+    raw = json.dumps([str(value) if isinstance(value, UUID) else value.isoformat() for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> tuple:
+    """Método para decodificar un cursor generado por `encode_cursor`
+
+    Args:
+        cursor (str): Cursor recibido del cliente
+        types (Sequence[type]): Tipo de cada columna de ordenación (datetime, date o UUID)
+
+    Raises:
+        BadRequest: Si el cursor no es válido
+
+    Returns:
+        tuple: Valores de las columnas de ordenación
+    """
+    parsers = {datetime: datetime.fromisoformat, date: date.fromisoformat, UUID: UUID}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(parsers[type_](value) for type_, value in zip(types, values))
+    except (ValueError, TypeError, KeyError) as e:
+        raise BadRequest("Cursor de paginación inválido.") from e
+
+
+def page_headers(request: Request, page: Page) -> dict[str, str]:
+    """Cabeceras X-Next-Cursor y Link con el cursor de la siguiente página (vacío si es la última)."""
+    if page.next_cursor is None:
+        return {}
+    next_url = request.url.include_query_params(cursor=page.next_cursor)
+    return {NEXT_CURSOR_HEADER: page.next_cursor, "Link": f'<{next_url}>; rel="next"'}
+
+
+def page_items(request: Request, response: Response, page: Page[T]) -> list[T] | Response:
+    """Añade a la respuesta el cursor de la siguiente página y devuelve los registros de la página.
+
+    El cursor se envía en la cabecera X-Next-Cursor y como enlace `rel="next"` en la
+    cabecera Link, de modo que el cuerpo de los listados sigue siendo una lista JSON.
+    Con FAST_JSON_RESPONSES la página se devuelve ya serializada (ver `fast_response`).
+    """
+    headers = page_headers(request, page)
+    fast = fast_response(request, page.items, headers)
+    if fast is not None:
+        return fast
+    response.headers.update(headers)
+    return page.items
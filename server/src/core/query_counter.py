@@ -0,0 +1,70 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)|\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryStats:
+    """Número de consultas, tiempo en base de datos y forma de cada sentencia ejecutada en una petición."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    @property
+    def max_repeats(self) -> int:
+        return max(self.shapes.values(), default=0)
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """Sentencias ejecutadas más de `threshold` veces (síntoma de un patrón N+1)."""
+        return {shape: count for shape, count in self.shapes.items() if count > threshold}
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    def server_timing(self) -> str:
+        """Valor de la cabecera Server-Timing con el tiempo y el número de consultas."""
+        return f'db;dur={self.duration * 1000:.3f};desc="{self.count} queries", db-repeat;desc="{self.max_repeats}"'
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Normaliza la sentencia para que las que solo difieren en el número de parámetros de un IN coincidan."""
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Cuenta las consultas ejecutadas dentro del bloque, incluidas las de hilos que hereden el contexto."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get("query_start")
+    if stats is not None and starts:
+        stats.record(statement, time.perf_counter() - starts.pop())
@@ -0,0 +1,262 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import partial
+from typing import Any, Awaitable, Callable, Hashable, Iterable, NamedTuple, Optional, Sequence
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+from src.core.cache import TTLCache
+from src.core.config import CONFIG
+from src.core.serialization import dump_json, supports
+
+# Etiqueta (tabla, id) de una fila, o (tabla, None) para respuestas que dependen de toda la tabla
+Tag = tuple[str, Optional[Hashable]]
+
+_PENDING_KEY = "response_cache_pending"
+# Filas pendientes al abrir cada SAVEPOINT, para descartar solo las suyas si se deshace
+_SAVEPOINTS_KEY = "response_cache_savepoints"
+
+
+class CachedResponse(NamedTuple):
+    # None hasta que se serializa con `serialize`: un 304 no necesita el cuerpo
+    body: Optional[bytes]
+    etag: str
+    last_modified: Optional[datetime]
+    headers: dict[str, str]
+    tags: frozenset[Tag]
+    # Construida con una réplica: puede no incluir escrituras recientes del primario
+    replica: bool = False
+    serialize: Optional[Callable[[], bytes]] = None
+
+
+class ResponseCache(TTLCache):
+    """Caché de cuerpos JSON ya renderizados con sus validadores (ETag y Last-Modified).
+
+    Cada entrada se etiqueta con las filas y tablas de las que depende y se invalida
+    cuando una sesión confirma cambios sobre ellas. El TTL limita cuánto puede servirse
+    una entrada que solo ha cambiado en otro proceso.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        super().__init__("response", maxsize, ttl, enabled)
+        self._keys_by_tag: dict[Tag, set[Hashable]] = {}
+        self.generation = 0
+
+    def set(self, key: Hashable, value: CachedResponse, ttl: Optional[float] = None) -> None:
+        super().set(key, value, ttl)
+        with self._lock:
+            if key in self._data:
+                for tag in value.tags:
+                    self._keys_by_tag.setdefault(tag, set()).add(key)
+
+    def invalidate(self, tags: Iterable[Tag]) -> None:
+        """Descarta las entradas que dependen de las filas o tablas indicadas."""
+        with self._lock:
+            self.generation += 1
+            for table, row_id in set(tags):
+                matched = [tag for tag in self._keys_by_tag if tag[0] == table] if row_id is None \
+                    else [(table, row_id), (table, None)]
+                for tag in matched:
+                    for key in self._keys_by_tag.pop(tag, ()):
+                        if key in self._data:
+                            self._evict(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self._keys_by_tag.clear()
+
+    def _evict(self, key: Hashable) -> None:
+        _, entry = self._data.pop(key)
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+response_cache = ResponseCache(
+    maxsize=CONFIG.RESPONSE_CACHE_SIZE,
+    ttl=CONFIG.RESPONSE_CACHE_TTL,
+    enabled=CONFIG.RESPONSE_CACHE_ENABLED
+)
+
+
+def render(
+    content: Any,
+    model: Any,
+    rows: Sequence[Any],
+    tables: Sequence[str] = (),
+    headers: Optional[dict[str, str]] = None
+) -> CachedResponse:
+    """Método para renderizar una respuesta cacheable a partir de filas de la base de datos
+
+    Args:
+        content (Any): Objeto o lista que se serializa con el esquema `model`
+        model (Any): Esquema de respuesta (el mismo que el `response_model` de la ruta)
+        rows (Sequence[Any]): Filas incluidas en la respuesta; su `updated_at` forma el ETag y el Last-Modified
+        tables (Sequence[str], optional): Tablas cuyos cambios invalidan la respuesta (listados)
+        headers (Optional[dict[str, str]], optional): Cabeceras adicionales que se guardan con el cuerpo
+
+    Returns:
+        CachedResponse: Validadores y etiquetas de invalidación; el cuerpo se serializa solo si no es un 304
+    """
+    versions = hashlib.sha1()
+    last_modified = None
+    for row in rows:
+        updated_at = _as_utc(row.updated_at)
+        versions.update(f"{row.id}:{updated_at.isoformat()};".encode())
+        last_modified = updated_at if last_modified is None else max(last_modified, updated_at)
+    tags = {(type(row).__tablename__, row.id) for row in rows} | {(table, None) for table in tables}
+    return CachedResponse(
+        body=None,
+        etag=f'"{versions.hexdigest()}"',
+        last_modified=last_modified.replace(microsecond=0) if last_modified else None,
+        headers=headers or {},
+        tags=frozenset(tags),
+        serialize=partial(_serialize, content, model)
+    )
+
+
+def _serialize(content: Any, model: Any) -> bytes:
+    if CONFIG.FAST_JSON_RESPONSES and supports(model):
+        return dump_json(model, content)
+    data = TypeAdapter(model).validate_python(content, from_attributes=True)
+    return JSONResponse(jsonable_encoder(data)).body
+
+
+def cached_response(request: Request, build: Callable[[], CachedResponse]) -> Response:
+    """Sirve la respuesta desde la caché o la construye con `build`, respondiendo 304 si el cliente ya la tiene.
+
+    La caché se indexa por la ruta y los parámetros de la petición; solo se debe usar en
+    lecturas cuya respuesta no dependa del usuario autenticado.
+    """
+    key = (request.url.path, request.url.query)
+    replica = _reads_from_replica(request)
+    entry = response_cache.get(key)
+    if entry is None or (entry.replica and not replica):
+        generation = response_cache.generation
+        return _respond_built(request, key, build()._replace(replica=replica), generation)
+    return _respond(request, entry)
+
+
+async def async_cached_response(request: Request, build: Callable[[], Awaitable[CachedResponse]]) -> Response:
+    """Igual que `cached_response` para rutas asíncronas."""
+    key = (request.url.path, request.url.query)
+    replica = _reads_from_replica(request)
+    entry = response_cache.get(key)
+    if entry is None or (entry.replica and not replica):
+        generation = response_cache.generation
+        return _respond_built(request, key, (await build())._replace(replica=replica), generation)
+    return _respond(request, entry)
+
+
+def _reads_from_replica(request: Request) -> bool:
+    # Lo marca `get_read_session`; las peticiones que leen del primario (p. ej. justo después de
+    # escribir) no reutilizan respuestas construidas con una réplica
+    return getattr(request.state, "read_replica", False)
+
+
+def _respond_built(request: Request, key: Hashable, entry: CachedResponse, generation: int) -> Response:
+    # Los validadores salen de las filas: si el cliente ya tiene la respuesta no se serializa ni se guarda
+    if not _not_modified(request, entry):
+        entry = entry._replace(body=entry.serialize(), serialize=None)
+        _store(key, entry, generation)
+    return _respond(request, entry)
+
+
+def _store(key: Hashable, entry: CachedResponse, generation: int) -> None:
+    # Si se confirmaron cambios mientras se construía, la respuesta puede estar desactualizada
+    if generation == response_cache.generation:
+        # Una respuesta de réplica puede llegar tarde a la invalidación: solo dura el lag tolerado
+        response_cache.set(key, entry, CONFIG.DB_READ_YOUR_WRITES_SECONDS if entry.replica else None)
+
+
+def _respond(request: Request, entry: CachedResponse) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if entry.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(entry.last_modified, usegmt=True)
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers={**entry.headers, **headers})
+
+
+def _not_modified(request: Request, entry: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = {etag.strip().removeprefix("W/") for etag in if_none_match.split(",")}
+        return "*" in etags or entry.etag in etags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and entry.last_modified is not None:
+        try:
+            return entry.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite devuelve fechas sin zona horaria; se guardan siempre en UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _pending(session: Session) -> set[Tag]:
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_rows(session: Session, flush_context) -> None:
+    for row in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(type(row), "__tablename__", None)
+        if table is not None:
+            _pending(session).add((table, getattr(row, "id", None)))
+
+
+# Opción de ejecución con el id de la única fila que escribe una sentencia INSERT/UPDATE
+ROW_ID_OPTION = "response_cache_row_id"
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_statements(state: ORMExecuteState) -> None:
+    # INSERT/UPDATE/DELETE masivos no pasan por el flush: se invalida toda la tabla,
+    # salvo que la sentencia indique la única fila que modifica
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None:
+            _pending(state.session).add((table.name, state.execution_options.get(ROW_ID_OPTION)))
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session: Session, transaction) -> None:
+    if transaction.nested:
+        session.info.setdefault(_SAVEPOINTS_KEY, {})[transaction] = frozenset(session.info.get(_PENDING_KEY, ()))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_rows(session: Session) -> None:
+    # También se emite al liberar un SAVEPOINT; sus filas se invalidan con la transacción que lo contiene
+    if session.in_nested_transaction():
+        session.info.get(_SAVEPOINTS_KEY, {}).pop(session.get_nested_transaction(), None)
+        return
+    session.info.pop(_SAVEPOINTS_KEY, None)
+    tags = session.info.pop(_PENDING_KEY, None)
+    if tags:
+        response_cache.invalidate(tags)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back_rows(session: Session, previous_transaction) -> None:
+    marks = session.info.get(_SAVEPOINTS_KEY, {})
+    if previous_transaction.nested:
+        # Solo se descartan las filas escritas desde que se abrió el SAVEPOINT
+        if previous_transaction in marks:
+            session.info[_PENDING_KEY] = set(marks.pop(previous_transaction))
+        return
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_SAVEPOINTS_KEY, None)
@@ -1,4 +1,6 @@
+import re
 from datetime import datetime, timezone, timedelta
+from typing import Optional
 import jwt
 import bcrypt
 from cryptography.fernet import Fernet
@@ -6,22 +8,36 @@ from src.core.config import CONFIG
 from src.schemas.user import TokenData
 
 ALGORITHM = "HS256"
+BCRYPT_HASH = re.compile(r"\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}")
 
 try:
     cipher = Fernet(CONFIG.CIPHER_KEY.encode())
 except Exception:
     cipher = Fernet(Fernet.generate_key())
 
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: int = CONFIG.BCRYPT_ROUNDS) -> str:
      """Método para generar un hash de la contraseña del usuario
 
      Args:
          password (str): Contraseña en texto plano del usuario   
+         rounds (int, optional): Factor de coste de bcrypt. Por defecto CONFIG.BCRYPT_ROUNDS.
 
      Returns:
          str: Hash de la contraseña del usuario
      """
-     return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+     return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def is_password_hash(value: str) -> bool:
+     """Método para saber si un valor ya es un hash de bcrypt
+
+     Args:
+         value (str): Valor a comprobar
+
+     Returns:
+         bool: Retorna True si el valor tiene el formato de un hash de bcrypt
+     """
+     return BCRYPT_HASH.fullmatch(value) is not None
 
 
 def verify_password(password: str, pwd_hash: str) -> bool:
@@ -72,4 +88,58 @@ def create_access_token(data: TokenData, expires_delta: timedelta) -> str:
      expire = datetime.now(timezone.utc) + expires_delta
      to_encode.update({"exp": expire})
      encoded_jwt = jwt.encode(to_encode, CONFIG.SECRET_KEY, algorithm=ALGORITHM)
-     return encoded_jwt
\ No newline at end of file
+     return encoded_jwt
+
+
+def token_username(authorization: str) -> Optional[str]:
+     """Método para obtener el usuario de un header `Authorization: Bearer <token>` sin consultar la base de datos
+
+     Args:
+         authorization (str): Valor del header Authorization
+
+     Returns:
+         Optional[str]: `username` del token, o None si falta, no es válido o expiró
+     """
+     scheme, _, token = authorization.partition(" ")
+     if scheme.lower() != "bearer" or not token:
+          return None
+     try:
+          return jwt.decode(token, CONFIG.SECRET_KEY, algorithms=[ALGORITHM]).get("username")
+     except jwt.PyJWTError:
+          return None
+
+
+def create_email_token(email: str, purpose: str, expires_delta: timedelta) -> str:
+     """Método para crear el token firmado de los enlaces enviados por correo
+
+     El token no incluye `username`, por lo que no sirve como token de acceso.
+
+     Args:
+         email (str): Correo del usuario
+         purpose (str): Acción que autoriza el enlace (p. ej. "confirm_email")
+         expires_delta (timedelta): Tiempo de validez del enlace
+
+     Returns:
+         str: Token para incluir en el enlace
+     """
+     expire = datetime.now(timezone.utc) + expires_delta
+     return jwt.encode({"sub": email, "purpose": purpose, "exp": expire}, CONFIG.SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_email_token(token: str, purpose: str) -> Optional[str]:
+     """Método para validar un token de correo y obtener el email al que pertenece
+
+     Args:
+         token (str): Token recibido en el enlace
+         purpose (str): Acción que se espera que autorice
+
+     Returns:
+         Optional[str]: Email del usuario, o None si el token no es válido, expiró o es de otra acción
+     """
+     try:
+          payload = jwt.decode(token, CONFIG.SECRET_KEY, algorithms=[ALGORITHM])
+     except jwt.PyJWTError:
+          return None
+     if payload.get("purpose") != purpose:
+          return None
+     return payload.get("sub")
@@ -0,0 +1,126 @@
+"""Serialización JSON rápida de respuestas construidas a partir de filas de la base de datos.
+
+FastAPI valida cada objeto ORM contra el `response_model` (`from_attributes=True`) y después
+lo convierte con `jsonable_encoder` y el `json` de la biblioteca estándar. Para filas que ya
+vienen de la base de datos esa validación no aporta nada, así que aquí cada esquema `*Read`
+se compila una sola vez en un extractor que lee los atributos en el orden de sus campos y
+deja UUID, fechas y datetimes para que orjson los codifique de forma nativa. La salida es
+idéntica byte a byte a la de FastAPI.
+
+Se activa con FAST_JSON_RESPONSES. Si orjson no está instalado se usa `json` con el mismo
+formato, de modo que el cambio solo afecta al rendimiento.
+"""
+import json
+import types
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Callable, Literal, Optional, Union, get_args, get_origin
+from uuid import UUID
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+from src.core.config import CONFIG
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+Encoder = Callable[[Any], Any]
+PASSTHROUGH = (str, int, bool, UUID, date, datetime, type(None))
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _optional(encoder: Encoder) -> Encoder:
+    return lambda value: None if value is None else encoder(value)
+
+
+def _sequence(encoder: Encoder) -> Encoder:
+    if encoder is _identity:
+        return list
+    return lambda values: [encoder(value) for value in values]
+
+
+def _model(model: type[BaseModel]) -> Encoder:
+    fields = [(name, _encoder(field.annotation)) for name, field in model.model_fields.items()]
+    if all(encoder is _identity for _, encoder in fields):
+        names = [name for name, _ in fields]
+        return lambda obj: {name: getattr(obj, name) for name in names}
+    return lambda obj: {name: encoder(getattr(obj, name)) for name, encoder in fields}
+
+
+@lru_cache(maxsize=None)
+def _encoder(annotation: Any) -> Encoder:
+    """Compila la conversión de un valor del tipo `annotation` a lo que se le pasa al codificador JSON."""
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        encoders = {_encoder(arg) for arg in get_args(annotation) if arg is not type(None)}
+        if encoders == {_identity}:
+            return _identity
+        if len(encoders) == 1:
+            return _optional(encoders.pop())
+    elif origin in (list, tuple, set, frozenset):
+        return _sequence(_encoder(get_args(annotation)[0]))
+    elif origin is Literal:
+        return _identity
+    elif annotation is float:
+        return _optional(float)
+    elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _model(annotation)
+    elif annotation in PASSTHROUGH:
+        return _identity
+    raise TypeError(f"Tipo no soportado por la serialización rápida: {annotation!r}")
+
+
+def _default(value: Any) -> Any:
+    """Codificación de `json` para los tipos que orjson soporta de forma nativa, con el formato de pydantic."""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if value.utcoffset() == timedelta(0) else text
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def supports(model: Any) -> bool:
+    try:
+        _encoder(model)
+    except TypeError:
+        return False
+    return True
+
+
+def dump_json(model: Any, content: Any) -> bytes:
+    """Serializa `content` con la forma del esquema `model` sin validarlo
+
+    Args:
+        model (Any): Esquema de respuesta, p. ej. `HabitLogRead` o `List[HabitLogRead]`
+        content (Any): Objetos ORM o instancias del esquema con los atributos de `model`
+
+    Returns:
+        bytes: El mismo JSON que FastAPI generaría para `content` con `response_model=model`
+    """
+    data = _encoder(model)(content)
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_UTC_Z)
+    return json.dumps(data, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_response(request: Request, content: Any, headers: Optional[dict[str, str]] = None) -> Optional[Response]:
+    """Respuesta serializada con `dump_json` según el `response_model` de la ruta actual.
+
+    Devuelve None si FAST_JSON_RESPONSES está desactivado o el esquema no está soportado,
+    y entonces la ruta debe devolver `content` para que FastAPI lo serialice como siempre.
+    """
+    if not CONFIG.FAST_JSON_RESPONSES:
+        return None
+    route = request.scope.get("route")
+    model = getattr(route, "response_model", None)
+    if model is None or not supports(model):
+        return None
+    return Response(dump_json(model, content), media_type="application/json", headers=headers)
@@ -0,0 +1,61 @@
+import csv
+import io
+from itertools import islice
+from typing import Iterable, Iterator, Sequence
+from pydantic_core import to_json
+from sqlalchemy import Row
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _batches(rows: Iterable[Row], batch_size: int) -> Iterator[list[Row]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def ndjson_chunks(rows: Iterable[Row], batch_size: int) -> Iterator[bytes]:
+    """Método para serializar filas como JSON delimitado por saltos de línea
+
+    Cada fila se serializa con el mismo formato que usa pydantic para los esquemas
+    `*Read` (UUIDs como texto, fechas en ISO 8601). Se emite un bloque por lote, de
+    modo que la memoria usada depende del tamaño del lote y no del total de filas.
+
+    Args:
+        rows (Iterable[Row]): Filas de SQLAlchemy (p. ej. de un resultado con `yield_per`)
+        batch_size (int): Filas por bloque emitido
+
+    Returns:
+        Iterator[bytes]: Bloques de NDJSON
+    """
+    for batch in _batches(rows, batch_size):
+        yield b"".join(to_json(row._asdict()) + b"\n" for row in batch)
+
+
+def csv_chunks(rows: Iterable[Row], columns: Sequence[str], batch_size: int) -> Iterator[bytes]:
+    """Método para serializar filas como CSV con cabecera
+
+    Args:
+        rows (Iterable[Row]): Filas de SQLAlchemy (p. ej. de un resultado con `yield_per`)
+        columns (Sequence[str]): Nombres de las columnas, en el orden de las filas
+        batch_size (int): Filas por bloque emitido
+
+    Returns:
+        Iterator[bytes]: Bloques de CSV
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in _batches(rows, batch_size):
+        writer.writerows(
+            [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+            for row in batch
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
@@ -59,6 +59,14 @@ class ServerError(ApiError):
             message=message
         )
 
+class ServiceUnavailableError(ApiError):
+    def __init__(self, message = "El servicio está saturado, intente de nuevo más tarde.", retry_after: int = 1):
+        super().__init__(
+            status=503,
+            message=message
+        )
+        self.retry_after = retry_after
+
 
 # Crear los mensajes de respuesta (excepto las exitosas) para FastAPI
 not_found_error = NotFound().to_dict_response()
@@ -67,6 +75,7 @@ bad_request_error = BadRequest().to_dict_response()
 server_error = ServerError().to_dict_response()
 unauthorized_error = UnauthorizedError().to_dict_response()
 forbidden_error = ForbiddenError().to_dict_response()
+service_unavailable_error = ServiceUnavailableError().to_dict_response()
 
 # Diccionarios de respuestas para cada método HTTP
 GET_RESPONSES = {
@@ -1,7 +1,8 @@
 from .common import Base
 from .user import User, UserProfile
-from .habit import Habit, HabitLog
+from .habit import Habit, HabitLog, HabitStats
 from .challenge import Challenge, ChallengeParticipant, ChallengeHabit
+from .email import EmailOutbox
 
 __all__ = [
     "Base",
@@ -9,7 +10,9 @@ __all__ = [
     "UserProfile",
     "Habit",
     "HabitLog",
+    "HabitStats",
     "Challenge",
     "ChallengeParticipant",
     "ChallengeHabit",
+    "EmailOutbox",
 ]
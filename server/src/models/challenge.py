@@ -1,6 +1,7 @@
 from datetime import date, datetime, timezone
 from typing import Optional, List
 from uuid import UUID
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship
 from .common import Base
 
@@ -9,8 +10,12 @@ class Challenge(Base, table=True):
     """Challenge table representation in the database."""
     
     __tablename__ = "tbl_challenges"
+    __table_args__ = (
+        Index("ix_tbl_challenges_created_by_created_at", "created_by", "created_at", "id"),
+        Index("ix_tbl_challenges_is_public_created_at", "is_public", "created_at", "id"),
+    )
     
-    created_by: UUID = Field(foreign_key="tbl_users.id", index=True)
+    created_by: UUID = Field(foreign_key="tbl_users.id", ondelete="CASCADE", index=True)
     title: str = Field(max_length=200)
     start_date: date
     end_date: date
@@ -18,17 +23,21 @@ class Challenge(Base, table=True):
     status: str = Field(default="active", max_length=50)
     
     creator: Optional["User"] = Relationship(back_populates="created_challenges")
-    participants: List["ChallengeParticipant"] = Relationship(back_populates="challenge")
-    challenge_habits: List["ChallengeHabit"] = Relationship(back_populates="challenge")
+    participants: List["ChallengeParticipant"] = Relationship(back_populates="challenge", sa_relationship_kwargs={"passive_deletes": "all"})
+    challenge_habits: List["ChallengeHabit"] = Relationship(back_populates="challenge", sa_relationship_kwargs={"passive_deletes": "all"})
 
 
 class ChallengeParticipant(Base, table=True):
     """Challenge participant table representation in the database."""
     
     __tablename__ = "tbl_challenge_participants"
+    __table_args__ = (
+        Index("ix_tbl_challenge_participants_challenge_id_created_at", "challenge_id", "created_at", "id"),
+        Index("ix_tbl_challenge_participants_user_id_created_at", "user_id", "created_at", "id"),
+    )
     
-    challenge_id: UUID = Field(foreign_key="tbl_challenges.id", index=True)
-    user_id: UUID = Field(foreign_key="tbl_users.id", index=True)
+    challenge_id: UUID = Field(foreign_key="tbl_challenges.id", ondelete="CASCADE", index=True)
+    user_id: UUID = Field(foreign_key="tbl_users.id", ondelete="CASCADE", index=True)
     status: str = Field(default="active", max_length=50)
     current_score: int = Field(default=0)
     joined_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -37,13 +46,25 @@ class ChallengeParticipant(Base, table=True):
     user: Optional["User"] = Relationship(back_populates="challenge_participations")
 
 
+# Leaderboard order: highest score first, ties broken by id
+Index(
+    "ix_tbl_challenge_participants_challenge_id_score",
+    ChallengeParticipant.challenge_id,
+    ChallengeParticipant.current_score.desc(),
+    ChallengeParticipant.id
+)
+
+
 class ChallengeHabit(Base, table=True):
     """Challenge habit table representation in the database."""
     
     __tablename__ = "tbl_challenge_habits"
+    __table_args__ = (
+        Index("ix_tbl_challenge_habits_challenge_id_created_at", "challenge_id", "created_at", "id"),
+    )
     
-    challenge_id: UUID = Field(foreign_key="tbl_challenges.id", index=True)
-    habit_id: UUID = Field(foreign_key="tbl_habits.id", index=True)
+    challenge_id: UUID = Field(foreign_key="tbl_challenges.id", ondelete="CASCADE", index=True)
+    habit_id: UUID = Field(foreign_key="tbl_habits.id", ondelete="CASCADE", index=True)
     points_per_completion: int = Field(default=1)
     
     challenge: Optional["Challenge"] = Relationship(back_populates="challenge_habits")
@@ -7,13 +7,26 @@ class Base(SQLModel):
     """Common fields in the tables of the database."""
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     enabled: bool = Field(default=True)
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     class Config:
         arbitrary_types_allowed = True
         from_attributes = True
 
+    @classmethod
+    def insert_values(cls, values: dict) -> dict:
+        """Values for a Core `INSERT ... RETURNING`, with the effects of the `before_insert` listeners."""
+        return values
+
+    @classmethod
+    def update_values(cls, values: dict) -> dict:
+        """Values for a Core `UPDATE ... RETURNING`, with the effects of the `before_update` listeners.
+
+        Core statements skip the ORM flush, so the listeners below never see them.
+        """
+        return {**values, "updated_at": datetime.now(timezone.utc)}
+
 
 @event.listens_for(Base, "before_update", propagate=True)
 def update_timestamps(mapper, connection, target: Base):
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import Index, Text
+from sqlmodel import Field
+from .common import Base
+
+
+class EmailOutbox(Base, table=True):
+    """Email waiting to be sent, written in the same transaction as the change that triggers it."""
+    
+    __tablename__ = "tbl_email_outbox"
+    __table_args__ = (
+        Index("ix_tbl_email_outbox_status_next_attempt_at", "status", "next_attempt_at", "id"),
+    )
+    
+    recipient: str = Field(max_length=255)
+    subject: str = Field(max_length=255)
+    body: str = Field(sa_type=Text)
+    status: str = Field(default="pending", max_length=20)
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    last_error: Optional[str] = Field(default=None, max_length=500)
+    sent_at: Optional[datetime] = Field(default=None)
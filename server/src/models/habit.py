@@ -1,6 +1,7 @@
 from datetime import date
 from typing import Optional, List
 from uuid import UUID
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, Relationship
 from .common import Base
 
@@ -9,28 +10,58 @@ class Habit(Base, table=True):
     """Habit table representation in the database."""
     
     __tablename__ = "tbl_habits"
+    __table_args__ = (
+        Index("ix_tbl_habits_user_id_created_at", "user_id", "created_at", "id"),
+    )
     
-    user_id: UUID = Field(foreign_key="tbl_users.id", index=True)
+    user_id: UUID = Field(foreign_key="tbl_users.id", ondelete="CASCADE", index=True)
     title: str = Field(max_length=200)
     category: str = Field(max_length=100)
     goal_type: str = Field(max_length=50)
     goal_value: int
     
     user: Optional["User"] = Relationship(back_populates="habits")
-    habit_logs: List["HabitLog"] = Relationship(back_populates="habit", sa_relationship_kwargs={"cascade": "all, delete-orphan"})
-    challenge_habits: List["ChallengeHabit"] = Relationship(back_populates="habit")
+    habit_logs: List["HabitLog"] = Relationship(
+        back_populates="habit", sa_relationship_kwargs={"cascade": "all, delete-orphan", "passive_deletes": True}
+    )
+    challenge_habits: List["ChallengeHabit"] = Relationship(back_populates="habit", sa_relationship_kwargs={"passive_deletes": "all"})
+    stats: Optional["HabitStats"] = Relationship(
+        back_populates="habit",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan", "uselist": False, "passive_deletes": True}
+    )
 
 
 class HabitLog(Base, table=True):
     """Habit log table representation in the database."""
     
     __tablename__ = "tbl_habit_logs"
+    __table_args__ = (
+        Index("ix_tbl_habit_logs_habit_id_log_date", "habit_id", "log_date", "id"),
+        Index("ix_tbl_habit_logs_user_id_log_date", "user_id", "log_date", "id"),
+        UniqueConstraint("habit_id", "log_date", name="uq_tbl_habit_logs_habit_id_log_date"),
+    )
     
-    habit_id: UUID = Field(foreign_key="tbl_habits.id", index=True)
-    user_id: UUID = Field(foreign_key="tbl_users.id", index=True)
+    habit_id: UUID = Field(foreign_key="tbl_habits.id", ondelete="CASCADE", index=True)
+    user_id: UUID = Field(foreign_key="tbl_users.id", ondelete="CASCADE", index=True)
     log_date: date
     progress_value: int
     status: str = Field(max_length=50)
     
     habit: Optional["Habit"] = Relationship(back_populates="habit_logs")
     user: Optional["User"] = Relationship(back_populates="habit_logs")
+
+
+class HabitStats(Base, table=True):
+    """Incrementally maintained statistics of a habit (one row per habit)."""
+    
+    __tablename__ = "tbl_habit_stats"
+    
+    habit_id: UUID = Field(foreign_key="tbl_habits.id", ondelete="CASCADE", unique=True, index=True)
+    total_logs: int = Field(default=0)
+    completed_logs: int = Field(default=0)
+    current_streak: int = Field(default=0)
+    last_completed_date: Optional[date] = Field(default=None)
+    longest_streak: int = Field(default=0)
+    longest_streak_end: Optional[date] = Field(default=None)
+    
+    habit: Optional["Habit"] = Relationship(back_populates="stats")
@@ -3,7 +3,7 @@ from sqlalchemy import event, inspect
 from typing import Optional, List
 from uuid import UUID
 from .common import Base
-from src.core.security import hash_password
+from src.core.security import hash_password, is_password_hash
 
 IMAGE = "https://i.pinimg.com/550x/a8/0e/36/a80e3690318c08114011145fdcfa3ddb.jpg"
 
@@ -26,11 +26,22 @@ class User(Base, table=True):
     is_confirmed: bool = Field(default=False)
     image_url: str = Field(default=IMAGE, nullable=False, max_length=255)
     
-    profile: Optional["UserProfile"] = Relationship(back_populates="user")
-    habits: List["Habit"] = Relationship(back_populates="user")
-    habit_logs: List["HabitLog"] = Relationship(back_populates="user")
-    created_challenges: List["Challenge"] = Relationship(back_populates="creator")
-    challenge_participations: List["ChallengeParticipant"] = Relationship(back_populates="user")
+    profile: Optional["UserProfile"] = Relationship(back_populates="user", sa_relationship_kwargs={"passive_deletes": "all"})
+    habits: List["Habit"] = Relationship(back_populates="user", sa_relationship_kwargs={"passive_deletes": "all"})
+    habit_logs: List["HabitLog"] = Relationship(back_populates="user", sa_relationship_kwargs={"passive_deletes": "all"})
+    created_challenges: List["Challenge"] = Relationship(back_populates="creator", sa_relationship_kwargs={"passive_deletes": "all"})
+    challenge_participations: List["ChallengeParticipant"] = Relationship(back_populates="user", sa_relationship_kwargs={"passive_deletes": "all"})
+
+    @classmethod
+    def insert_values(cls, values: dict) -> dict:
+        return {**super().insert_values(values), "password": _hashed(values["password"])}
+
+    @classmethod
+    def update_values(cls, values: dict) -> dict:
+        values = super().update_values(values)
+        if values.get("password") is not None:
+            values["password"] = _hashed(values["password"])
+        return values
 
 
 class UserProfile(Base, table=True):
@@ -38,7 +49,7 @@ class UserProfile(Base, table=True):
     
     __tablename__ = "tbl_user_profiles"
     
-    user_id: UUID = Field(foreign_key="tbl_users.id", unique=True, index=True)
+    user_id: UUID = Field(foreign_key="tbl_users.id", ondelete="CASCADE", unique=True, index=True)
     display_name: Optional[str] = Field(default=None, max_length=100)
     avatar_url: Optional[str] = Field(default=None, max_length=255)
     timezone: str = Field(default="UTC", max_length=50)
@@ -46,14 +57,18 @@ class UserProfile(Base, table=True):
     user: Optional["User"] = Relationship(back_populates="profile")
 
 
+def _hashed(password: str) -> str:
+    """Hash the password unless the service already hashed it off-thread"""
+    return password if is_password_hash(password) else hash_password(password)
+
 @event.listens_for(User, "before_insert")
 def hash_password_on_insert(mapper, connection, target: User):
-    """Hash password before user creation"""
-    target.password = hash_password(target.password)
+    """Hash password before user creation, unless the service already hashed it off-thread"""
+    target.password = _hashed(target.password)
 
 @event.listens_for(User, "before_update")
 def hash_password_on_update(mapper, connection, target: User):
-    """Hash password only if changed during updates"""
+    """Hash password only if changed during updates and not already hashed"""
     insp = inspect(target)
     if insp.attrs.password.history.has_changes():
-        target.password = hash_password(target.password)
+        target.password = _hashed(target.password)
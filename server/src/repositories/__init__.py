@@ -1,7 +1,18 @@
-from .base import BaseRepository
-from .user import UserRepository, UserProfileRepository
-from .habit import HabitRepository, HabitLogRepository
-from .challenge import ChallengeRepository, ChallengeParticipantRepository, ChallengeHabitRepository
+from .base import BaseRepository, AsyncBaseRepository
+from .user import (
+    UserRepository, UserProfileRepository,
+    AsyncUserRepository, AsyncUserProfileRepository
+)
+from .habit import (
+    HabitRepository, HabitLogRepository, HabitStatsRepository,
+    AsyncHabitRepository, AsyncHabitLogRepository
+)
+from .challenge import (
+    ChallengeRepository, ChallengeParticipantRepository, ChallengeHabitRepository,
+    AsyncChallengeRepository, AsyncChallengeParticipantRepository, AsyncChallengeHabitRepository
+)
+from .email import EmailOutboxRepository
+from .purge import PurgeRepository, habit_purge_plan, challenge_purge_plan, user_purge_plan
 
 __all__ = [
     "BaseRepository",
@@ -9,7 +20,21 @@ __all__ = [
     "UserProfileRepository",
     "HabitRepository",
     "HabitLogRepository",
+    "HabitStatsRepository",
     "ChallengeRepository",
     "ChallengeParticipantRepository",
     "ChallengeHabitRepository",
+    "EmailOutboxRepository",
+    "PurgeRepository",
+    "habit_purge_plan",
+    "challenge_purge_plan",
+    "user_purge_plan",
+    "AsyncBaseRepository",
+    "AsyncUserRepository",
+    "AsyncUserProfileRepository",
+    "AsyncHabitRepository",
+    "AsyncHabitLogRepository",
+    "AsyncChallengeRepository",
+    "AsyncChallengeParticipantRepository",
+    "AsyncChallengeHabitRepository",
 ]
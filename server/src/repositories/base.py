@@ -1,10 +1,71 @@
-from typing import Generic, TypeVar, Type, Optional, List
+from typing import Generic, Iterable, TypeVar, Type, Optional, List
 from uuid import UUID
+from sqlalchemy import Table, insert, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlmodel import Session, select
 from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
+from src.core.database import commit
+from src.core.pagination import Page, encode_cursor, decode_cursor
+from src.core.response_cache import ROW_ID_OPTION
 
 ModelType = TypeVar("ModelType", bound=SQLModel)
 
+# Ids por consulta en `get_many`; deja margen bajo el límite de parámetros de SQLite y PostgreSQL
+IN_CHUNK_SIZE = 500
+
+
+def upsert_statement(session: Session | AsyncSession, table: Table):
+    """Crea un INSERT que admite `on_conflict_do_update` para el dialecto de la sesión (SQLite o PostgreSQL)."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    raise NotImplementedError(f"INSERT ... ON CONFLICT no está soportado en '{dialect}'")
+
+
+def keyset_statement(
+    statement: SelectOfScalar, 
+    sort_columns: tuple, 
+    cursor: Optional[str], 
+    limit: int
+) -> SelectOfScalar:
+    """Ordena por las columnas de ordenación y filtra los registros posteriores al cursor.
+
+    Se pide un registro de más para saber si existe una página siguiente.
+    """
+    if cursor:
+        values = decode_cursor(cursor, [column.type.python_type for column in sort_columns])
+        statement = statement.where(tuple_(*sort_columns) > tuple_(*values))
+    return statement.order_by(*sort_columns).limit(limit + 1)
+
+
+def id_chunks(ids: Iterable[UUID], chunk_size: int) -> tuple[List[UUID], List[List[UUID]]]:
+    """Quita los ids repetidos conservando el orden y los reparte en grupos de `chunk_size` para `IN`."""
+    unique = list(dict.fromkeys(ids))
+    return unique, [unique[start:start + chunk_size] for start in range(0, len(unique), chunk_size)]
+
+
+def insert_returning(model: Type[ModelType], obj: ModelType):
+    """INSERT de `obj` que devuelve la fila guardada, con los valores que pondrían los listeners de `before_insert`."""
+    values = model.insert_values(obj.model_dump())
+    return insert(model.__table__).values(**values).returning(*model.__table__.c), values["id"]
+
+
+def update_returning(model: Type[ModelType], id: UUID, update_data: dict):
+    """UPDATE por id que devuelve la fila modificada; como `update`, ignora los valores None."""
+    values = model.update_values({field: value for field, value in update_data.items() if value is not None})
+    return update(model.__table__).where(model.__table__.c.id == id).values(**values).returning(*model.__table__.c)
+
+
+def keyset_page(rows: List[ModelType], sort_columns: tuple, limit: int) -> Page[ModelType]:
+    if len(rows) <= limit:
+        return Page(rows, None)
+    last = rows[limit - 1]
+    return Page(rows[:limit], encode_cursor([getattr(last, column.key) for column in sort_columns]))
+
 
 class BaseRepository(Generic[ModelType]):
     def __init__(self, model: Type[ModelType], session: Session):
@@ -13,27 +74,129 @@ class BaseRepository(Generic[ModelType]):
     
     def create(self, obj: ModelType) -> ModelType:
         self.session.add(obj)
-        self.session.commit()
+        commit(self.session)
         self.session.refresh(obj)
         return obj
     
+    def insert(self, obj: ModelType) -> ModelType:
+        """Como `create`, pero en un solo viaje a la base de datos (`INSERT ... RETURNING`).
+
+        Devuelve una instancia nueva construida con la fila, sin asociarla a la sesión.
+        """
+        statement, id = insert_returning(self.model, obj)
+        row = self.session.exec(statement, execution_options={ROW_ID_OPTION: id}).one()
+        commit(self.session)
+        return self.model(**row._mapping)
+    
+    def update_by_id(self, id: UUID, update_data: dict) -> Optional[ModelType]:
+        """Actualiza la fila con una sola sentencia (`UPDATE ... WHERE id = :id RETURNING *`).
+
+        Returns:
+            Optional[ModelType]: La fila actualizada, sin asociarla a la sesión, o None si no existe
+        """
+        statement = update_returning(self.model, id, update_data)
+        row = self.session.exec(statement, execution_options={ROW_ID_OPTION: id}).first()
+        commit(self.session)
+        return None if row is None else self.model(**row._mapping)
+    
     def get_by_id(self, id: UUID) -> Optional[ModelType]:
         statement = select(self.model).where(self.model.id == id)
         return self.session.exec(statement).first()
     
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[ModelType]:
-        statement = select(self.model).offset(skip).limit(limit)
-        return list(self.session.exec(statement).all())
+    def get_many(self, ids: Iterable[UUID]) -> List[ModelType]:
+        """Carga varios registros por id con una consulta `IN` por cada `IN_CHUNK_SIZE` ids.
+
+        Se devuelven en el orden pedido, sin repetidos y omitiendo los que no existen.
+        """
+        unique, chunks = id_chunks(ids, IN_CHUNK_SIZE)
+        found = {}
+        for chunk in chunks:
+            statement = select(self.model).where(self.model.id.in_(chunk))
+            found.update((obj.id, obj) for obj in self.session.exec(statement))
+        return [found[id] for id in unique if id in found]
+    
+    def get_all(self, cursor: Optional[str] = None, limit: int = 100) -> Page[ModelType]:
+        return self.paginate(select(self.model), cursor, limit)
+    
+    def sort_columns(self) -> tuple:
+        """Columnas únicas y estables por las que se ordena la paginación por cursor."""
+        return (self.model.created_at, self.model.id)
+    
+    def paginate(self, statement: SelectOfScalar, cursor: Optional[str], limit: int) -> Page[ModelType]:
+        sort_columns = self.sort_columns()
+        statement = keyset_statement(statement, sort_columns, cursor, limit)
+        return keyset_page(list(self.session.exec(statement).all()), sort_columns, limit)
     
     def update(self, db_obj: ModelType, update_data: dict) -> ModelType:
         for field, value in update_data.items():
             if value is not None:
                 setattr(db_obj, field, value)
         self.session.add(db_obj)
-        self.session.commit()
+        commit(self.session)
         self.session.refresh(db_obj)
         return db_obj
     
     def delete(self, db_obj: ModelType) -> None:
         self.session.delete(db_obj)
-        self.session.commit()
+        commit(self.session)
+
+
+class AsyncBaseRepository(Generic[ModelType]):
+    def __init__(self, model: Type[ModelType], session: AsyncSession):
+        self.model = model
+        self.session = session
+    
+    async def create(self, obj: ModelType) -> ModelType:
+        self.session.add(obj)
+        await self.session.commit()
+        await self.session.refresh(obj)
+        return obj
+    
+    async def insert(self, obj: ModelType) -> ModelType:
+        statement, id = insert_returning(self.model, obj)
+        row = (await self.session.exec(statement, execution_options={ROW_ID_OPTION: id})).one()
+        await self.session.commit()
+        return self.model(**row._mapping)
+    
+    async def update_by_id(self, id: UUID, update_data: dict) -> Optional[ModelType]:
+        statement = update_returning(self.model, id, update_data)
+        row = (await self.session.exec(statement, execution_options={ROW_ID_OPTION: id})).first()
+        await self.session.commit()
+        return None if row is None else self.model(**row._mapping)
+    
+    async def get_by_id(self, id: UUID) -> Optional[ModelType]:
+        statement = select(self.model).where(self.model.id == id)
+        return (await self.session.exec(statement)).first()
+    
+    async def get_many(self, ids: Iterable[UUID]) -> List[ModelType]:
+        unique, chunks = id_chunks(ids, IN_CHUNK_SIZE)
+        found = {}
+        for chunk in chunks:
+            statement = select(self.model).where(self.model.id.in_(chunk))
+            found.update((obj.id, obj) for obj in await self.session.exec(statement))
+        return [found[id] for id in unique if id in found]
+    
+    async def get_all(self, cursor: Optional[str] = None, limit: int = 100) -> Page[ModelType]:
+        return await self.paginate(select(self.model), cursor, limit)
+    
+    def sort_columns(self) -> tuple:
+        """Columnas únicas y estables por las que se ordena la paginación por cursor."""
+        return (self.model.created_at, self.model.id)
+    
+    async def paginate(self, statement: SelectOfScalar, cursor: Optional[str], limit: int) -> Page[ModelType]:
+        sort_columns = self.sort_columns()
+        statement = keyset_statement(statement, sort_columns, cursor, limit)
+        return keyset_page(list((await self.session.exec(statement)).all()), sort_columns, limit)
+    
+    async def update(self, db_obj: ModelType, update_data: dict) -> ModelType:
+        for field, value in update_data.items():
+            if value is not None:
+                setattr(db_obj, field, value)
+        self.session.add(db_obj)
+        await self.session.commit()
+        await self.session.refresh(db_obj)
+        return db_obj
+    
+    async def delete(self, db_obj: ModelType) -> None:
+        await self.session.delete(db_obj)
+        await self.session.commit()
@@ -1,46 +1,101 @@
-from typing import List
+from typing import Optional
 from uuid import UUID
+from sqlalchemy import Row
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.core.pagination import Page
 from src.models.challenge import Challenge, ChallengeParticipant, ChallengeHabit
-from .base import BaseRepository
+from .base import BaseRepository, AsyncBaseRepository
 
 
 class ChallengeRepository(BaseRepository[Challenge]):
     def __init__(self, session: Session):
         super().__init__(Challenge, session)
     
-    def get_by_creator_id(self, creator_id: UUID) -> List[Challenge]:
+    def get_by_creator_id(self, creator_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Challenge]:
         statement = select(Challenge).where(Challenge.created_by == creator_id)
-        return list(self.session.exec(statement).all())
+        return self.paginate(statement, cursor, limit)
     
-    def get_public_challenges(self) -> List[Challenge]:
+    def get_public_challenges(self, cursor: Optional[str] = None, limit: int = 100) -> Page[Challenge]:
         statement = select(Challenge).where(Challenge.is_public == True)
-        return list(self.session.exec(statement).all())
+        return self.paginate(statement, cursor, limit)
 
 
 class ChallengeParticipantRepository(BaseRepository[ChallengeParticipant]):
     def __init__(self, session: Session):
         super().__init__(ChallengeParticipant, session)
     
-    def get_by_challenge_id(self, challenge_id: UUID) -> List[ChallengeParticipant]:
+    def get_by_challenge_id(self, challenge_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeParticipant]:
         statement = select(ChallengeParticipant).where(
             ChallengeParticipant.challenge_id == challenge_id
         )
-        return list(self.session.exec(statement).all())
+        return self.paginate(statement, cursor, limit)
     
-    def get_by_user_id(self, user_id: UUID) -> List[ChallengeParticipant]:
+    def get_by_user_id(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeParticipant]:
         statement = select(ChallengeParticipant).where(
             ChallengeParticipant.user_id == user_id
         )
-        return list(self.session.exec(statement).all())
+        return self.paginate(statement, cursor, limit)
+    
+    def get_scores(self, challenge_id: UUID) -> list[Row]:
+        """Devuelve (id, user_id, current_score) de los participantes del reto, de mayor a menor puntuación."""
+        statement = select(
+            ChallengeParticipant.id,
+            ChallengeParticipant.user_id,
+            ChallengeParticipant.current_score
+        ).where(
+            ChallengeParticipant.challenge_id == challenge_id
+        ).order_by(ChallengeParticipant.current_score.desc(), ChallengeParticipant.id)
+        return self.session.exec(statement).all()
 
 
 class ChallengeHabitRepository(BaseRepository[ChallengeHabit]):
     def __init__(self, session: Session):
         super().__init__(ChallengeHabit, session)
     
-    def get_by_challenge_id(self, challenge_id: UUID) -> List[ChallengeHabit]:
+    def get_by_challenge_id(self, challenge_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeHabit]:
+        statement = select(ChallengeHabit).where(
+            ChallengeHabit.challenge_id == challenge_id
+        )
+        return self.paginate(statement, cursor, limit)
+
+
+class AsyncChallengeRepository(AsyncBaseRepository[Challenge]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(Challenge, session)
+    
+    async def get_by_creator_id(self, creator_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Challenge]:
+        statement = select(Challenge).where(Challenge.created_by == creator_id)
+        return await self.paginate(statement, cursor, limit)
+    
+    async def get_public_challenges(self, cursor: Optional[str] = None, limit: int = 100) -> Page[Challenge]:
+        statement = select(Challenge).where(Challenge.is_public == True)
+        return await self.paginate(statement, cursor, limit)
+
+
+class AsyncChallengeParticipantRepository(AsyncBaseRepository[ChallengeParticipant]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(ChallengeParticipant, session)
+    
+    async def get_by_challenge_id(self, challenge_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeParticipant]:
+        statement = select(ChallengeParticipant).where(
+            ChallengeParticipant.challenge_id == challenge_id
+        )
+        return await self.paginate(statement, cursor, limit)
+    
+    async def get_by_user_id(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeParticipant]:
+        statement = select(ChallengeParticipant).where(
+            ChallengeParticipant.user_id == user_id
+        )
+        return await self.paginate(statement, cursor, limit)
+
+
+class AsyncChallengeHabitRepository(AsyncBaseRepository[ChallengeHabit]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(ChallengeHabit, session)
+    
+    async def get_by_challenge_id(self, challenge_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeHabit]:
         statement = select(ChallengeHabit).where(
             ChallengeHabit.challenge_id == challenge_id
         )
-        return list(self.session.exec(statement).all())
+        return await self.paginate(statement, cursor, limit)
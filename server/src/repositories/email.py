@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import List
+from sqlmodel import Session, select
+from src.core.database import commit
+from src.models.email import EmailOutbox
+from .base import BaseRepository
+
+
+class EmailOutboxRepository(BaseRepository[EmailOutbox]):
+    def __init__(self, session: Session):
+        super().__init__(EmailOutbox, session)
+    
+    def stage(self, message: EmailOutbox) -> None:
+        """Añade el correo a la sesión sin confirmar; se guarda en el mismo commit que el cambio que lo genera."""
+        self.session.add(message)
+    
+    def claim_due(self, now: datetime, limit: int, lease_until: datetime) -> List[EmailOutbox]:
+        """Reserva los correos cuyo siguiente intento ya toca y confirma la reserva antes de enviarlos.
+
+        Cada correo pasa a `sending` con `next_attempt_at = lease_until`: otros workers no lo toman
+        y, si este muere antes de guardar el resultado, vuelve a estar disponible al vencer la reserva.
+        Las filas se bloquean (con SKIP LOCKED en PostgreSQL) solo durante esta transacción corta.
+
+        Args:
+            now (datetime): Momento actual
+            limit (int): Correos por lote
+            lease_until (datetime): Fin de la reserva
+
+        Returns:
+            List[EmailOutbox]: Correos reservados, fuera de la sesión y con sus columnas cargadas
+        """
+        statement = (
+            select(EmailOutbox)
+            .where(EmailOutbox.status.in_(("pending", "sending")), EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        messages = list(self.session.exec(statement).all())
+        for message in messages:
+            message.status, message.next_attempt_at = "sending", lease_until
+        self.session.flush()
+        # Fuera de la sesión el commit no los expira: leerlos al enviar no abre otra transacción
+        self.session.expunge_all()
+        commit(self.session)
+        return messages
+    
+    def save_all(self, messages: List[EmailOutbox]) -> None:
+        self.session.add_all(messages)
+        commit(self.session)
@@ -1,43 +1,256 @@
-from typing import List
+from typing import Iterable, Iterator, Optional
 from uuid import UUID
 from datetime import date
+from sqlalchemy import Integer, Row, and_, func, or_, tuple_
 from sqlmodel import Session, select
-from src.models.habit import Habit, HabitLog
-from .base import BaseRepository
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.core.database import commit
+from src.core.pagination import Page
+from src.models.habit import Habit, HabitLog, HabitStats
+from .base import IN_CHUNK_SIZE, BaseRepository, AsyncBaseRepository, id_chunks, upsert_statement
+
+
+def habit_log_upsert(session: Session | AsyncSession):
+    """INSERT de logs que, si ya existe un log del mismo hábito y día, actualiza ese registro."""
+    statement = upsert_statement(session, HabitLog.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=["habit_id", "log_date"],
+        set_={
+            "progress_value": statement.excluded.progress_value,
+            "status": statement.excluded.status,
+            "enabled": statement.excluded.enabled,
+            "updated_at": statement.excluded.updated_at,
+        }
+    )
 
 
 class HabitRepository(BaseRepository[Habit]):
     def __init__(self, session: Session):
         super().__init__(Habit, session)
     
-    def get_by_user_id(self, user_id: UUID) -> List[Habit]:
+    def get_by_user_id(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
         statement = select(Habit).where(Habit.user_id == user_id)
-        return list(self.session.exec(statement).all())
+        return self.paginate(statement, cursor, limit)
     
-    def get_active_by_user_id(self, user_id: UUID) -> List[Habit]:
+    def get_active_by_user_id(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
         statement = select(Habit).where(
             Habit.user_id == user_id,
             Habit.enabled == True
         )
-        return list(self.session.exec(statement).all())
+        return self.paginate(statement, cursor, limit)
+    
+    def get_owners(self, habit_ids: Iterable[UUID]) -> dict[UUID, UUID]:
+        """Devuelve {habit_id: user_id} de los hábitos existentes en una sola consulta."""
+        statement = select(Habit.id, Habit.user_id).where(Habit.id.in_(set(habit_ids)))
+        return dict(self.session.exec(statement).all())
 
 
 class HabitLogRepository(BaseRepository[HabitLog]):
     def __init__(self, session: Session):
         super().__init__(HabitLog, session)
     
-    def get_by_habit_id(self, habit_id: UUID) -> List[HabitLog]:
+    def sort_columns(self) -> tuple:
+        return (HabitLog.log_date, HabitLog.id)
+    
+    def upsert(self, log: HabitLog) -> HabitLog:
+        """Crea el log o actualiza el existente del mismo día con una sola sentencia."""
+        statement = habit_log_upsert(self.session).values(**log.model_dump()).returning(*HabitLog.__table__.c)
+        row = self.session.exec(statement).one()
+        commit(self.session)
+        return HabitLog(**row._mapping)
+    
+    def upsert_many(self, rows: list[dict]) -> list[Row]:
+        """Crea o actualiza todas las filas con INSERT multi-fila en una transacción.
+
+        Devuelve (id, created_at, updated_at) de cada fila en el mismo orden que `rows`.
+        El orden se reconstruye por (habit_id, log_date): pedir a SQLAlchemy que lo conserve
+        (`sort_by_parameter_order`) obliga a ejecutar un INSERT por fila en un upsert.
+        """
+        returned = []
+        if rows:
+            table = HabitLog.__table__
+            statement = habit_log_upsert(self.session).returning(
+                table.c.habit_id, table.c.log_date, table.c.id, table.c.created_at, table.c.updated_at
+            )
+            by_key = {(row.habit_id, row.log_date): row for row in self.session.execute(statement, rows)}
+            returned = [by_key[(row["habit_id"], row["log_date"])] for row in rows]
+        commit(self.session)
+        return returned
+    
+    def get_by_habit_id(self, habit_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[HabitLog]:
+        statement = select(HabitLog).where(HabitLog.habit_id == habit_id)
+        return self.paginate(statement, cursor, limit)
+    
+    def get_statuses_many(self, keys: Iterable[tuple[UUID, date]]) -> dict[tuple[UUID, date], str]:
+        """Devuelve {(habit_id, log_date): status} de los logs existentes, en una consulta por `IN_CHUNK_SIZE` claves."""
+        statuses: dict[tuple[UUID, date], str] = {}
+        _, chunks = id_chunks(keys, IN_CHUNK_SIZE)
+        for chunk in chunks:
+            statement = select(HabitLog.habit_id, HabitLog.log_date, HabitLog.status).where(
+                tuple_(HabitLog.habit_id, HabitLog.log_date).in_(chunk)
+            )
+            for habit_id, log_date, status in self.session.exec(statement):
+                statuses[(habit_id, log_date)] = status
+        return statuses
+    
+    def count_by_status(self, habit_id: UUID, status: str) -> tuple[int, int]:
+        """Devuelve (total de logs, logs con `status`) del hábito."""
+        statement = select(
+            func.count(),
+            func.coalesce(func.sum((HabitLog.status == status).cast(Integer)), 0)
+        ).where(HabitLog.habit_id == habit_id)
+        return tuple(self.session.exec(statement).one())
+    
+    def get_dates_with_status(
+        self, 
+        habit_id: UUID, 
+        status: str, 
+        start_date: Optional[date] = None, 
+        end_date: Optional[date] = None
+    ) -> set[date]:
+        statement = select(HabitLog.log_date).where(HabitLog.habit_id == habit_id, HabitLog.status == status)
+        if start_date is not None:
+            statement = statement.where(HabitLog.log_date >= start_date)
+        if end_date is not None:
+            statement = statement.where(HabitLog.log_date <= end_date)
+        return set(self.session.exec(statement).all())
+    
+    def get_dates_with_status_many(
+        self, 
+        ranges: dict[UUID, tuple[date, date]], 
+        status: str
+    ) -> dict[UUID, set[date]]:
+        """Días con `status` de cada hábito dentro de su rango [inicio, fin], en una consulta por `IN_CHUNK_SIZE` hábitos."""
+        dates: dict[UUID, set[date]] = {habit_id: set() for habit_id in ranges}
+        _, chunks = id_chunks(ranges, IN_CHUNK_SIZE)
+        for chunk in chunks:
+            statement = select(HabitLog.habit_id, HabitLog.log_date).where(
+                HabitLog.status == status,
+                or_(*(
+                    and_(HabitLog.habit_id == habit_id, HabitLog.log_date.between(*ranges[habit_id]))
+                    for habit_id in chunk
+                ))
+            )
+            for habit_id, log_date in self.session.exec(statement):
+                dates[habit_id].add(log_date)
+        return dates
+    
+    def get_last_date_with_status_before(self, habit_id: UUID, status: str, day: date) -> Optional[date]:
+        statement = select(func.max(HabitLog.log_date)).where(
+            HabitLog.habit_id == habit_id,
+            HabitLog.status == status,
+            HabitLog.log_date < day
+        )
+        return self.session.exec(statement).one()
+    
+    def get_by_user_id(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[HabitLog]:
+        statement = select(HabitLog).where(HabitLog.user_id == user_id)
+        return self.paginate(statement, cursor, limit)
+    
+    def stream_by_user_id(self, user_id: UUID, batch_size: int) -> Iterator[Row]:
+        """Recorre todo el historial del usuario con un cursor de servidor, `batch_size` filas a la vez.
+
+        Devuelve filas de columnas en lugar de objetos ORM para no llenar el identity map.
+        """
+        statement = (
+            select(*HabitLog.__table__.c)
+            .where(HabitLog.user_id == user_id)
+            .order_by(*self.sort_columns())
+            .execution_options(yield_per=batch_size)
+        )
+        yield from self.session.execute(statement)
+    
+    def get_by_date_range(
+        self, 
+        habit_id: UUID, 
+        start_date: date, 
+        end_date: date, 
+        cursor: Optional[str] = None, 
+        limit: int = 100
+    ) -> Page[HabitLog]:
+        statement = select(HabitLog).where(
+            HabitLog.habit_id == habit_id,
+            HabitLog.log_date >= start_date,
+            HabitLog.log_date <= end_date
+        )
+        return self.paginate(statement, cursor, limit)
+
+
+class AsyncHabitRepository(AsyncBaseRepository[Habit]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(Habit, session)
+    
+    async def get_by_user_id(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
+        statement = select(Habit).where(Habit.user_id == user_id)
+        return await self.paginate(statement, cursor, limit)
+    
+    async def get_active_by_user_id(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
+        statement = select(Habit).where(
+            Habit.user_id == user_id,
+            Habit.enabled == True
+        )
+        return await self.paginate(statement, cursor, limit)
+
+
+class AsyncHabitLogRepository(AsyncBaseRepository[HabitLog]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(HabitLog, session)
+    
+    def sort_columns(self) -> tuple:
+        return (HabitLog.log_date, HabitLog.id)
+    
+    async def upsert(self, log: HabitLog) -> HabitLog:
+        """Crea el log o actualiza el existente del mismo día con una sola sentencia."""
+        statement = habit_log_upsert(self.session).values(**log.model_dump()).returning(*HabitLog.__table__.c)
+        row = (await self.session.exec(statement)).one()
+        await self.session.commit()
+        return HabitLog(**row._mapping)
+    
+    async def get_by_habit_id(self, habit_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[HabitLog]:
         statement = select(HabitLog).where(HabitLog.habit_id == habit_id)
-        return list(self.session.exec(statement).all())
+        return await self.paginate(statement, cursor, limit)
     
-    def get_by_user_id(self, user_id: UUID) -> List[HabitLog]:
+    async def get_by_user_id(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[HabitLog]:
         statement = select(HabitLog).where(HabitLog.user_id == user_id)
-        return list(self.session.exec(statement).all())
+        return await self.paginate(statement, cursor, limit)
     
-    def get_by_date_range(self, habit_id: UUID, start_date: date, end_date: date) -> List[HabitLog]:
+    async def get_by_date_range(
+        self, 
+        habit_id: UUID, 
+        start_date: date, 
+        end_date: date, 
+        cursor: Optional[str] = None, 
+        limit: int = 100
+    ) -> Page[HabitLog]:
         statement = select(HabitLog).where(
             HabitLog.habit_id == habit_id,
             HabitLog.log_date >= start_date,
             HabitLog.log_date <= end_date
         )
-        return list(self.session.exec(statement).all())
+        return await self.paginate(statement, cursor, limit)
+
+
+class HabitStatsRepository(BaseRepository[HabitStats]):
+    def __init__(self, session: Session):
+        super().__init__(HabitStats, session)
+    
+    def get_by_habit_id(self, habit_id: UUID) -> Optional[HabitStats]:
+        statement = select(HabitStats).where(HabitStats.habit_id == habit_id)
+        return self.session.exec(statement).first()
+    
+    def get_by_habit_ids(self, habit_ids: Iterable[UUID], for_update: bool = False) -> dict[UUID, HabitStats]:
+        """Carga las estadísticas de los hábitos; con `for_update` bloquea sus filas (`SELECT ... FOR UPDATE`)
+        hasta el commit, en orden de `habit_id` para que dos escritores no se bloqueen mutuamente.
+        Se hace una consulta por `IN_CHUNK_SIZE` hábitos, recorridos también en ese orden."""
+        stats_by_habit: dict[UUID, HabitStats] = {}
+        _, chunks = id_chunks(sorted(set(habit_ids)), IN_CHUNK_SIZE)
+        for chunk in chunks:
+            statement = select(HabitStats).where(HabitStats.habit_id.in_(chunk)).order_by(HabitStats.habit_id)
+            if for_update:
+                statement = statement.with_for_update().execution_options(populate_existing=True)
+            stats_by_habit.update((stats.habit_id, stats) for stats in self.session.exec(statement))
+        return stats_by_habit
+    
+    def stage(self, stats: HabitStats) -> None:
+        """Añade las estadísticas a la sesión sin confirmar; se guardan en el commit del cambio del log."""
+        self.session.add(stats)
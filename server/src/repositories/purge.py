@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+from typing import List, NamedTuple
+from uuid import UUID
+from sqlalchemy import ColumnElement, delete, func, or_, update
+from sqlmodel import Session, SQLModel, select
+from src.core.database import commit
+from src.models.user import User, UserProfile
+from src.models.habit import Habit, HabitLog, HabitStats
+from src.models.challenge import Challenge, ChallengeParticipant, ChallengeHabit
+
+
+class PurgeStep(NamedTuple):
+    """Filas de `model` que cumplen `condition` y se borran con un solo DELETE ... WHERE."""
+    model: type[SQLModel]
+    condition: ColumnElement[bool]
+
+
+# Un plan borra primero las filas dependientes y en último lugar la fila principal,
+# de modo que las subconsultas sobre la tabla principal siguen siendo válidas en cada paso.
+PurgePlan = List[PurgeStep]
+
+
+def habit_purge_plan(habit_id: UUID) -> PurgePlan:
+    return [
+        PurgeStep(HabitLog, HabitLog.habit_id == habit_id),
+        PurgeStep(HabitStats, HabitStats.habit_id == habit_id),
+        PurgeStep(ChallengeHabit, ChallengeHabit.habit_id == habit_id),
+        PurgeStep(Habit, Habit.id == habit_id),
+    ]
+
+
+def challenge_purge_plan(challenge_id: UUID) -> PurgePlan:
+    return [
+        PurgeStep(ChallengeHabit, ChallengeHabit.challenge_id == challenge_id),
+        PurgeStep(ChallengeParticipant, ChallengeParticipant.challenge_id == challenge_id),
+        PurgeStep(Challenge, Challenge.id == challenge_id),
+    ]
+
+
+def user_purge_plan(user_id: UUID) -> PurgePlan:
+    habits = select(Habit.id).where(Habit.user_id == user_id)
+    challenges = select(Challenge.id).where(Challenge.created_by == user_id)
+    return [
+        PurgeStep(HabitLog, or_(HabitLog.user_id == user_id, HabitLog.habit_id.in_(habits))),
+        PurgeStep(HabitStats, HabitStats.habit_id.in_(habits)),
+        PurgeStep(ChallengeHabit, or_(ChallengeHabit.habit_id.in_(habits), ChallengeHabit.challenge_id.in_(challenges))),
+        PurgeStep(ChallengeParticipant, or_(
+            ChallengeParticipant.user_id == user_id, ChallengeParticipant.challenge_id.in_(challenges)
+        )),
+        PurgeStep(Challenge, Challenge.created_by == user_id),
+        PurgeStep(Habit, Habit.user_id == user_id),
+        PurgeStep(UserProfile, UserProfile.user_id == user_id),
+        PurgeStep(User, User.id == user_id),
+    ]
+
+
+# Las filas borradas no se buscan en la sesión: con "fetch" SQLAlchemy devolvería todos sus ids
+UNSYNCHRONIZED = {"synchronize_session": False}
+
+
+class PurgeRepository:
+    """Borrados en cascada con sentencias sobre conjuntos de filas, sin cargar objetos en la sesión."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def delete(self, plan: PurgePlan) -> bool:
+        """Ejecuta todo el plan en una transacción; devuelve False (sin confirmar nada) si la fila principal no existe.
+
+        Los borrados ya emitidos no se deshacen aquí, para no romper una unidad de trabajo
+        abierta: el llamador lanza el 404 y la transacción se deshace al propagarse o al cerrar la sesión.
+        """
+        for step in plan:
+            result = self.session.execute(delete(step.model).where(step.condition), execution_options=UNSYNCHRONIZED)
+        if result.rowcount == 0:
+            return False
+        commit(self.session)
+        return True
+
+    def delete_chunk(self, plan: PurgePlan, chunk_size: int) -> int:
+        """Borra y confirma hasta `chunk_size` filas del primer paso que aún tenga filas; 0 cuando el plan terminó."""
+        for step in plan:
+            ids = select(step.model.id).where(step.condition).limit(chunk_size)
+            result = self.session.execute(
+                delete(step.model).where(step.model.id.in_(ids)), execution_options=UNSYNCHRONIZED
+            )
+            if result.rowcount:
+                commit(self.session)
+                return result.rowcount
+        commit(self.session)
+        return 0
+
+    def count_dependents(self, plan: PurgePlan, limit: int) -> int:
+        """Cuenta en una consulta las filas dependientes del plan, dejando de contar en cada tabla al llegar a `limit`."""
+        counts = [
+            select(func.count()).select_from(select(step.model.id).where(step.condition).limit(limit).subquery())
+            .scalar_subquery()
+            for step in plan[:-1]
+        ]
+        return self.session.exec(select(sum(counts[1:], counts[0]))).one()
+
+    def disable(self, plan: PurgePlan) -> bool:
+        """Desactiva (`enabled = False`) la fila principal mientras se borra en segundo plano."""
+        step = plan[-1]
+        statement = update(step.model).where(step.condition).values(enabled=False, updated_at=datetime.now(timezone.utc))
+        result = self.session.execute(statement, execution_options=UNSYNCHRONIZED)
+        commit(self.session)
+        return result.rowcount > 0
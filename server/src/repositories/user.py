@@ -1,8 +1,13 @@
 from typing import Optional
 from uuid import UUID
+from datetime import date
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.models.user import User, UserProfile
-from .base import BaseRepository
+from src.models.habit import Habit, HabitLog
+from src.models.challenge import ChallengeParticipant
+from .base import BaseRepository, AsyncBaseRepository
 
 
 class UserRepository(BaseRepository[User]):
@@ -16,6 +21,18 @@ class UserRepository(BaseRepository[User]):
     def get_by_username(self, username: str) -> Optional[User]:
         statement = select(User).where(User.username == username)
         return self.session.exec(statement).first()
+    
+    def get_dashboard(self, user_id: UUID, start_date: date, end_date: date) -> Optional[User]:
+        """Carga el usuario con su perfil, hábitos activos, logs entre `start_date` y `end_date`
+        y participaciones activas en cinco consultas, sin importar cuántos hábitos tenga."""
+        statement = select(User).where(User.id == user_id).options(
+            selectinload(User.profile),
+            selectinload(User.habits.and_(Habit.enabled == True)).selectinload(
+                Habit.habit_logs.and_(HabitLog.log_date >= start_date, HabitLog.log_date <= end_date)
+            ),
+            selectinload(User.challenge_participations.and_(ChallengeParticipant.status == "active")),
+        ).execution_options(populate_existing=True)
+        return self.session.exec(statement).first()
 
 
 class UserProfileRepository(BaseRepository[UserProfile]):
@@ -25,3 +42,25 @@ class UserProfileRepository(BaseRepository[UserProfile]):
     def get_by_user_id(self, user_id: UUID) -> Optional[UserProfile]:
         statement = select(UserProfile).where(UserProfile.user_id == user_id)
         return self.session.exec(statement).first()
+
+
+class AsyncUserRepository(AsyncBaseRepository[User]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(User, session)
+    
+    async def get_by_email(self, email: str) -> Optional[User]:
+        statement = select(User).where(User.email == email)
+        return (await self.session.exec(statement)).first()
+    
+    async def get_by_username(self, username: str) -> Optional[User]:
+        statement = select(User).where(User.username == username)
+        return (await self.session.exec(statement)).first()
+
+
+class AsyncUserProfileRepository(AsyncBaseRepository[UserProfile]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(UserProfile, session)
+    
+    async def get_by_user_id(self, user_id: UUID) -> Optional[UserProfile]:
+        statement = select(UserProfile).where(UserProfile.user_id == user_id)
+        return (await self.session.exec(statement)).first()
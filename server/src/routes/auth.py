@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 from sqlmodel import Session
 from src.core.database import get_session
 from src.services.user import UserService
@@ -11,6 +11,12 @@ class LoginData(BaseModel):
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-def login(data: LoginData, session: Session = Depends(get_session)):
+async def login(data: LoginData, session: Session = Depends(get_session)):
     service = UserService(session)
-    return service.login(data.email, data.password)
\ No newline at end of file
+    return await service.login(data.email, data.password)
+
+@router.get("/confirm", status_code=status.HTTP_200_OK)
+def confirm_email(token: str = Query(...), session: Session = Depends(get_session)):
+    service = UserService(session)
+    user = service.confirm_email(token)
+    return {"email": user.email, "is_confirmed": user.is_confirmed}
@@ -1,18 +1,25 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response, status
 from sqlmodel import Session
-from src.core.database import get_session
+from src.core.config import CONFIG
+from src.models.challenge import Challenge
+from src.core.database import get_read_session, get_session
+from src.core.pagination import Page, PageParams, ids_param, page_params, page_items, page_headers
+from src.core.response_cache import cached_response, render
 from src.schemas.challenge import (
-    ChallengeCreate, ChallengeUpdate, ChallengeRead,
+    ChallengeCreate, ChallengeUpdate, ChallengeRead, ChallengeFullCreate, ChallengeFullRead,
     ChallengeParticipantCreate, ChallengeParticipantUpdate, ChallengeParticipantRead,
-    ChallengeHabitCreate, ChallengeHabitRead
+    ChallengeHabitCreate, ChallengeHabitRead,
+    LeaderboardEntryRead, LeaderboardPositionRead
 )
 from src.services.challenge import (
     ChallengeService, 
     ChallengeParticipantService,
-    ChallengeHabitService
+    ChallengeHabitService,
+    LeaderboardService
 )
+from src.services.purge import PURGE_RESPONSES
 
 router = APIRouter(prefix="/challenges", tags=["challenges"])
 
@@ -23,28 +30,67 @@ def create_challenge(challenge_data: ChallengeCreate, session: Session = Depends
     return service.create_challenge(challenge_data)
 
 
+@router.post("/full", response_model=ChallengeFullRead, status_code=status.HTTP_201_CREATED)
+def create_full_challenge(challenge_data: ChallengeFullCreate, session: Session = Depends(get_session)):
+    """Crea el reto con sus hábitos e inscribe al creador en una sola transacción."""
+    service = ChallengeService(session)
+    return service.create_full_challenge(challenge_data)
+
+
 @router.get("", response_model=List[ChallengeRead])
-def get_challenges(skip: int = 0, limit: int = 100, session: Session = Depends(get_session)):
+def get_challenges(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    ids: Optional[List[UUID]] = Depends(ids_param),
+    session: Session = Depends(get_read_session)
+):
     service = ChallengeService(session)
-    return service.get_all_challenges(skip=skip, limit=limit)
+    if ids is not None:
+        return page_items(request, response, Page(service.get_challenges_by_ids(ids), None))
+    return page_items(request, response, service.get_all_challenges(page.cursor, page.limit))
 
 
 @router.get("/public", response_model=List[ChallengeRead])
-def get_public_challenges(session: Session = Depends(get_session)):
+def get_public_challenges(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    session: Session = Depends(get_read_session)
+):
     service = ChallengeService(session)
-    return service.get_public_challenges()
+    
+    def build():
+        challenges = service.get_public_challenges(page.cursor, page.limit)
+        return render(
+            challenges.items,
+            List[ChallengeRead],
+            challenges.items,
+            tables=[Challenge.__tablename__],
+            headers=page_headers(request, challenges)
+        )
+    return cached_response(request, build)
 
 
 @router.get("/creator/{creator_id}", response_model=List[ChallengeRead])
-def get_challenges_by_creator(creator_id: UUID, session: Session = Depends(get_session)):
+def get_challenges_by_creator(
+    creator_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    session: Session = Depends(get_read_session)
+):
     service = ChallengeService(session)
-    return service.get_challenges_by_creator(creator_id)
+    return page_items(request, response, service.get_challenges_by_creator(creator_id, page.cursor, page.limit))
 
 
 @router.get("/{challenge_id}", response_model=ChallengeRead)
-def get_challenge(challenge_id: UUID, session: Session = Depends(get_session)):
+def get_challenge(challenge_id: UUID, request: Request, session: Session = Depends(get_read_session)):
     service = ChallengeService(session)
-    return service.get_challenge(challenge_id)
+    
+    def build():
+        challenge = service.get_challenge(challenge_id)
+        return render(challenge, ChallengeRead, [challenge])
+    return cached_response(request, build)
 
 
 @router.patch("/{challenge_id}", response_model=ChallengeRead)
@@ -57,10 +103,12 @@ def update_challenge(
     return service.update_challenge(challenge_id, challenge_data)
 
 
-@router.delete("/{challenge_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_challenge(challenge_id: UUID, session: Session = Depends(get_session)):
+@router.delete("/{challenge_id}", status_code=status.HTTP_204_NO_CONTENT, responses=PURGE_RESPONSES)
+def delete_challenge(challenge_id: UUID, background: BackgroundTasks, session: Session = Depends(get_session)):
+    """Responde 202 si el borrado continúa en segundo plano (ver PURGE_BACKGROUND_THRESHOLD)."""
     service = ChallengeService(session)
-    service.delete_challenge(challenge_id)
+    if service.delete_challenge(challenge_id, background):
+        return Response(status_code=status.HTTP_202_ACCEPTED)
 
 
 @router.post("/participants", response_model=ChallengeParticipantRead, status_code=status.HTTP_201_CREATED)
@@ -73,21 +121,55 @@ def create_participant(
 
 
 @router.get("/participants/{participant_id}", response_model=ChallengeParticipantRead)
-def get_participant(participant_id: UUID, session: Session = Depends(get_session)):
+def get_participant(participant_id: UUID, session: Session = Depends(get_read_session)):
     service = ChallengeParticipantService(session)
     return service.get_participant(participant_id)
 
 
 @router.get("/{challenge_id}/participants", response_model=List[ChallengeParticipantRead])
-def get_participants_by_challenge(challenge_id: UUID, session: Session = Depends(get_session)):
+def get_participants_by_challenge(
+    challenge_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    session: Session = Depends(get_read_session)
+):
     service = ChallengeParticipantService(session)
-    return service.get_participants_by_challenge(challenge_id)
+    return page_items(request, response, service.get_participants_by_challenge(challenge_id, page.cursor, page.limit))
+
+
+@router.get("/{challenge_id}/leaderboard", response_model=List[LeaderboardEntryRead])
+def get_leaderboard(
+    challenge_id: UUID,
+    limit: int = Query(10, ge=1, le=CONFIG.LEADERBOARD_MAX_LIMIT),
+    session: Session = Depends(get_session)
+):
+    service = LeaderboardService(session)
+    return service.get_top(challenge_id, limit)
+
+
+@router.get("/{challenge_id}/leaderboard/users/{user_id}", response_model=LeaderboardPositionRead)
+def get_leaderboard_position(
+    challenge_id: UUID,
+    user_id: UUID,
+    neighbours: int = Query(5, ge=0, le=CONFIG.LEADERBOARD_MAX_LIMIT),
+    session: Session = Depends(get_session)
+):
+    """Devuelve el puesto del usuario en el reto y los participantes que tiene justo por encima y por debajo."""
+    service = LeaderboardService(session)
+    return service.get_position(challenge_id, user_id, neighbours)
 
 
 @router.get("/user/{user_id}/participations", response_model=List[ChallengeParticipantRead])
-def get_participants_by_user(user_id: UUID, session: Session = Depends(get_session)):
+def get_participants_by_user(
+    user_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    session: Session = Depends(get_read_session)
+):
     service = ChallengeParticipantService(session)
-    return service.get_participants_by_user(user_id)
+    return page_items(request, response, service.get_participants_by_user(user_id, page.cursor, page.limit))
 
 
 @router.patch("/participants/{participant_id}", response_model=ChallengeParticipantRead)
@@ -116,15 +198,21 @@ def create_challenge_habit(
 
 
 @router.get("/habits/{challenge_habit_id}", response_model=ChallengeHabitRead)
-def get_challenge_habit(challenge_habit_id: UUID, session: Session = Depends(get_session)):
+def get_challenge_habit(challenge_habit_id: UUID, session: Session = Depends(get_read_session)):
     service = ChallengeHabitService(session)
     return service.get_challenge_habit(challenge_habit_id)
 
 
 @router.get("/{challenge_id}/habits", response_model=List[ChallengeHabitRead])
-def get_habits_by_challenge(challenge_id: UUID, session: Session = Depends(get_session)):
+def get_habits_by_challenge(
+    challenge_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    session: Session = Depends(get_read_session)
+):
     service = ChallengeHabitService(session)
-    return service.get_habits_by_challenge(challenge_id)
+    return page_items(request, response, service.get_habits_by_challenge(challenge_id, page.cursor, page.limit))
 
 
 @router.delete("/habits/{challenge_habit_id}", status_code=status.HTTP_204_NO_CONTENT)
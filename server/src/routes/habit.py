@@ -1,14 +1,21 @@
-from typing import List
+from typing import List, Literal, Optional
 from uuid import UUID
 from datetime import date
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
-from src.core.database import get_session
+from src.core.config import CONFIG
+from src.core.database import get_read_session, get_session
+from src.core.pagination import Page, PageParams, ids_param, page_params, page_items
+from src.core.response_cache import cached_response, render
+from src.core.streaming import MEDIA_TYPES
 from src.schemas.habit import (
     HabitCreate, HabitUpdate, HabitRead,
-    HabitLogCreate, HabitLogUpdate, HabitLogRead
+    HabitLogCreate, HabitLogUpdate, HabitLogRead,
+    HabitLogBatchCreate, HabitLogBatchRead, HabitStatsRead
 )
-from src.services.habit import HabitService, HabitLogService
+from src.services.habit import HabitService, HabitLogService, HabitStatsService
+from src.services.purge import PURGE_RESPONSES
 
 router = APIRouter(prefix="/habits", tags=["habits"])
 
@@ -20,27 +27,42 @@ def create_habit(habit_data: HabitCreate, session: Session = Depends(get_session
 
 
 @router.get("", response_model=List[HabitRead])
-def get_habits(skip: int = 0, limit: int = 100, session: Session = Depends(get_session)):
+def get_habits(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    ids: Optional[List[UUID]] = Depends(ids_param),
+    session: Session = Depends(get_read_session)
+):
     service = HabitService(session)
-    return service.get_all_habits(skip=skip, limit=limit)
+    if ids is not None:
+        return page_items(request, response, Page(service.get_habits_by_ids(ids), None))
+    return page_items(request, response, service.get_all_habits(page.cursor, page.limit))
 
 
 @router.get("/user/{user_id}", response_model=List[HabitRead])
 def get_habits_by_user(
     user_id: UUID, 
+    request: Request,
+    response: Response,
     active_only: bool = Query(False),
-    session: Session = Depends(get_session)
+    page: PageParams = Depends(page_params),
+    session: Session = Depends(get_read_session)
 ):
     service = HabitService(session)
     if active_only:
-        return service.get_active_habits_by_user(user_id)
-    return service.get_habits_by_user(user_id)
+        return page_items(request, response, service.get_active_habits_by_user(user_id, page.cursor, page.limit))
+    return page_items(request, response, service.get_habits_by_user(user_id, page.cursor, page.limit))
 
 
 @router.get("/{habit_id}", response_model=HabitRead)
-def get_habit(habit_id: UUID, session: Session = Depends(get_session)):
+def get_habit(habit_id: UUID, request: Request, session: Session = Depends(get_read_session)):
     service = HabitService(session)
-    return service.get_habit(habit_id)
+    
+    def build():
+        habit = service.get_habit(habit_id)
+        return render(habit, HabitRead, [habit])
+    return cached_response(request, build)
 
 
 @router.patch("/{habit_id}", response_model=HabitRead)
@@ -53,10 +75,12 @@ def update_habit(
     return service.update_habit(habit_id, habit_data)
 
 
-@router.delete("/{habit_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_habit(habit_id: UUID, session: Session = Depends(get_session)):
+@router.delete("/{habit_id}", status_code=status.HTTP_204_NO_CONTENT, responses=PURGE_RESPONSES)
+def delete_habit(habit_id: UUID, background: BackgroundTasks, session: Session = Depends(get_session)):
+    """Responde 202 si el borrado continúa en segundo plano (ver PURGE_BACKGROUND_THRESHOLD)."""
     service = HabitService(session)
-    service.delete_habit(habit_id)
+    if service.delete_habit(habit_id, background):
+        return Response(status_code=status.HTTP_202_ACCEPTED)
 
 
 @router.post("/logs", response_model=HabitLogRead, status_code=status.HTTP_201_CREATED)
@@ -65,8 +89,18 @@ def create_habit_log(log_data: HabitLogCreate, session: Session = Depends(get_se
     return service.create_log(log_data)
 
 
+@router.post("/logs/batch", response_model=HabitLogBatchRead)
+def create_habit_logs(batch: HabitLogBatchCreate, session: Session = Depends(get_session)):
+    """
+    Registra varios logs en una sola transacción (p. ej. check-ins guardados sin conexión).
+    Devuelve el resultado de cada elemento en el mismo orden en que se enviaron.
+    """
+    service = HabitLogService(session)
+    return service.create_logs(batch)
+
+
 @router.get("/logs/{log_id}", response_model=HabitLogRead)
-def get_habit_log(log_id: UUID, session: Session = Depends(get_session)):
+def get_habit_log(log_id: UUID, session: Session = Depends(get_read_session)):
     service = HabitLogService(session)
     return service.get_log(log_id)
 
@@ -74,20 +108,56 @@ def get_habit_log(log_id: UUID, session: Session = Depends(get_session)):
 @router.get("/{habit_id}/logs", response_model=List[HabitLogRead])
 def get_logs_by_habit(
     habit_id: UUID,
+    request: Request,
+    response: Response,
     start_date: date = Query(None),
     end_date: date = Query(None),
-    session: Session = Depends(get_session)
+    page: PageParams = Depends(page_params),
+    session: Session = Depends(get_read_session)
 ):
     service = HabitLogService(session)
     if start_date and end_date:
-        return service.get_logs_by_date_range(habit_id, start_date, end_date)
-    return service.get_logs_by_habit(habit_id)
+        logs = service.get_logs_by_date_range(habit_id, start_date, end_date, page.cursor, page.limit)
+    else:
+        logs = service.get_logs_by_habit(habit_id, page.cursor, page.limit)
+    return page_items(request, response, logs)
+
+
+@router.get("/{habit_id}/stats", response_model=HabitStatsRead)
+def get_habit_stats(habit_id: UUID, session: Session = Depends(get_session)):
+    HabitService(session).get_habit(habit_id)
+    service = HabitStatsService(session)
+    return service.get_stats(habit_id)
 
 
 @router.get("/user/{user_id}/logs", response_model=List[HabitLogRead])
-def get_logs_by_user(user_id: UUID, session: Session = Depends(get_session)):
+def get_logs_by_user(
+    user_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    session: Session = Depends(get_read_session)
+):
+    service = HabitLogService(session)
+    return page_items(request, response, service.get_logs_by_user(user_id, page.cursor, page.limit))
+
+
+@router.get("/user/{user_id}/logs/export", response_class=StreamingResponse)
+def export_logs_by_user(
+    user_id: UUID,
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Exporta el historial completo de logs del usuario como NDJSON o CSV.
+    La respuesta se transmite por bloques a medida que se leen de la base de datos.
+    """
     service = HabitLogService(session)
-    return service.get_logs_by_user(user_id)
+    return StreamingResponse(
+        service.export_logs_by_user(user_id, format, CONFIG.EXPORT_BATCH_SIZE),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="habit-logs-{user_id}.{format}"'}
+    )
 
 
 @router.patch("/logs/{log_id}", response_model=HabitLogRead)
@@ -0,0 +1,109 @@
+from typing import List
+from uuid import UUID
+from datetime import date
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.core.database import get_async_session
+from src.core.pagination import PageParams, page_params, page_items
+from src.core.response_cache import async_cached_response, render
+from src.schemas.habit import (
+    HabitCreate, HabitRead,
+    HabitLogCreate, HabitLogUpdate, HabitLogRead
+)
+from src.services.habit import AsyncHabitService, AsyncHabitLogService
+
+# Variante asíncrona de las rutas más usadas de /habits. Se registra antes que
+# `habit_router` cuando CONFIG.DB_ASYNC está activo, por lo que estas rutas tienen
+# prioridad y el resto de /habits sigue atendido por las rutas síncronas.
+router = APIRouter(prefix="/habits", tags=["habits"])
+
+
+@router.post("", response_model=HabitRead, status_code=status.HTTP_201_CREATED)
+async def create_habit(habit_data: HabitCreate, session: AsyncSession = Depends(get_async_session)):
+    service = AsyncHabitService(session)
+    return await service.create_habit(habit_data)
+
+
+@router.get("/user/{user_id}", response_model=List[HabitRead])
+async def get_habits_by_user(
+    user_id: UUID, 
+    request: Request,
+    response: Response,
+    active_only: bool = Query(False),
+    page: PageParams = Depends(page_params),
+    session: AsyncSession = Depends(get_async_session)
+):
+    service = AsyncHabitService(session)
+    if active_only:
+        habits = await service.get_active_habits_by_user(user_id, page.cursor, page.limit)
+    else:
+        habits = await service.get_habits_by_user(user_id, page.cursor, page.limit)
+    return page_items(request, response, habits)
+
+
+@router.get("/{habit_id}", response_model=HabitRead)
+async def get_habit(habit_id: UUID, request: Request, session: AsyncSession = Depends(get_async_session)):
+    service = AsyncHabitService(session)
+    
+    async def build():
+        habit = await service.get_habit(habit_id)
+        return render(habit, HabitRead, [habit])
+    return await async_cached_response(request, build)
+
+
+@router.post("/logs", response_model=HabitLogRead, status_code=status.HTTP_201_CREATED)
+async def create_habit_log(log_data: HabitLogCreate, session: AsyncSession = Depends(get_async_session)):
+    service = AsyncHabitLogService(session)
+    return await service.create_log(log_data)
+
+
+@router.get("/logs/{log_id}", response_model=HabitLogRead)
+async def get_habit_log(log_id: UUID, session: AsyncSession = Depends(get_async_session)):
+    service = AsyncHabitLogService(session)
+    return await service.get_log(log_id)
+
+
+@router.get("/{habit_id}/logs", response_model=List[HabitLogRead])
+async def get_logs_by_habit(
+    habit_id: UUID,
+    request: Request,
+    response: Response,
+    start_date: date = Query(None),
+    end_date: date = Query(None),
+    page: PageParams = Depends(page_params),
+    session: AsyncSession = Depends(get_async_session)
+):
+    service = AsyncHabitLogService(session)
+    if start_date and end_date:
+        logs = await service.get_logs_by_date_range(habit_id, start_date, end_date, page.cursor, page.limit)
+    else:
+        logs = await service.get_logs_by_habit(habit_id, page.cursor, page.limit)
+    return page_items(request, response, logs)
+
+
+@router.get("/user/{user_id}/logs", response_model=List[HabitLogRead])
+async def get_logs_by_user(
+    user_id: UUID,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    session: AsyncSession = Depends(get_async_session)
+):
+    service = AsyncHabitLogService(session)
+    return page_items(request, response, await service.get_logs_by_user(user_id, page.cursor, page.limit))
+
+
+@router.patch("/logs/{log_id}", response_model=HabitLogRead)
+async def update_habit_log(
+    log_id: UUID, 
+    log_data: HabitLogUpdate, 
+    session: AsyncSession = Depends(get_async_session)
+):
+    service = AsyncHabitLogService(session)
+    return await service.update_log(log_id, log_data)
+
+
+@router.delete("/logs/{log_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_habit_log(log_id: UUID, session: AsyncSession = Depends(get_async_session)):
+    service = AsyncHabitLogService(session)
+    await service.delete_log(log_id)
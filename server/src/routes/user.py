@@ -1,27 +1,40 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Header, status
+from datetime import date
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, Request, Response, status
 from sqlmodel import Session
-from src.core.database import get_session
+from src.core.database import get_read_session, get_session
+from src.core.pagination import Page, PageParams, ids_param, page_params, page_items
+from src.core.response_cache import cached_response, render
 from src.schemas.user import (
     UserCreate, UserUpdate, UserRead,
-    UserProfileCreate, UserProfileUpdate, UserProfileRead
+    UserProfileCreate, UserProfileUpdate, UserProfileRead,
+    DashboardRead
 )
 from src.services.user import UserService, UserProfileService
+from src.services.purge import PURGE_RESPONSES
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.post("", status_code=status.HTTP_201_CREATED)
-def create_user(user_data: UserCreate, session: Session = Depends(get_session)):
+async def create_user(user_data: UserCreate, session: Session = Depends(get_session)):
     service = UserService(session)
-    return service.create_user(user_data)
+    return await service.create_user(user_data)
 
 
 @router.get("", response_model=List[UserRead])
-def get_users(skip: int = 0, limit: int = 100, session: Session = Depends(get_session)):
+def get_users(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    ids: Optional[List[UUID]] = Depends(ids_param),
+    session: Session = Depends(get_read_session)
+):
     service = UserService(session)
-    return service.get_all_users(skip=skip, limit=limit)
+    if ids is not None:
+        return page_items(request, response, Page(service.get_users_by_ids(ids), None))
+    return page_items(request, response, service.get_all_users(page.cursor, page.limit))
 
 @router.get("/me")
 def get_my_account(
@@ -41,22 +54,40 @@ def get_my_account(
     service = UserService(session)
     return service.get_account(token)
 
+@router.get("/me/dashboard", response_model=DashboardRead)
+def get_my_dashboard(
+    session: Session = Depends(get_session),
+    authorization: str | None = Header(default=None)
+):
+    """
+    Devuelve en una sola petición lo necesario para la pantalla de inicio: usuario, perfil,
+    hábitos activos con los logs de hoy y de la semana, y participaciones activas en retos.
+    """
+    if authorization is None or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+
+    service = UserService(session)
+    account = service.get_account(authorization.split(" ")[1])
+    return service.get_dashboard(account.id, date.today())
+
 @router.get("/{user_id}", response_model=UserRead)
-def get_user(user_id: UUID, session: Session = Depends(get_session)):
+def get_user(user_id: UUID, session: Session = Depends(get_read_session)):
     service = UserService(session)
     return service.get_user(user_id)
 
 
 @router.patch("/{user_id}", response_model=UserRead)
-def update_user(user_id: UUID, user_data: UserUpdate, session: Session = Depends(get_session)):
+async def update_user(user_id: UUID, user_data: UserUpdate, session: Session = Depends(get_session)):
     service = UserService(session)
-    return service.update_user(user_id, user_data)
+    return await service.update_user(user_id, user_data)
 
 
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: UUID, session: Session = Depends(get_session)):
+@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT, responses=PURGE_RESPONSES)
+def delete_user(user_id: UUID, background: BackgroundTasks, session: Session = Depends(get_session)):
+    """Responde 202 si el borrado continúa en segundo plano (ver PURGE_BACKGROUND_THRESHOLD)."""
     service = UserService(session)
-    service.delete_user(user_id)
+    if service.delete_user(user_id, background):
+        return Response(status_code=status.HTTP_202_ACCEPTED)
 
 
 @router.post("/profiles", response_model=UserProfileRead, status_code=status.HTTP_201_CREATED)
@@ -66,19 +97,21 @@ def create_profile(profile_data: UserProfileCreate, session: Session = Depends(g
 
 
 @router.get("/profiles/{profile_id}", response_model=UserProfileRead)
-def get_profile(profile_id: UUID, session: Session = Depends(get_session)):
+def get_profile(profile_id: UUID, session: Session = Depends(get_read_session)):
     service = UserProfileService(session)
     return service.get_profile(profile_id)
 
 
 @router.get("/{user_id}/profile", response_model=UserProfileRead)
-def get_profile_by_user(user_id: UUID, session: Session = Depends(get_session)):
+def get_profile_by_user(user_id: UUID, request: Request, session: Session = Depends(get_read_session)):
     service = UserProfileService(session)
-    profile = service.get_profile_by_user_id(user_id)
-    if not profile:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=404, detail="Profile not found")
-    return profile
+    
+    def build():
+        profile = service.get_profile_by_user_id(user_id)
+        if not profile:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return render(profile, UserProfileRead, [profile])
+    return cached_response(request, build)
 
 
 @router.patch("/profiles/{profile_id}", response_model=UserProfileRead)
@@ -1,23 +1,33 @@
 from .user import (
     UserCreate, UserUpdate, UserRead,
-    UserProfileCreate, UserProfileUpdate, UserProfileRead
+    UserProfileCreate, UserProfileUpdate, UserProfileRead,
+    DashboardHabitRead, DashboardRead
 )
 from .habit import (
     HabitCreate, HabitUpdate, HabitRead,
-    HabitLogCreate, HabitLogUpdate, HabitLogRead
+    HabitLogCreate, HabitLogUpdate, HabitLogRead,
+    HabitLogBatchCreate, HabitLogBatchItemResult, HabitLogBatchRead,
+    HabitStatsRead
 )
 from .challenge import (
     ChallengeCreate, ChallengeUpdate, ChallengeRead,
     ChallengeParticipantCreate, ChallengeParticipantUpdate, ChallengeParticipantRead,
-    ChallengeHabitCreate, ChallengeHabitRead
+    LeaderboardEntryRead, LeaderboardPositionRead,
+    ChallengeHabitCreate, ChallengeHabitRead,
+    ChallengeFullHabit, ChallengeFullCreate, ChallengeFullRead
 )
 
 __all__ = [
     "UserCreate", "UserUpdate", "UserRead",
     "UserProfileCreate", "UserProfileUpdate", "UserProfileRead",
+    "DashboardHabitRead", "DashboardRead",
     "HabitCreate", "HabitUpdate", "HabitRead",
     "HabitLogCreate", "HabitLogUpdate", "HabitLogRead",
+    "HabitLogBatchCreate", "HabitLogBatchItemResult", "HabitLogBatchRead",
+    "HabitStatsRead",
     "ChallengeCreate", "ChallengeUpdate", "ChallengeRead",
     "ChallengeParticipantCreate", "ChallengeParticipantUpdate", "ChallengeParticipantRead",
+    "LeaderboardEntryRead", "LeaderboardPositionRead",
     "ChallengeHabitCreate", "ChallengeHabitRead",
+    "ChallengeFullHabit", "ChallengeFullCreate", "ChallengeFullRead",
 ]
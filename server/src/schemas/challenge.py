@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 from pydantic import BaseModel, ConfigDict
 
@@ -12,6 +12,16 @@ class ChallengeCreate(BaseModel):
     is_public: bool = False
 
 
+class ChallengeFullHabit(BaseModel):
+    habit_id: UUID
+    points_per_completion: int = 1
+
+
+class ChallengeFullCreate(ChallengeCreate):
+    habits: List[ChallengeFullHabit] = []
+    enroll_creator: bool = True
+
+
 class ChallengeUpdate(BaseModel):
     title: Optional[str] = None
     start_date: Optional[date] = None
@@ -46,6 +56,19 @@ class ChallengeParticipantUpdate(BaseModel):
     current_score: Optional[int] = None
 
 
+class LeaderboardEntryRead(BaseModel):
+    rank: int
+    participant_id: UUID
+    user_id: UUID
+    current_score: int
+
+
+class LeaderboardPositionRead(BaseModel):
+    participant: LeaderboardEntryRead
+    total_participants: int
+    neighbours: List[LeaderboardEntryRead]
+
+
 class ChallengeParticipantRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -76,3 +99,8 @@ class ChallengeHabitRead(BaseModel):
     enabled: bool
     created_at: datetime
     updated_at: datetime
+
+
+class ChallengeFullRead(ChallengeRead):
+    habits: List[ChallengeHabitRead]
+    participants: List[ChallengeParticipantRead]
@@ -1,7 +1,8 @@
 from datetime import datetime, date
-from typing import Optional
+from typing import List, Literal, Optional
 from uuid import UUID
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+from src.core.config import CONFIG
 
 
 class HabitCreate(BaseModel):
@@ -42,6 +43,10 @@ class HabitLogCreate(BaseModel):
     status: str
 
 
+class HabitLogBatchCreate(BaseModel):
+    items: List[HabitLogCreate] = Field(min_length=1, max_length=CONFIG.LOG_BATCH_MAX_SIZE)
+
+
 class HabitLogUpdate(BaseModel):
     progress_value: Optional[int] = None
     status: Optional[str] = None
@@ -59,3 +64,28 @@ class HabitLogRead(BaseModel):
     enabled: bool
     created_at: datetime
     updated_at: datetime
+
+
+class HabitStatsRead(BaseModel):
+    habit_id: UUID
+    total_logs: int
+    completed_logs: int
+    completion_rate: float
+    current_streak: int
+    longest_streak: int
+    last_completed_date: Optional[date]
+    updated_at: datetime
+
+
+class HabitLogBatchItemResult(BaseModel):
+    index: int
+    status: Literal["created", "updated", "error"]
+    id: Optional[UUID] = None
+    detail: Optional[str] = None
+
+
+class HabitLogBatchRead(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    results: List[HabitLogBatchItemResult]
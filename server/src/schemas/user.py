@@ -1,7 +1,9 @@
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 from uuid import UUID
 from pydantic import BaseModel, EmailStr, ConfigDict, Field
+from src.schemas.habit import HabitRead, HabitLogRead
+from src.schemas.challenge import ChallengeParticipantRead
 
 
 class Token(BaseModel):
@@ -71,3 +73,17 @@ class UserProfileRead(BaseModel):
     enabled: bool
     created_at: datetime
     updated_at: datetime
+
+
+class DashboardHabitRead(HabitRead):
+    today_log: Optional[HabitLogRead] = None
+    week_logs: List[HabitLogRead]
+
+
+class DashboardRead(BaseModel):
+    today: date
+    week_start: date
+    user: UserRead
+    profile: Optional[UserProfileRead]
+    habits: List[DashboardHabitRead]
+    challenge_participations: List[ChallengeParticipantRead]
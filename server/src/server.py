@@ -1,18 +1,74 @@
-from fastapi import FastAPI, APIRouter
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from src.core.database import create_db_and_tables
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlmodel import Session
+from src.core.database import create_db_and_tables, dispose_engines, get_engine
+from src.core.admission import RateLimiter
 from src.core.config import CONFIG
-from src.routes import user_router, habit_router, challenge_router, auth_router
+from src.core.hashing import password_hasher
+from src.core.metrics import CONTENT_TYPE, render_text
+from src.core.middleware import AdmissionMiddleware, MetricsMiddleware, QueryCounterMiddleware, observe_threadpool
+from src.exceptions import ApiError
+from src.services.email import EmailOutboxWorker, SMTPMailer, outbox_lease
+from src.routes import user_router, habit_router, habit_async_router, challenge_router, auth_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepara la base de datos al arrancar el worker y libera sus recursos al apagarlo.
+
+    Nada de esto ocurre al importar la aplicación: el motor se crea en el primer uso y el
+    esquema solo se crea si DB_CREATE_SCHEMA está activo. El worker de la bandeja de correo
+    solo se arranca si hay un servidor SMTP configurado.
+    """
+    worker = None
+    if CONFIG.SMTP_SERVER and CONFIG.EMAIL_OUTBOX_WORKER_ENABLED:
+        # Se construye antes de tocar la base de datos: una reserva inválida detiene el arranque
+        worker = EmailOutboxWorker(
+            session_factory=lambda: Session(get_engine()),
+            mailer=SMTPMailer.from_config(),
+            batch_size=CONFIG.EMAIL_OUTBOX_BATCH_SIZE,
+            max_attempts=CONFIG.EMAIL_OUTBOX_MAX_ATTEMPTS,
+            backoff=CONFIG.EMAIL_OUTBOX_BACKOFF,
+            max_backoff=CONFIG.EMAIL_OUTBOX_MAX_BACKOFF,
+            poll_interval=CONFIG.EMAIL_OUTBOX_POLL_INTERVAL,
+            lease=outbox_lease(CONFIG.EMAIL_OUTBOX_BATCH_SIZE, CONFIG.SMTP_TIMEOUT, CONFIG.EMAIL_OUTBOX_LEASE)
+        )
+    if CONFIG.DB_CREATE_SCHEMA:
+        await run_in_threadpool(create_db_and_tables)
+    outbox_task = asyncio.create_task(worker.run()) if worker is not None else None
+    try:
+        yield
+    finally:
+        if outbox_task is not None:
+            outbox_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await outbox_task
+        password_hasher.shutdown()
+        await dispose_engines()
 
 
 def create_app(info: dict[str, str]) -> FastAPI:
     app = FastAPI(
         title=info.get("title", "HabitFlow API"),
         summary=info.get("summary", "Track your habits and join challenges"),
-        description=info.get("description", "A comprehensive API for habit tracking")
+        description=info.get("description", "A comprehensive API for habit tracking"),
+        lifespan=lifespan
     )
 
-    create_db_and_tables()
+    @app.exception_handler(ApiError)
+    def api_error_handler(request: Request, exc: ApiError):
+        headers = {}
+        if getattr(exc, "retry_after", None):
+            headers["Retry-After"] = str(exc.retry_after)
+        return JSONResponse(
+            status_code=exc.status,
+            content={"status": exc.status, "message": exc.message},
+            headers=headers
+        )
 
     app.add_middleware(
         CORSMiddleware,
@@ -21,9 +77,32 @@ def create_app(info: dict[str, str]) -> FastAPI:
         allow_methods=["*"],  
         allow_headers=["*"],  
     )
+    if CONFIG.QUERY_TRACKING_ENABLED:
+        app.add_middleware(QueryCounterMiddleware, repeat_threshold=CONFIG.QUERY_REPEAT_THRESHOLD)
+    if CONFIG.ADMISSION_CONTROL_ENABLED:
+        ip_rate = user_rate = None
+        if CONFIG.RATE_LIMIT_IP_RATE > 0:
+            ip_rate = RateLimiter(CONFIG.RATE_LIMIT_IP_RATE, CONFIG.RATE_LIMIT_IP_BURST, CONFIG.RATE_LIMIT_MAX_CLIENTS)
+        if CONFIG.RATE_LIMIT_USER_RATE > 0:
+            user_rate = RateLimiter(CONFIG.RATE_LIMIT_USER_RATE, CONFIG.RATE_LIMIT_USER_BURST, CONFIG.RATE_LIMIT_MAX_CLIENTS)
+        app.add_middleware(
+            AdmissionMiddleware,
+            limits={
+                "auth": (CONFIG.ADMISSION_AUTH_CONCURRENCY, CONFIG.ADMISSION_AUTH_QUEUE),
+                "writes": (CONFIG.ADMISSION_WRITES_CONCURRENCY, CONFIG.ADMISSION_WRITES_QUEUE),
+                "reads": (CONFIG.ADMISSION_READS_CONCURRENCY, CONFIG.ADMISSION_READS_QUEUE),
+                "exports": (CONFIG.ADMISSION_EXPORTS_CONCURRENCY, CONFIG.ADMISSION_EXPORTS_QUEUE),
+            },
+            queue_timeout=CONFIG.ADMISSION_QUEUE_TIMEOUT,
+            ip_rate=ip_rate,
+            user_rate=user_rate
+        )
+    app.add_middleware(MetricsMiddleware)
 
     api_router = APIRouter(prefix="/api")
     api_router.include_router(user_router)
+    if CONFIG.DB_ASYNC:
+        api_router.include_router(habit_async_router)
     api_router.include_router(habit_router)
     api_router.include_router(challenge_router)
     api_router.include_router(auth_router)
@@ -40,6 +119,11 @@ def create_app(info: dict[str, str]) -> FastAPI:
     def health_check():
         return {"status": "healthy"}
 
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        observe_threadpool()
+        return PlainTextResponse(render_text(), media_type=CONTENT_TYPE)
+
     app.include_router(api_router)
 
     return app
@@ -1,13 +1,19 @@
 from .user import UserService, UserProfileService
-from .habit import HabitService, HabitLogService
-from .challenge import ChallengeService, ChallengeParticipantService, ChallengeHabitService
+from .habit import (
+    HabitService, HabitLogService, HabitStatsService, AsyncHabitService, AsyncHabitLogService
+)
+from .challenge import ChallengeService, ChallengeParticipantService, ChallengeHabitService, LeaderboardService
 
 __all__ = [
     "UserService",
     "UserProfileService",
     "HabitService",
     "HabitLogService",
+    "HabitStatsService",
+    "AsyncHabitService",
+    "AsyncHabitLogService",
     "ChallengeService",
     "ChallengeParticipantService",
     "ChallengeHabitService",
+    "LeaderboardService",
 ]
@@ -1,18 +1,27 @@
-from typing import List
+from typing import Iterable, Optional
 from uuid import UUID
 from sqlmodel import Session
+from src.core.cache import TTLCache
+from src.core.config import CONFIG
+from src.core.database import on_commit, unit_of_work
+from src.core.leaderboard import Leaderboard, LeaderboardEntry
+from src.core.pagination import Page
 from src.models.challenge import Challenge, ChallengeParticipant, ChallengeHabit
 from src.schemas.challenge import (
-    ChallengeCreate, ChallengeUpdate,
+    ChallengeCreate, ChallengeUpdate, ChallengeRead,
     ChallengeParticipantCreate, ChallengeParticipantUpdate,
-    ChallengeHabitCreate
+    ChallengeHabitCreate, ChallengeFullCreate, ChallengeFullRead,
+    LeaderboardEntryRead, LeaderboardPositionRead
 )
 from src.repositories.challenge import (
     ChallengeRepository, 
     ChallengeParticipantRepository,
     ChallengeHabitRepository
 )
-from fastapi import HTTPException, status
+from src.repositories.habit import HabitRepository
+from src.repositories.purge import challenge_purge_plan
+from src.services.purge import purge
+from fastapi import BackgroundTasks, HTTPException, status
 
 
 class ChallengeService:
@@ -21,7 +30,40 @@ class ChallengeService:
     
     def create_challenge(self, challenge_data: ChallengeCreate) -> Challenge:
         challenge = Challenge(**challenge_data.model_dump())
-        return self.repository.create(challenge)
+        return self.repository.insert(challenge)
+    
+    def create_full_challenge(self, challenge_data: ChallengeFullCreate) -> ChallengeFullRead:
+        """Crea el reto, sus hábitos y (si se pide) la inscripción del creador en una sola transacción.
+
+        Raises:
+            HTTPException: 404 si algún hábito no existe o no pertenece al creador del reto
+        """
+        session = self.repository.session
+        owners = HabitRepository(session).get_owners(habit.habit_id for habit in challenge_data.habits)
+        if any(owners.get(habit.habit_id) != challenge_data.created_by for habit in challenge_data.habits):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Habit not found"
+            )
+        with unit_of_work(session):
+            challenge = self.create_challenge(ChallengeCreate(**challenge_data.model_dump(
+                exclude={"habits", "enroll_creator"}
+            )))
+            habit_service = ChallengeHabitService(session)
+            habits = [
+                habit_service.create_challenge_habit(ChallengeHabitCreate(challenge_id=challenge.id, **habit.model_dump()))
+                for habit in challenge_data.habits
+            ]
+            participants = []
+            if challenge_data.enroll_creator:
+                participants.append(ChallengeParticipantService(session).create_participant(
+                    ChallengeParticipantCreate(challenge_id=challenge.id, user_id=challenge_data.created_by)
+                ))
+        return ChallengeFullRead(
+            **ChallengeRead.model_validate(challenge).model_dump(),
+            habits=habits,
+            participants=participants
+        )
     
     def get_challenge(self, challenge_id: UUID) -> Challenge:
         challenge = self.repository.get_by_id(challenge_id)
@@ -32,22 +74,117 @@ class ChallengeService:
             )
         return challenge
     
-    def get_all_challenges(self, skip: int = 0, limit: int = 100) -> List[Challenge]:
-        return self.repository.get_all(skip=skip, limit=limit)
+    def get_all_challenges(self, cursor: Optional[str] = None, limit: int = 100) -> Page[Challenge]:
+        return self.repository.get_all(cursor=cursor, limit=limit)
+    
+    def get_challenges_by_ids(self, ids: Iterable[UUID]) -> list[Challenge]:
+        return self.repository.get_many(ids)
     
-    def get_challenges_by_creator(self, creator_id: UUID) -> List[Challenge]:
-        return self.repository.get_by_creator_id(creator_id)
+    def get_challenges_by_creator(self, creator_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Challenge]:
+        return self.repository.get_by_creator_id(creator_id, cursor, limit)
     
-    def get_public_challenges(self) -> List[Challenge]:
-        return self.repository.get_public_challenges()
+    def get_public_challenges(self, cursor: Optional[str] = None, limit: int = 100) -> Page[Challenge]:
+        return self.repository.get_public_challenges(cursor, limit)
     
     def update_challenge(self, challenge_id: UUID, challenge_data: ChallengeUpdate) -> Challenge:
-        challenge = self.get_challenge(challenge_id)
-        return self.repository.update(challenge, challenge_data.model_dump(exclude_unset=True))
+        challenge = self.repository.update_by_id(challenge_id, challenge_data.model_dump(exclude_unset=True))
+        if not challenge:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Challenge not found"
+            )
+        return challenge
+    
+    def delete_challenge(self, challenge_id: UUID, background: Optional[BackgroundTasks] = None) -> bool:
+        return purge(
+            self.repository.session,
+            challenge_purge_plan(challenge_id),
+            "Challenge not found",
+            background,
+            on_deleted=lambda: leaderboard_cache.remove_challenge(challenge_id)
+        )
+
+
+class LeaderboardCache(TTLCache):
+    """Clasificaciones en memoria de los retos consultados recientemente, indexadas por reto.
+
+    Solo se mantienen los retos "calientes": los demás se cargan desde la base de datos al
+    consultarse y el TTL limita cuánto puede divergir una copia de los cambios hechos por
+    otros procesos.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__("leaderboard", maxsize, ttl)
+        self.generation = 0
+
+    def update_score(self, participant: ChallengeParticipant) -> None:
+        """Refleja el alta o el cambio de puntuación de un participante en la clasificación cargada."""
+        self.generation += 1
+        leaderboard = self.peek(participant.challenge_id)
+        if leaderboard is not None:
+            leaderboard.set(participant.id, participant.user_id, participant.current_score)
+
+    def remove_participant(self, participant: ChallengeParticipant) -> None:
+        self.generation += 1
+        leaderboard = self.peek(participant.challenge_id)
+        if leaderboard is not None:
+            leaderboard.remove(participant.id)
+    
+    def remove_challenge(self, challenge_id: UUID) -> None:
+        self.generation += 1
+        self.pop(challenge_id)
+    
+    def clear(self) -> None:
+        self.generation += 1
+        super().clear()
+
+
+leaderboard_cache = LeaderboardCache(
+    maxsize=CONFIG.LEADERBOARD_CACHE_SIZE,
+    ttl=CONFIG.LEADERBOARD_CACHE_TTL
+)
+
+
+class LeaderboardService:
+    def __init__(self, session: Session):
+        self.repository = ChallengeParticipantRepository(session)
+    
+    def get_top(self, challenge_id: UUID, limit: int) -> list[LeaderboardEntryRead]:
+        return [_entry_read(entry) for entry in self._get_leaderboard(challenge_id).top(limit)]
+    
+    def get_position(self, challenge_id: UUID, user_id: UUID, neighbours: int) -> LeaderboardPositionRead:
+        leaderboard = self._get_leaderboard(challenge_id)
+        position = leaderboard.around(user_id, neighbours)
+        if position is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Participant not found"
+            )
+        entry, entries = position
+        return LeaderboardPositionRead(
+            participant=_entry_read(entry),
+            total_participants=len(leaderboard),
+            neighbours=[_entry_read(neighbour) for neighbour in entries]
+        )
     
-    def delete_challenge(self, challenge_id: UUID) -> None:
-        challenge = self.get_challenge(challenge_id)
-        self.repository.delete(challenge)
+    def _get_leaderboard(self, challenge_id: UUID) -> Leaderboard:
+        leaderboard = leaderboard_cache.get(challenge_id)
+        if leaderboard is None:
+            generation = leaderboard_cache.generation
+            leaderboard = Leaderboard(self.repository.get_scores(challenge_id))
+            # Si cambió alguna puntuación mientras se cargaba, la copia puede estar desactualizada
+            if generation == leaderboard_cache.generation:
+                leaderboard_cache.set(challenge_id, leaderboard)
+        return leaderboard
+
+
+def _entry_read(entry: LeaderboardEntry) -> LeaderboardEntryRead:
+    return LeaderboardEntryRead(
+        rank=entry.rank,
+        participant_id=entry.member,
+        user_id=entry.owner,
+        current_score=entry.score
+    )
 
 
 class ChallengeParticipantService:
@@ -56,7 +193,9 @@ class ChallengeParticipantService:
     
     def create_participant(self, participant_data: ChallengeParticipantCreate) -> ChallengeParticipant:
         participant = ChallengeParticipant(**participant_data.model_dump())
-        return self.repository.create(participant)
+        participant = self.repository.insert(participant)
+        on_commit(self.repository.session, lambda: leaderboard_cache.update_score(participant))
+        return participant
     
     def get_participant(self, participant_id: UUID) -> ChallengeParticipant:
         participant = self.repository.get_by_id(participant_id)
@@ -67,23 +206,30 @@ class ChallengeParticipantService:
             )
         return participant
     
-    def get_participants_by_challenge(self, challenge_id: UUID) -> List[ChallengeParticipant]:
-        return self.repository.get_by_challenge_id(challenge_id)
+    def get_participants_by_challenge(self, challenge_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeParticipant]:
+        return self.repository.get_by_challenge_id(challenge_id, cursor, limit)
     
-    def get_participants_by_user(self, user_id: UUID) -> List[ChallengeParticipant]:
-        return self.repository.get_by_user_id(user_id)
+    def get_participants_by_user(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeParticipant]:
+        return self.repository.get_by_user_id(user_id, cursor, limit)
     
     def update_participant(
         self, 
         participant_id: UUID, 
         participant_data: ChallengeParticipantUpdate
     ) -> ChallengeParticipant:
-        participant = self.get_participant(participant_id)
-        return self.repository.update(participant, participant_data.model_dump(exclude_unset=True))
+        participant = self.repository.update_by_id(participant_id, participant_data.model_dump(exclude_unset=True))
+        if not participant:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Participant not found"
+            )
+        on_commit(self.repository.session, lambda: leaderboard_cache.update_score(participant))
+        return participant
     
     def delete_participant(self, participant_id: UUID) -> None:
         participant = self.get_participant(participant_id)
         self.repository.delete(participant)
+        on_commit(self.repository.session, lambda: leaderboard_cache.remove_participant(participant))
 
 
 class ChallengeHabitService:
@@ -92,7 +238,7 @@ class ChallengeHabitService:
     
     def create_challenge_habit(self, challenge_habit_data: ChallengeHabitCreate) -> ChallengeHabit:
         challenge_habit = ChallengeHabit(**challenge_habit_data.model_dump())
-        return self.repository.create(challenge_habit)
+        return self.repository.insert(challenge_habit)
     
     def get_challenge_habit(self, challenge_habit_id: UUID) -> ChallengeHabit:
         challenge_habit = self.repository.get_by_id(challenge_habit_id)
@@ -103,8 +249,8 @@ class ChallengeHabitService:
             )
         return challenge_habit
     
-    def get_habits_by_challenge(self, challenge_id: UUID) -> List[ChallengeHabit]:
-        return self.repository.get_by_challenge_id(challenge_id)
+    def get_habits_by_challenge(self, challenge_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[ChallengeHabit]:
+        return self.repository.get_by_challenge_id(challenge_id, cursor, limit)
     
     def delete_challenge_habit(self, challenge_habit_id: UUID) -> None:
         challenge_habit = self.get_challenge_habit(challenge_habit_id)
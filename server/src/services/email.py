@@ -0,0 +1,268 @@
+import logging
+import smtplib
+import ssl
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Callable, List, Optional
+from urllib.parse import urlencode
+import anyio
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session
+from src.core.config import CONFIG
+from src.core.metrics import Counter
+from src.core.security import create_email_token
+from src.models.email import EmailOutbox
+from src.models.user import User
+from src.repositories.email import EmailOutboxRepository
+
+logger = logging.getLogger(__name__)
+
+CONFIRM_EMAIL = "confirm_email"
+
+EMAILS = Counter(
+    "email_outbox_messages_total",
+    "Correos procesados por el worker según el resultado del intento",
+    labelnames=("result",)
+)
+
+# Errores del servidor o de la conexión, no del mensaje: se corta el lote y se reintenta más tarde
+UNAVAILABLE_ERRORS = (
+    smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError, smtplib.SMTPAuthenticationError
+)
+# Errores tras los que no tiene sentido reintentar el mismo mensaje
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPNotSupportedError)
+
+
+def classify_error(error: OSError) -> str:
+    """Clasifica un fallo de envío como "unavailable", "permanent" o "retry"."""
+    if isinstance(error, UNAVAILABLE_ERRORS) or not isinstance(error, smtplib.SMTPException):
+        return "unavailable"
+    if isinstance(error, PERMANENT_ERRORS):
+        return "permanent"
+    if isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500:
+        return "permanent"
+    return "retry"
+
+
+def confirmation_email(user: User) -> EmailOutbox:
+    token = create_email_token(user.email, CONFIRM_EMAIL, timedelta(hours=CONFIG.EMAIL_CONFIRMATION_TTL_HOURS))
+    link = f"{CONFIG.API_URL.rstrip('/')}/api/auth/confirm?{urlencode({'token': token})}"
+    return EmailOutbox(
+        recipient=user.email,
+        subject="Confirma tu cuenta de HabitFlow",
+        body=(
+            f"Hola {user.first_name},\n\n"
+            f"Confirma tu correo para activar tu cuenta:\n{link}\n\n"
+            f"El enlace caduca en {CONFIG.EMAIL_CONFIRMATION_TTL_HOURS} horas."
+        )
+    )
+
+
+class SMTPMailer:
+    """Conexión SMTP que se abre en el primer envío y se reutiliza para los siguientes.
+
+    Si el servidor cerró la conexión inactiva, se reconecta una vez y se reintenta el envío.
+    No es seguro compartirla entre hilos; el worker la usa desde un solo hilo a la vez.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        sender: str = "",
+        starttls: bool = True,
+        timeout: float = 10.0
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username or "no-reply@habitflow.local"
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    @classmethod
+    def from_config(cls) -> "SMTPMailer":
+        return cls(
+            host=CONFIG.SMTP_SERVER,
+            port=CONFIG.SMTP_PORT,
+            username=CONFIG.EMAIL_USER,
+            password=CONFIG.EMAIL_PASSWORD,
+            sender=CONFIG.EMAIL_FROM,
+            starttls=CONFIG.SMTP_STARTTLS,
+            timeout=CONFIG.SMTP_TIMEOUT
+        )
+
+    def send(self, recipient: str, subject: str, body: str) -> None:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body)
+        try:
+            self._connection().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self._connection().send_message(message)
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    smtp.starttls(context=ssl.create_default_context())
+                if self.username:
+                    smtp.login(self.username, self.password)
+            except BaseException:
+                smtp.close()
+                raise
+            self._smtp = smtp
+        return self._smtp
+
+
+def outbox_lease(batch_size: int, smtp_timeout: float, lease: float = 0.0) -> float:
+    """Calcula la duración de la reserva de un lote de la bandeja de correo.
+
+    Cada envío puede agotar `smtp_timeout` (y una reconexión otro tanto), así que la reserva
+    debe cubrir `batch_size * smtp_timeout * 2`; si vence antes, otro worker reenviaría el lote.
+
+    Args:
+        batch_size (int): Correos por lote
+        smtp_timeout (float): Timeout de cada operación SMTP en segundos
+        lease (float): Reserva configurada; 0 usa el mínimo
+
+    Returns:
+        float: Segundos de reserva
+
+    Raises:
+        ValueError: Si la reserva configurada no cubre el peor caso de un lote
+    """
+    minimum = batch_size * smtp_timeout * 2
+    if not lease:
+        return minimum
+    if lease < minimum:
+        raise ValueError(
+            f"EMAIL_OUTBOX_LEASE={lease:g} no cubre un lote de {batch_size} correos con "
+            f"SMTP_TIMEOUT={smtp_timeout:g} (mínimo {minimum:g})"
+        )
+    return lease
+
+
+class EmailOutboxWorker:
+    """Envía los correos de `tbl_email_outbox` por lotes sobre una sola conexión SMTP.
+
+    Cada lote se reserva en una transacción corta (`sending` durante `lease` segundos), se
+    envía sin ninguna transacción abierta y los resultados se guardan en un segundo commit.
+    La entrega es "al menos una vez": si el proceso muere a mitad de lote, esos correos se
+    reenviarán al vencer la reserva. Los fallos temporales se reintentan con backoff
+    exponencial hasta `max_attempts`; los rechazos permanentes del servidor marcan el correo
+    como `failed` de inmediato y, si el servidor no está disponible, no se gasta ningún intento.
+
+    Args:
+        session_factory (Callable[[], Session]): Crea una sesión nueva para cada transacción
+        mailer (SMTPMailer): Conexión SMTP reutilizable
+        batch_size (int): Correos por lote
+        max_attempts (int): Intentos antes de marcar un correo como `failed`
+        backoff (float): Segundos de espera tras el primer fallo; se duplica en cada intento
+        max_backoff (float): Espera máxima entre intentos
+        poll_interval (float): Segundos de espera cuando no hay correos pendientes
+        lease (float): Segundos que un lote reservado queda fuera del alcance de otros workers
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        mailer: SMTPMailer,
+        batch_size: int,
+        max_attempts: int,
+        backoff: float,
+        max_backoff: float,
+        poll_interval: float,
+        lease: float
+    ):
+        self.session_factory = session_factory
+        self.mailer = mailer
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+
+    def drain_once(self, now: Optional[datetime] = None) -> int:
+        """Procesa un lote de correos pendientes y devuelve cuántos se intentaron enviar."""
+        now = now or datetime.now(timezone.utc)
+        with self.session_factory() as session:
+            messages = EmailOutboxRepository(session).claim_due(now, self.batch_size, now + timedelta(seconds=self.lease))
+        if not messages:
+            self.mailer.close()
+            return 0
+        attempted = self._send_batch(messages, now)
+        with self.session_factory() as session:
+            EmailOutboxRepository(session).save_all(messages)
+        if len(messages) < self.batch_size:
+            # Sin más trabajo pendiente: no se mantiene la conexión abierta hasta el siguiente sondeo
+            self.mailer.close()
+        return attempted
+
+    def _send_batch(self, messages: List[EmailOutbox], now: datetime) -> int:
+        for attempted, message in enumerate(messages, start=1):
+            try:
+                self.mailer.send(message.recipient, message.subject, message.body)
+            except OSError as exc:
+                kind = classify_error(exc)
+                if kind == "unavailable":
+                    # No se gastan intentos de este correo ni del resto del lote mientras el servidor no esté disponible
+                    self.mailer.close()
+                    self._release(messages[attempted - 1:], exc, now)
+                    return attempted
+                message.attempts += 1
+                self._fail(message, exc, now, permanent=kind == "permanent")
+            else:
+                message.attempts += 1
+                message.status, message.sent_at, message.last_error = "sent", now, None
+                EMAILS.labels("sent").inc()
+        return len(messages)
+
+    def _release(self, messages: List[EmailOutbox], error: Exception, now: datetime) -> None:
+        messages[0].last_error = f"{type(error).__name__}: {error}"[:500]
+        for message in messages:
+            message.status, message.next_attempt_at = "pending", now + timedelta(seconds=self.backoff)
+        EMAILS.labels("unavailable").inc()
+
+    def _fail(self, message: EmailOutbox, error: Exception, now: datetime, permanent: bool) -> None:
+        message.last_error = f"{type(error).__name__}: {error}"[:500]
+        if permanent or message.attempts >= self.max_attempts:
+            message.status = "failed"
+            EMAILS.labels("failed").inc()
+            logger.warning("Correo %s descartado tras %d intento(s): %s", message.id, message.attempts, message.last_error)
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** (message.attempts - 1))
+        message.status, message.next_attempt_at = "pending", now + timedelta(seconds=delay)
+        EMAILS.labels("retried").inc()
+
+    async def run(self) -> None:
+        """Drena la bandeja en el threadpool hasta que se cancele la tarea."""
+        try:
+            while True:
+                try:
+                    attempted = await run_in_threadpool(self.drain_once)
+                except Exception:
+                    logger.exception("Error procesando la bandeja de correo")
+                    attempted = 0
+                if attempted < self.batch_size:
+                    await anyio.sleep(self.poll_interval)
+        finally:
+            self.mailer.close()
@@ -1,11 +1,24 @@
-from typing import List
-from uuid import UUID
-from datetime import date
+from typing import Iterable, Iterator, Literal, NamedTuple, Optional
+from uuid import UUID, uuid4
+from datetime import date, datetime, timedelta, timezone
 from sqlmodel import Session
-from src.models.habit import Habit, HabitLog
-from src.schemas.habit import HabitCreate, HabitUpdate, HabitLogCreate, HabitLogUpdate
-from src.repositories.habit import HabitRepository, HabitLogRepository
-from fastapi import HTTPException, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.core.config import CONFIG
+from src.core.database import commit
+from src.core.pagination import Page
+from src.core.streaming import csv_chunks, ndjson_chunks
+from src.models.habit import Habit, HabitLog, HabitStats
+from src.schemas.habit import (
+    HabitCreate, HabitUpdate, HabitLogCreate, HabitLogUpdate,
+    HabitLogBatchCreate, HabitLogBatchItemResult, HabitLogBatchRead, HabitStatsRead
+)
+from src.repositories.habit import (
+    HabitRepository, HabitLogRepository, HabitStatsRepository,
+    AsyncHabitRepository, AsyncHabitLogRepository
+)
+from src.repositories.purge import habit_purge_plan
+from src.services.purge import purge
+from fastapi import BackgroundTasks, HTTPException, status
 
 
 class HabitService:
@@ -15,6 +28,7 @@ class HabitService:
     
     def create_habit(self, habit_data: HabitCreate) -> Habit:
         habit = Habit(**habit_data.model_dump())
+        habit.stats = HabitStats(habit_id=habit.id)
         return self.repository.create(habit)
     
     def get_habit(self, habit_id: UUID) -> Habit:
@@ -26,31 +40,312 @@ class HabitService:
             )
         return habit
     
-    def get_all_habits(self, skip: int = 0, limit: int = 100) -> List[Habit]:
-        return self.repository.get_all(skip=skip, limit=limit)
+    def get_all_habits(self, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
+        return self.repository.get_all(cursor=cursor, limit=limit)
     
-    def get_habits_by_user(self, user_id: UUID) -> List[Habit]:
-        return self.repository.get_by_user_id(user_id)
+    def get_habits_by_ids(self, ids: Iterable[UUID]) -> list[Habit]:
+        return self.repository.get_many(ids)
     
-    def get_active_habits_by_user(self, user_id: UUID) -> List[Habit]:
-        return self.repository.get_active_by_user_id(user_id)
+    def get_habits_by_user(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
+        return self.repository.get_by_user_id(user_id, cursor, limit)
+    
+    def get_active_habits_by_user(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
+        return self.repository.get_active_by_user_id(user_id, cursor, limit)
     
     def update_habit(self, habit_id: UUID, habit_data: HabitUpdate) -> Habit:
-        habit = self.get_habit(habit_id)
-        return self.repository.update(habit, habit_data.model_dump(exclude_unset=True))
+        habit = self.repository.update_by_id(habit_id, habit_data.model_dump(exclude_unset=True))
+        if not habit:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Habit not found"
+            )
+        return habit
+    
+    def delete_habit(self, habit_id: UUID, background: Optional[BackgroundTasks] = None) -> bool:
+        return purge(self.repository.session, habit_purge_plan(habit_id), "Habit not found", background)
+
+
+COMPLETED = "completed"
+ONE_DAY = timedelta(days=1)
+
+# (estado antes, estado después) del log de cada día; None si el log no existe
+StatusChanges = dict[date, tuple[Optional[str], Optional[str]]]
+
+
+class LoadedDates(NamedTuple):
+    """Días completados de un hábito entre `start` y `end` (ambos incluidos) según la base de datos."""
+    start: date
+    end: date
+    dates: set[date]
+
+
+class HabitStatsService:
+    """Mantiene la fila de `tbl_habit_stats` de cada hábito a partir de los cambios en sus logs.
+
+    Los cambios se aplican en la misma sesión que escribe el log, sin confirmar, de modo que
+    el commit del log guarda también las estadísticas. Añadir o quitar el último día de la
+    racha es O(1); las ediciones retroactivas solo leen los días completados dentro de una
+    ventana de `HABIT_STATS_WINDOW_DAYS` y recurren a todo el historial si la racha la desborda.
+    En un lote, esos días se leen una sola vez para todos los hábitos y las rachas se calculan en memoria.
+
+    La fila de estadísticas se bloquea antes de leer el estado anterior de los logs, de modo
+    que dos escrituras concurrentes sobre el mismo hábito se aplican una detrás de otra.
+    """
+    
+    def __init__(self, session: Session):
+        self.repository = HabitStatsRepository(session)
+        self.log_repository = HabitLogRepository(session)
+        self.window = timedelta(days=CONFIG.HABIT_STATS_WINDOW_DAYS)
+        self._loaded: dict[UUID, LoadedDates] = {}
+    
+    def get_stats(self, habit_id: UUID) -> HabitStatsRead:
+        stats = self.repository.get_by_habit_id(habit_id) or self.rebuild(habit_id)
+        current_streak = stats.current_streak
+        if stats.last_completed_date is None or stats.last_completed_date < date.today() - ONE_DAY:
+            current_streak = 0
+        return HabitStatsRead(
+            habit_id=habit_id,
+            total_logs=stats.total_logs,
+            completed_logs=stats.completed_logs,
+            completion_rate=stats.completed_logs / stats.total_logs if stats.total_logs else 0.0,
+            current_streak=current_streak,
+            longest_streak=stats.longest_streak,
+            last_completed_date=stats.last_completed_date,
+            updated_at=stats.updated_at
+        )
+    
+    def rebuild(self, habit_id: UUID) -> HabitStats:
+        stats = self.repository.get_by_habit_id(habit_id) or HabitStats(habit_id=habit_id)
+        self._recompute(stats)
+        stats.updated_at = datetime.now(timezone.utc)
+        self.repository.stage(stats)
+        commit(self.repository.session)
+        return stats
+    
+    def apply_status(self, habit_id: UUID, log_date: date, status: Optional[str]) -> None:
+        """Aplica el cambio del log del día al estado `status` (None si se borra)."""
+        self.apply_many({(habit_id, log_date): status})
+    
+    def apply_many(self, statuses: dict[tuple[UUID, date], Optional[str]]) -> None:
+        """Aplica el nuevo estado de los logs de varios (hábito, día) leyendo cada dato una sola vez.
+
+        Bloquea las estadísticas de los hábitos, lee el estado actual de esos logs y, si hay
+        días retroactivos, los días completados alrededor de ellos en una sola consulta.
+        """
+        habit_ids = {habit_id for habit_id, _ in statuses}
+        stats_by_habit = self.repository.get_by_habit_ids(habit_ids, for_update=True)
+        before = self.log_repository.get_statuses_many(statuses)
+        changes_by_habit: dict[UUID, StatusChanges] = {}
+        for (habit_id, log_date), status in statuses.items():
+            changes_by_habit.setdefault(habit_id, {})[log_date] = (before.get((habit_id, log_date)), status)
+        self._loaded = {}
+        if len(statuses) > 1:
+            self._load_windows(changes_by_habit, stats_by_habit)
+        # Las consultas de días no dependen de las estadísticas: no se envían a medias en cada una
+        with self.repository.session.no_autoflush:
+            for habit_id, changes in changes_by_habit.items():
+                self._apply(habit_id, stats_by_habit.get(habit_id), changes)
     
-    def delete_habit(self, habit_id: UUID) -> None:
-        habit = self.get_habit(habit_id)
-        self.repository.delete(habit)
+    def _load_windows(self, changes_by_habit: dict[UUID, StatusChanges], stats_by_habit: dict[UUID, HabitStats]) -> None:
+        """Lee en una consulta los días completados de cada hábito entre min(día) − ventana y max(día) + ventana.
+
+        El rango incluye también el último día completado, desde el que se recalcula la racha actual.
+        """
+        ranges = {}
+        for habit_id, changes in changes_by_habit.items():
+            last = getattr(stats_by_habit.get(habit_id), "last_completed_date", None)
+            days = [*changes, last] if last is not None else list(changes)
+            ranges[habit_id] = (min(days) - self.window, max(days) + self.window)
+        for habit_id, dates in self.log_repository.get_dates_with_status_many(ranges, COMPLETED).items():
+            self._loaded[habit_id] = LoadedDates(*ranges[habit_id], dates)
+    
+    def _apply(self, habit_id: UUID, stats: Optional[HabitStats], changes: StatusChanges) -> None:
+        if stats is None:
+            stats = HabitStats(habit_id=habit_id)
+            self._recompute(stats)
+        overrides: dict[date, bool] = {}
+        for day in sorted(changes):
+            before, after = changes[day]
+            was_completed, is_completed = before == COMPLETED, after == COMPLETED
+            stats.total_logs += (after is not None) - (before is not None)
+            overrides[day] = is_completed
+            if was_completed == is_completed:
+                continue
+            if is_completed:
+                stats.completed_logs += 1
+                self._mark_completed(stats, day, overrides)
+            else:
+                stats.completed_logs -= 1
+                self._unmark_completed(stats, day, overrides)
+        stats.updated_at = datetime.now(timezone.utc)
+        self.repository.stage(stats)
+    
+    def _mark_completed(self, stats: HabitStats, day: date, overrides: dict[date, bool]) -> None:
+        last = stats.last_completed_date
+        if last is None or day > last + ONE_DAY:
+            stats.current_streak, stats.last_completed_date = 1, day
+        elif day == last + ONE_DAY:
+            stats.current_streak, stats.last_completed_date = stats.current_streak + 1, day
+        elif day == last - timedelta(days=stats.current_streak):
+            stats.current_streak = self._run_ending(stats.habit_id, last, overrides)
+        
+        if stats.last_completed_date == day:
+            length, end = stats.current_streak, day
+        else:
+            length, end = self._run_through(stats.habit_id, day, overrides)
+        # Ante empate gana la racha más antigua, como en `_longest_run`
+        if length > stats.longest_streak or (length == stats.longest_streak and end < stats.longest_streak_end):
+            stats.longest_streak, stats.longest_streak_end = length, end
+    
+    def _unmark_completed(self, stats: HabitStats, day: date, overrides: dict[date, bool]) -> None:
+        last = stats.last_completed_date
+        if day == last and stats.current_streak > 1:
+            stats.current_streak, stats.last_completed_date = stats.current_streak - 1, day - ONE_DAY
+        elif day == last:
+            previous = self._last_completed_before(stats.habit_id, day, overrides)
+            stats.last_completed_date = previous
+            stats.current_streak = self._run_ending(stats.habit_id, previous, overrides) if previous else 0
+        elif last is not None and last - timedelta(days=stats.current_streak) < day < last:
+            stats.current_streak = (last - day).days
+        
+        end = stats.longest_streak_end
+        if end is not None and end - timedelta(days=stats.longest_streak) < day <= end:
+            dates = self._completed_dates(stats.habit_id, None, None, overrides)
+            stats.longest_streak, stats.longest_streak_end = _longest_run(dates)
+    
+    def _recompute(self, stats: HabitStats) -> None:
+        stats.total_logs, stats.completed_logs = self.log_repository.count_by_status(stats.habit_id, COMPLETED)
+        dates = self.log_repository.get_dates_with_status(stats.habit_id, COMPLETED)
+        stats.longest_streak, stats.longest_streak_end = _longest_run(dates)
+        stats.last_completed_date = max(dates, default=None)
+        stats.current_streak = _run_length(dates, stats.last_completed_date, -ONE_DAY) if dates else 0
+    
+    def _completed_dates(
+        self, 
+        habit_id: UUID, 
+        start_date: Optional[date], 
+        end_date: Optional[date], 
+        overrides: dict[date, bool]
+    ) -> set[date]:
+        start, end = start_date or date.min, end_date or date.max
+        loaded = self._loaded.get(habit_id)
+        if loaded is None or start < loaded.start or end > loaded.end:
+            fetched = LoadedDates(
+                start, end, self.log_repository.get_dates_with_status(habit_id, COMPLETED, start_date, end_date)
+            )
+            if loaded is None or (start <= loaded.start and end >= loaded.end):
+                self._loaded[habit_id] = fetched
+            loaded = fetched
+        dates = {day for day in loaded.dates if start <= day <= end}
+        for day, completed in overrides.items():
+            if (start_date is None or day >= start_date) and (end_date is None or day <= end_date):
+                (dates.add if completed else dates.discard)(day)
+        return dates
+    
+    def _run_ending(self, habit_id: UUID, day: date, overrides: dict[date, bool]) -> int:
+        start = day - self.window
+        length = _run_length(self._completed_dates(habit_id, start, day, overrides), day, -ONE_DAY)
+        if length > self.window.days:
+            length = _run_length(self._completed_dates(habit_id, None, day, overrides), day, -ONE_DAY)
+        return length
+    
+    def _run_through(self, habit_id: UUID, day: date, overrides: dict[date, bool]) -> tuple[int, date]:
+        dates = self._completed_dates(habit_id, day - self.window, day + self.window, overrides)
+        before, after = _run_length(dates, day, -ONE_DAY), _run_length(dates, day, ONE_DAY)
+        if max(before, after) > self.window.days:
+            dates = self._completed_dates(habit_id, None, None, overrides)
+            before, after = _run_length(dates, day, -ONE_DAY), _run_length(dates, day, ONE_DAY)
+        return before + after - 1, day + timedelta(days=after - 1)
+    
+    def _last_completed_before(self, habit_id: UUID, day: date, overrides: dict[date, bool]) -> Optional[date]:
+        loaded = self._loaded.get(habit_id)
+        if loaded is not None and loaded.start <= day <= loaded.end and all(other >= loaded.start for other in overrides):
+            # Los días cargados antes de `day` ya llevan aplicados los cambios; antes de `loaded.start` no hay ninguno
+            dates = self._completed_dates(habit_id, loaded.start, day - ONE_DAY, overrides)
+            if dates or loaded.start == date.min:
+                return max(dates, default=None)
+            return self.log_repository.get_last_date_with_status_before(habit_id, COMPLETED, loaded.start)
+        candidate = self.log_repository.get_last_date_with_status_before(habit_id, COMPLETED, day)
+        while candidate is not None and overrides.get(candidate) is False:
+            candidate = self.log_repository.get_last_date_with_status_before(habit_id, COMPLETED, candidate)
+        completed = [other for other, value in overrides.items() if value and other < day]
+        return max([*completed, candidate] if candidate else completed, default=None)
+
+
+def _run_length(dates: set[date], day: date, step: timedelta) -> int:
+    length = 0
+    while day in dates:
+        length, day = length + 1, day + step
+    return length
+
+
+def _longest_run(dates: set[date]) -> tuple[int, Optional[date]]:
+    longest, end = 0, None
+    for day in dates:
+        if day + ONE_DAY in dates:
+            continue
+        length = _run_length(dates, day, -ONE_DAY)
+        # Ante empate gana la racha más antigua; `_mark_completed` desempata igual
+        if length > longest or (length == longest and day < end):
+            longest, end = length, day
+    return longest, end
 
 
 class HabitLogService:
     def __init__(self, session: Session):
         self.repository = HabitLogRepository(session)
+        self.habit_repository = HabitRepository(session)
+        self.stats_service = HabitStatsService(session)
     
     def create_log(self, log_data: HabitLogCreate) -> HabitLog:
         log = HabitLog(**log_data.model_dump())
-        return self.repository.create(log)
+        self.stats_service.apply_status(log.habit_id, log.log_date, log.status)
+        return self.repository.upsert(log)
+    
+    def create_logs(self, batch: HabitLogBatchCreate) -> HabitLogBatchRead:
+        owners = self.habit_repository.get_owners(item.habit_id for item in batch.items)
+        now = datetime.now(timezone.utc)
+        results: list[Optional[HabitLogBatchItemResult]] = [None] * len(batch.items)
+        pending: dict[tuple[UUID, date], tuple[int, dict]] = {}
+        for index, item in enumerate(batch.items):
+            owner = owners.get(item.habit_id)
+            if owner is None:
+                results[index] = HabitLogBatchItemResult(index=index, status="error", detail="Habit not found")
+                continue
+            if owner != item.user_id:
+                results[index] = HabitLogBatchItemResult(
+                    index=index, status="error", detail="Habit does not belong to user"
+                )
+                continue
+            key = (item.habit_id, item.log_date)
+            if key in pending:
+                results[pending[key][0]] = HabitLogBatchItemResult(
+                    index=pending[key][0], status="error", detail="Superseded by a later item for the same day"
+                )
+            pending[key] = (index, {
+                **item.model_dump(),
+                "id": uuid4(),
+                "enabled": True,
+                "created_at": now,
+                "updated_at": now,
+            })
+        
+        self.stats_service.apply_many({key: row["status"] for key, (_, row) in pending.items()})
+        
+        indexes = [index for index, _ in pending.values()]
+        rows = self.repository.upsert_many([row for _, row in pending.values()])
+        for index, row in zip(indexes, rows):
+            results[index] = HabitLogBatchItemResult(
+                index=index,
+                status="created" if row.created_at == row.updated_at else "updated",
+                id=row.id
+            )
+        return HabitLogBatchRead(
+            created=sum(result.status == "created" for result in results),
+            updated=sum(result.status == "updated" for result in results),
+            failed=sum(result.status == "error" for result in results),
+            results=results
+        )
     
     def get_log(self, log_id: UUID) -> HabitLog:
         log = self.repository.get_by_id(log_id)
@@ -61,26 +356,130 @@ class HabitLogService:
             )
         return log
     
-    def get_logs_by_habit(self, habit_id: UUID) -> List[HabitLog]:
-        return self.repository.get_by_habit_id(habit_id)
+    def get_logs_by_habit(self, habit_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[HabitLog]:
+        return self.repository.get_by_habit_id(habit_id, cursor, limit)
+    
+    def get_logs_by_user(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[HabitLog]:
+        return self.repository.get_by_user_id(user_id, cursor, limit)
     
-    def get_logs_by_user(self, user_id: UUID) -> List[HabitLog]:
-        return self.repository.get_by_user_id(user_id)
+    def export_logs_by_user(self, user_id: UUID, format: Literal["ndjson", "csv"], batch_size: int) -> Iterator[bytes]:
+        rows = self.repository.stream_by_user_id(user_id, batch_size)
+        if format == "csv":
+            return csv_chunks(rows, HabitLog.__table__.c.keys(), batch_size)
+        return ndjson_chunks(rows, batch_size)
     
     def get_logs_by_date_range(
         self, 
         habit_id: UUID, 
         start_date: date, 
-        end_date: date
-    ) -> List[HabitLog]:
-        return self.repository.get_by_date_range(habit_id, start_date, end_date)
+        end_date: date, 
+        cursor: Optional[str] = None, 
+        limit: int = 100
+    ) -> Page[HabitLog]:
+        return self.repository.get_by_date_range(habit_id, start_date, end_date, cursor, limit)
     
     def update_log(self, log_id: UUID, log_data: HabitLogUpdate) -> HabitLog:
-        log = self.get_log(log_id)
         if log_data.progress_value == 100:
             log_data.status = 'completed'
-        return self.repository.update(log, log_data.model_dump(exclude_unset=True))
+        data = log_data.model_dump(exclude_unset=True)
+        if data.get("status") is not None:
+            # Solo un cambio de estado afecta a las estadísticas, y para aplicarlo hace falta el hábito y el día
+            log = self.get_log(log_id)
+            self.stats_service.apply_status(log.habit_id, log.log_date, data["status"])
+        log = self.repository.update_by_id(log_id, data)
+        if not log:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Habit log not found"
+            )
+        return log
     
     def delete_log(self, log_id: UUID) -> None:
         log = self.get_log(log_id)
+        self.stats_service.apply_status(log.habit_id, log.log_date, None)
         self.repository.delete(log)
+
+
+class AsyncHabitService:
+    def __init__(self, session: AsyncSession):
+        self.repository = AsyncHabitRepository(session)
+    
+    async def create_habit(self, habit_data: HabitCreate) -> Habit:
+        habit = Habit(**habit_data.model_dump())
+        habit.stats = HabitStats(habit_id=habit.id)
+        return await self.repository.create(habit)
+    
+    async def get_habit(self, habit_id: UUID) -> Habit:
+        habit = await self.repository.get_by_id(habit_id)
+        if not habit:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Habit not found"
+            )
+        return habit
+    
+    async def get_habits_by_user(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
+        return await self.repository.get_by_user_id(user_id, cursor, limit)
+    
+    async def get_active_habits_by_user(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[Habit]:
+        return await self.repository.get_active_by_user_id(user_id, cursor, limit)
+
+
+class AsyncHabitLogService:
+    def __init__(self, session: AsyncSession):
+        self.repository = AsyncHabitLogRepository(session)
+    
+    async def create_log(self, log_data: HabitLogCreate) -> HabitLog:
+        log = HabitLog(**log_data.model_dump())
+        await self._apply_stats(log.habit_id, log.log_date, log.status)
+        return await self.repository.upsert(log)
+    
+    async def _apply_stats(self, habit_id: UUID, log_date: date, status: Optional[str]) -> None:
+        await self.repository.session.run_sync(
+            lambda session: HabitStatsService(session).apply_status(habit_id, log_date, status)
+        )
+    
+    async def get_log(self, log_id: UUID) -> HabitLog:
+        log = await self.repository.get_by_id(log_id)
+        if not log:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Habit log not found"
+            )
+        return log
+    
+    async def get_logs_by_habit(self, habit_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[HabitLog]:
+        return await self.repository.get_by_habit_id(habit_id, cursor, limit)
+    
+    async def get_logs_by_user(self, user_id: UUID, cursor: Optional[str] = None, limit: int = 100) -> Page[HabitLog]:
+        return await self.repository.get_by_user_id(user_id, cursor, limit)
+    
+    async def get_logs_by_date_range(
+        self, 
+        habit_id: UUID, 
+        start_date: date, 
+        end_date: date, 
+        cursor: Optional[str] = None, 
+        limit: int = 100
+    ) -> Page[HabitLog]:
+        return await self.repository.get_by_date_range(habit_id, start_date, end_date, cursor, limit)
+    
+    async def update_log(self, log_id: UUID, log_data: HabitLogUpdate) -> HabitLog:
+        if log_data.progress_value == 100:
+            log_data.status = 'completed'
+        data = log_data.model_dump(exclude_unset=True)
+        if data.get("status") is not None:
+            log = await self.get_log(log_id)
+            await self._apply_stats(log.habit_id, log.log_date, data["status"])
+        log = await self.repository.update_by_id(log_id, data)
+        if not log:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Habit log not found"
+            )
+        return log
+    
+    async def delete_log(self, log_id: UUID) -> None:
+        log = await self.get_log(log_id)
+        await self._apply_stats(log.habit_id, log.log_date, None)
+        await self.repository.delete(log)
@@ -0,0 +1,79 @@
+import logging
+from typing import Callable, Optional
+from fastapi import BackgroundTasks, HTTPException, status
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session
+from src.core.config import CONFIG
+from src.core.database import on_commit
+from src.repositories.purge import PurgePlan, PurgeRepository
+
+logger = logging.getLogger(__name__)
+
+# Respuesta adicional de las rutas DELETE que usan `purge` con tareas en segundo plano
+PURGE_RESPONSES = {
+    status.HTTP_202_ACCEPTED: {"description": "Fila desactivada; el borrado de sus dependientes continúa en segundo plano"}
+}
+
+
+def purge(
+    session: Session,
+    plan: PurgePlan,
+    not_found: str,
+    background: Optional[BackgroundTasks] = None,
+    on_deleted: Optional[Callable[[], None]] = None
+) -> bool:
+    """Borra la fila principal de `plan` y todas sus filas dependientes con sentencias DELETE ... WHERE.
+
+    Si se pasa `background` y la fila tiene al menos PURGE_BACKGROUND_THRESHOLD filas
+    dependientes, la fila principal solo se desactiva y el borrado se completa después de
+    la respuesta, en lotes de PURGE_CHUNK_SIZE filas confirmados por separado.
+
+    Args:
+        session (Session): Sesión de la petición
+        plan (PurgePlan): Pasos del borrado, con la fila principal en último lugar
+        not_found (str): Mensaje del 404 si la fila principal no existe
+        background (Optional[BackgroundTasks], optional): Tareas de la respuesta para borrar en segundo plano
+        on_deleted (Optional[Callable[[], None]], optional): Invalida las cachés afectadas al confirmar la
+            transacción; en segundo plano se llama también al terminar el borrado
+
+    Raises:
+        HTTPException: 404 si la fila principal no existe
+
+    Returns:
+        bool: True si el borrado continúa en segundo plano
+    """
+    repository = PurgeRepository(session)
+    threshold = CONFIG.PURGE_BACKGROUND_THRESHOLD
+    deferred = background is not None and threshold > 0 and repository.count_dependents(plan, threshold) >= threshold
+    found = repository.disable(plan) if deferred else repository.delete(plan)
+    if not found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=not_found
+        )
+    if on_deleted is not None:
+        # Al confirmar: la fila ya no existe (o está desactivada) para las siguientes peticiones
+        on_commit(session, on_deleted)
+    if deferred:
+        # La tarea abre su propia sesión sobre el mismo engine; corre tras la respuesta, cuando la desactivación ya
+        # está confirmada. Se invalida otra vez al terminar porque, mientras tanto, una lectura puede haber vuelto
+        # a cachear filas dependientes que aún no se habían borrado.
+        background.add_task(purge_in_chunks, session.get_bind(), plan, CONFIG.PURGE_CHUNK_SIZE)
+        if on_deleted is not None:
+            background.add_task(on_deleted)
+    return deferred
+
+
+def purge_in_chunks(bind: Engine | Connection, plan: PurgePlan, chunk_size: int) -> int:
+    """Ejecuta `plan` en transacciones de como máximo `chunk_size` filas y devuelve cuántas se borraron.
+
+    Memoria y duración de cada transacción quedan acotadas por `chunk_size`. Si el proceso
+    se detiene a mitad, la fila principal sigue desactivada y repetir el DELETE lo completa.
+    """
+    deleted = 0
+    with Session(bind) as session:
+        repository = PurgeRepository(session)
+        while count := repository.delete_chunk(plan, chunk_size):
+            deleted += count
+    logger.info("Borrado en segundo plano completado: %d filas", deleted)
+    return deleted
@@ -1,22 +1,86 @@
-from typing import Optional, List
+import time
+from typing import Iterable, Optional
 from uuid import UUID
 import jwt
 from sqlmodel import Session
-from datetime import timedelta
+from datetime import date, timedelta
 from src.models.user import User, UserProfile
-from src.schemas.user import UserCreate, UserUpdate, UserProfileCreate, UserProfileUpdate, TokenData, Token
+from src.schemas.user import (
+    UserCreate, UserUpdate, UserProfileCreate, UserProfileUpdate, TokenData, Token,
+    DashboardHabitRead, DashboardRead
+)
 from src.repositories.user import UserRepository, UserProfileRepository
-from fastapi import Depends, HTTPException, status
-from src.core.security import verify_password, create_access_token, ALGORITHM
+from src.repositories.email import EmailOutboxRepository
+from src.repositories.purge import user_purge_plan
+from fastapi import BackgroundTasks, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from src.core.hashing import password_hasher
+from src.core.security import create_access_token, decode_email_token, ALGORITHM
+from src.core.cache import TTLCache
 from src.core.config import CONFIG
+from src.core.pagination import Page
 from src.exceptions import ServerError, UnauthorizedError
+from src.services.challenge import leaderboard_cache
+from src.services.email import CONFIRM_EMAIL, confirmation_email
+from src.services.purge import purge
+
+
+class PrincipalCache(TTLCache):
+    """Caché de usuarios autenticados indexada por token.
+
+    Mantiene un índice usuario -> tokens para poder invalidar todas las entradas
+    de un usuario cuando este se modifica o se elimina.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, enabled: bool = True):
+        super().__init__("principal", maxsize, ttl, enabled)
+        self._tokens_by_user: dict[UUID, set[str]] = {}
+        self.generation = 0
+
+    def set(self, key: str, value: User, ttl: Optional[float] = None) -> None:
+        super().set(key, value, ttl)
+        with self._lock:
+            if key in self._data:
+                self._tokens_by_user.setdefault(value.id, set()).add(key)
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        with self._lock:
+            self.generation += 1
+            for token in self._tokens_by_user.pop(user_id, set()):
+                self._data.pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self._tokens_by_user.clear()
+
+    def _evict(self, key: str) -> None:
+        _, account = self._data.pop(key)
+        tokens = self._tokens_by_user.get(account.id)
+        if tokens is not None:
+            tokens.discard(key)
+            if not tokens:
+                del self._tokens_by_user[account.id]
+
+
+principal_cache = PrincipalCache(
+    maxsize=CONFIG.PRINCIPAL_CACHE_SIZE,
+    ttl=CONFIG.PRINCIPAL_CACHE_TTL,
+    enabled=CONFIG.PRINCIPAL_CACHE_ENABLED
+)
 
 
 class UserService:
     def __init__(self, session: Session):
         self.repository = UserRepository(session)
+        self.outbox = EmailOutboxRepository(session)
 
     def get_account(self, token: str) -> User:
+        cached = principal_cache.get(token)
+        if cached is not None:
+            return cached
+        generation = principal_cache.generation
         try:
             payload = jwt.decode(token, CONFIG.SECRET_KEY, algorithms=[ALGORITHM])
             username = payload.get("username")
@@ -25,7 +89,17 @@ class UserService:
             account = self.repository.get_by_username(username)
             if account is None:
                 raise UnauthorizedError()
+            # Si otro hilo invalidó usuarios mientras se leía la base de datos,
+            # no se guarda una copia que podría estar desactualizada.
+            if generation == principal_cache.generation:
+                principal_cache.set(
+                    token,
+                    User(**account.model_dump()),
+                    ttl=payload["exp"] - time.time() if "exp" in payload else None
+                )
             return account
+        except UnauthorizedError:
+            raise
         except jwt.InvalidTokenError as e:
             raise UnauthorizedError() from e
         except jwt.ExpiredSignatureError as e:
@@ -33,14 +107,14 @@ class UserService:
         except Exception as e:
             raise ServerError() from e
 
-    def login(self, email: str, password: str):
-        user = self.repository.get_by_email(email)
+    async def login(self, email: str, password: str):
+        user = await run_in_threadpool(self.repository.get_by_email, email)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Usuario no encontrado"
             )
-        if not verify_password(password, user.password):
+        if not await password_hasher.verify(password, user.password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Credenciales incorrectas"
@@ -49,23 +123,45 @@ class UserService:
         token = create_access_token(token_data, timedelta(days=1.0))
         return Token(access_token=token)
     
-    def create_user(self, user_data: UserCreate) -> User:
-        existing_user = self.repository.get_by_email(user_data.email)
+    async def create_user(self, user_data: UserCreate) -> User:
+        await run_in_threadpool(self._ensure_available, user_data.email, user_data.username)
+        
+        user = User(**user_data.model_dump())
+        user.password = await password_hasher.hash(user_data.password)
+        return await run_in_threadpool(self._create_with_confirmation, user)
+    
+    def _create_with_confirmation(self, user: User) -> User:
+        # El correo se guarda en el mismo commit que el usuario: o existen los dos o ninguno
+        self.outbox.stage(confirmation_email(user))
+        return self.repository.insert(user)
+    
+    def confirm_email(self, token: str) -> User:
+        email = decode_email_token(token, CONFIRM_EMAIL)
+        user = self.repository.get_by_email(email) if email else None
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid or expired confirmation link"
+            )
+        if not user.is_confirmed:
+            user = self.repository.update(user, {"is_confirmed": True})
+            principal_cache.invalidate_user(user.id)
+        return user
+    
+    def _ensure_available(self, email: str, username: str) -> None:
+        existing_user = self.repository.get_by_email(email)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
-        existing_username = self.repository.get_by_username(user_data.username)
+        existing_username = self.repository.get_by_username(username)
         if existing_username:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already taken"
             )
-        
-        user = User(**user_data.model_dump())
-        return self.repository.create(user)
     
     def get_user(self, user_id: UUID) -> User:
         user = self.repository.get_by_id(user_id)
@@ -76,17 +172,58 @@ class UserService:
             )
         return user
     
+    def get_dashboard(self, user_id: UUID, today: date) -> DashboardRead:
+        week_start = today - timedelta(days=today.weekday())
+        user = self.repository.get_dashboard(user_id, week_start, today)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        habits = []
+        for habit in sorted(user.habits, key=lambda habit: habit.created_at):
+            week_logs = sorted(habit.habit_logs, key=lambda log: log.log_date)
+            habits.append(DashboardHabitRead(
+                **habit.model_dump(),
+                today_log=next((log for log in week_logs if log.log_date == today), None),
+                week_logs=week_logs
+            ))
+        return DashboardRead(
+            today=today,
+            week_start=week_start,
+            user=user,
+            profile=user.profile,
+            habits=habits,
+            challenge_participations=user.challenge_participations
+        )
+    
     
-    def get_all_users(self, skip: int = 0, limit: int = 100) -> List[User]:
-        return self.repository.get_all(skip=skip, limit=limit)
+    def get_all_users(self, cursor: Optional[str] = None, limit: int = 100) -> Page[User]:
+        return self.repository.get_all(cursor=cursor, limit=limit)
     
-    def update_user(self, user_id: UUID, user_data: UserUpdate) -> User:
-        user = self.get_user(user_id)
-        return self.repository.update(user, user_data.model_dump(exclude_unset=True))
+    def get_users_by_ids(self, ids: Iterable[UUID]) -> list[User]:
+        return self.repository.get_many(ids)
     
-    def delete_user(self, user_id: UUID) -> None:
-        user = self.get_user(user_id)
-        self.repository.delete(user)
+    async def update_user(self, user_id: UUID, user_data: UserUpdate) -> User:
+        update_data = user_data.model_dump(exclude_unset=True)
+        if update_data.get("password") is not None:
+            update_data["password"] = await password_hasher.hash(update_data["password"])
+        user = await run_in_threadpool(self.repository.update_by_id, user_id, update_data)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        principal_cache.invalidate_user(user_id)
+        return user
+    
+    def delete_user(self, user_id: UUID, background: Optional[BackgroundTasks] = None) -> bool:
+        def forget() -> None:
+            principal_cache.invalidate_user(user_id)
+            # Sus participaciones y los retos que creó pueden estar en cualquier clasificación cargada
+            leaderboard_cache.clear()
+        
+        return purge(self.repository.session, user_purge_plan(user_id), "User not found", background, forget)
 
 
 class UserProfileService:
@@ -102,7 +239,7 @@ class UserProfileService:
             )
         
         profile = UserProfile(**profile_data.model_dump())
-        return self.repository.create(profile)
+        return self.repository.insert(profile)
     
     def get_profile(self, profile_id: UUID) -> UserProfile:
         profile = self.repository.get_by_id(profile_id)
@@ -117,8 +254,13 @@ class UserProfileService:
         return self.repository.get_by_user_id(user_id)
     
     def update_profile(self, profile_id: UUID, profile_data: UserProfileUpdate) -> UserProfile:
-        profile = self.get_profile(profile_id)
-        return self.repository.update(profile, profile_data.model_dump(exclude_unset=True))
+        profile = self.repository.update_by_id(profile_id, profile_data.model_dump(exclude_unset=True))
+        if not profile:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Profile not found"
+            )
+        return profile
     
     def delete_profile(self, profile_id: UUID) -> None:
         profile = self.get_profile(profile_id)
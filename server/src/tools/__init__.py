@@ -0,0 +1 @@
+"""Comandos de mantenimiento que se ejecutan con `python -m src.tools.<comando>`."""
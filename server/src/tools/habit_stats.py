@@ -0,0 +1,46 @@
+"""Recalcula desde cero la tabla `tbl_habit_stats`.
+
+Uso:
+    python -m src.tools.habit_stats              # todos los hábitos
+    python -m src.tools.habit_stats --habit-id <uuid>
+"""
+import argparse
+from typing import Optional, Sequence
+from uuid import UUID
+from sqlmodel import Session, select
+from src.core.database import create_db_and_tables, get_engine
+from src.models.habit import Habit
+from src.services.habit import HabitStatsService
+
+
+def rebuild_stats(session: Session, habit_ids: Optional[Sequence[UUID]] = None) -> int:
+    """Recalcula las estadísticas de los hábitos indicados (o de todos)
+
+    Args:
+        session (Session): Sesión de base de datos
+        habit_ids (Optional[Sequence[UUID]], optional): Hábitos a recalcular; por defecto, todos
+
+    Returns:
+        int: Número de hábitos recalculados
+    """
+    if habit_ids is None:
+        habit_ids = session.exec(select(Habit.id).order_by(Habit.id)).all()
+    service = HabitStatsService(session)
+    for habit_id in habit_ids:
+        service.rebuild(habit_id)
+    return len(habit_ids)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recalcula las estadísticas de los hábitos desde sus logs.")
+    parser.add_argument("--habit-id", type=UUID, action="append", help="Hábito a recalcular (se puede repetir)")
+    args = parser.parse_args(argv)
+    
+    create_db_and_tables()
+    with Session(get_engine()) as session:
+        count = rebuild_stats(session, args.habit_id)
+    print(f"Estadísticas recalculadas para {count} hábito(s).")
+
+
+if __name__ == "__main__":
+    main()
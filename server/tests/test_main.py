@@ -1,13 +1,19 @@
+import re
+import threading
 import pytest
 from fastapi.testclient import TestClient
+from starlette.routing import Match
 from sqlmodel import SQLModel, create_engine, Session, select
+from sqlalchemy import event
 from sqlalchemy.pool import StaticPool
 from uuid import UUID
 
 # Importa tu app y modelos, y la dependencia que necesitas sobrescribir
 # --- ASUME que get_session y get_current_user son importables desde src.server ---
 from src.server import create_app 
+from src.core.config import CONFIG
 from src.core.database import get_session
+from src.core.response_cache import response_cache
 from src.models.user import User
 from src.models.habit import Habit
 from src.core.security import hash_password, verify_password
@@ -34,6 +40,74 @@ engine = create_engine(
     poolclass=StaticPool
 )
 
+# --- Presupuesto de consultas SQL por ruta (método, plantilla de la ruta) ---
+QUERY_BUDGETS = {
+    ("GET", "/"): 0,
+    ("GET", "/health"): 0,
+    ("GET", "/metrics"): 0,
+    ("GET", "unmatched"): 0,
+    ("POST", "/api/auth/login"): 1,
+    ("GET", "/api/auth/confirm"): 3,
+    ("POST", "/api/users"): 4,
+    ("GET", "/api/users"): 1,
+    ("GET", "/api/users/me"): 1,
+    ("GET", "/api/users/me/dashboard"): 6,
+    ("GET", "/api/users/{user_id}"): 1,
+    ("PATCH", "/api/users/{user_id}"): 1,
+    ("DELETE", "/api/users/{user_id}"): 9,
+    ("POST", "/api/users/profiles"): 2,
+    ("GET", "/api/users/profiles/{profile_id}"): 1,
+    ("GET", "/api/users/{user_id}/profile"): 1,
+    ("PATCH", "/api/users/profiles/{profile_id}"): 1,
+    ("DELETE", "/api/users/profiles/{profile_id}"): 2,
+    ("POST", "/api/habits"): 3,
+    ("GET", "/api/habits"): 1,
+    ("GET", "/api/habits/user/{user_id}"): 1,
+    ("GET", "/api/habits/{habit_id}"): 1,
+    ("PATCH", "/api/habits/{habit_id}"): 1,
+    ("DELETE", "/api/habits/{habit_id}"): 4,
+    ("POST", "/api/habits/logs"): 6,
+    # Con 2000 logs: los estados previos se leen en una consulta por IN_CHUNK_SIZE claves
+    ("POST", "/api/habits/logs/batch"): 10,
+    ("GET", "/api/habits/logs/{log_id}"): 1,
+    ("GET", "/api/habits/{habit_id}/logs"): 1,
+    ("GET", "/api/habits/{habit_id}/stats"): 2,
+    ("GET", "/api/habits/user/{user_id}/logs"): 1,
+    ("GET", "/api/habits/user/{user_id}/logs/export"): 1,
+    ("PATCH", "/api/habits/logs/{log_id}"): 6,
+    ("DELETE", "/api/habits/logs/{log_id}"): 6,
+    ("POST", "/api/challenges"): 1,
+    ("POST", "/api/challenges/full"): 5,
+    ("GET", "/api/challenges"): 1,
+    ("GET", "/api/challenges/public"): 1,
+    ("GET", "/api/challenges/creator/{creator_id}"): 1,
+    ("GET", "/api/challenges/{challenge_id}"): 1,
+    ("PATCH", "/api/challenges/{challenge_id}"): 1,
+    ("DELETE", "/api/challenges/{challenge_id}"): 3,
+    ("POST", "/api/challenges/participants"): 1,
+    ("GET", "/api/challenges/participants/{participant_id}"): 1,
+    ("GET", "/api/challenges/{challenge_id}/participants"): 1,
+    ("GET", "/api/challenges/{challenge_id}/leaderboard"): 1,
+    ("GET", "/api/challenges/{challenge_id}/leaderboard/users/{user_id}"): 1,
+    ("GET", "/api/challenges/user/{user_id}/participations"): 1,
+    ("PATCH", "/api/challenges/participants/{participant_id}"): 1,
+    ("DELETE", "/api/challenges/participants/{participant_id}"): 2,
+    ("POST", "/api/challenges/habits"): 1,
+    ("GET", "/api/challenges/habits/{challenge_habit_id}"): 1,
+    ("GET", "/api/challenges/{challenge_id}/habits"): 1,
+    ("DELETE", "/api/challenges/habits/{challenge_habit_id}"): 2,
+}
+
+
+def route_template(method: str, path: str) -> str:
+    scope = {"type": "http", "method": method, "path": path}
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
 # Fixture para la sesión de DB
 @pytest.fixture(name="session")
 def session_fixture():
@@ -57,11 +131,53 @@ def client_fixture(session: Session):
     # jwt.decode directamente, pero para esta prueba solo necesitamos
     # la sesión para que la creación de usuarios funcione.
 
-    with TestClient(app) as client:
+    # 3. Cada respuesta se comprueba contra el presupuesto de consultas de su ruta. Server-Timing
+    # se envía antes que el cuerpo, así que las consultas de las respuestas en streaming se cuentan
+    # con las sentencias del motor hasta el último bloque (sin las tareas en segundo plano)
+    violations = []
+    statements = []
+    response_sent = threading.Event()
+
+    def count_statement(conn, cursor, statement, *args):
+        if not response_sent.is_set():
+            statements.append(statement)
+
+    def reset_statements(request):
+        statements.clear()
+        response_sent.clear()
+
+    async def counted_app(scope, receive, send):
+        async def send_and_mark(message):
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_sent.set()
+            await send(message)
+        await app(scope, receive, send_and_mark)
+
+    def check_query_budget(response):
+        timing = response.headers.get("server-timing")
+        if timing is None:
+            return
+        counted, repeats = map(int, re.findall(r'desc="(\d+)', timing))
+        queries = max(counted, len(statements))
+        key = (response.request.method, route_template(response.request.method, response.request.url.path))
+        if key not in QUERY_BUDGETS:
+            violations.append(f"{key}: la ruta no tiene presupuesto de consultas")
+        elif queries > QUERY_BUDGETS[key]:
+            violations.append(f"{key}: {queries} consultas (presupuesto {QUERY_BUDGETS[key]})")
+        if repeats > CONFIG.QUERY_REPEAT_THRESHOLD:
+            violations.append(f"{key}: la misma sentencia se ejecutó {repeats} veces (posible N+1)")
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    with TestClient(counted_app) as client:
+        client.event_hooks["request"].append(reset_statements)
+        client.event_hooks["response"].append(check_query_budget)
         yield client
     
-    # 3. Limpiar las sobrescrituras
+    # 4. Limpiar las sobrescrituras y las respuestas cacheadas de la base de datos anterior
+    event.remove(engine, "before_cursor_execute", count_statement)
     app.dependency_overrides.clear()
+    response_cache.clear()
+    assert violations == []
 
 
 # ------------------------------
@@ -175,4 +291,1428 @@ def test_user_login_and_fetch_habits(client: TestClient, session: Session):
     habits = habits_resp.json()
     assert len(habits) == 1
     assert habits[0]["title"] == "Tomar agua"
-    assert habits[0]["user_id"] == user_id
\ No newline at end of file
+    assert habits[0]["user_id"] == user_id
+
+# ----------------------------------------------
+# Prueba de integración: rutas asíncronas de logs
+# ----------------------------------------------
+def test_async_habit_log_routes(monkeypatch, tmp_path):
+    """
+    Con DB_ASYNC activo, las rutas de logs usan AsyncSession sobre aiosqlite, sobre el mismo
+    fichero SQLite que la sesión síncrona del resto de rutas.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from src.core.config import Config
+    from src.core.database import get_async_session
+    from src.models.habit import HabitLog
+
+    monkeypatch.setattr(Config, "DB_ASYNC", True)
+    async_app = create_app({})
+    path = tmp_path / "async.db"
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    SQLModel.metadata.create_all(sync_engine)
+
+    def override_get_session():
+        with Session(sync_engine) as sync_session:
+            yield sync_session
+
+    async def override_get_async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
+    async_app.dependency_overrides[get_session] = override_get_session
+    async_app.dependency_overrides[get_async_session] = override_get_async_session
+
+    with TestClient(async_app) as async_client:
+        user_id = async_client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+        habit_resp = async_client.post("/api/habits", json={
+            "user_id": user_id,
+            "title": "Leer",
+            "category": "Estudio",
+            "goal_type": "daily",
+            "goal_value": 10
+        })
+        assert habit_resp.status_code == 201
+        habit_id = habit_resp.json()["id"]
+
+        log_resp = async_client.post("/api/habits/logs", json={
+            "habit_id": habit_id,
+            "user_id": user_id,
+            "log_date": "2025-01-01",
+            "progress_value": 100,
+            "status": "pending"
+        })
+        assert log_resp.status_code == 201
+        log_id = log_resp.json()["id"]
+
+        update_resp = async_client.patch(f"/api/habits/logs/{log_id}", json={"progress_value": 100})
+        assert update_resp.status_code == 200
+        assert update_resp.json()["status"] == "completed"
+
+        logs = async_client.get(f"/api/habits/{habit_id}/logs").json()
+        assert [log["id"] for log in logs] == [log_id]
+        with Session(sync_engine) as check:
+            assert check.get(HabitLog, UUID(log_id)).progress_value == 100
+
+        assert async_client.delete(f"/api/habits/logs/{log_id}").status_code == 204
+        assert async_client.get(f"/api/habits/logs/{log_id}").status_code == 404
+
+        async_client.portal.call(async_engine.dispose)
+    sync_engine.dispose()
+
+
+# ----------------------------------------------
+# Prueba unitaria: saturación del pool de hashing
+# ----------------------------------------------
+def test_login_returns_503_when_hash_queue_is_full(client: TestClient):
+    """
+    Si la cola del pool de bcrypt está llena, el login responde 503 de inmediato.
+    """
+    from src.core.hashing import password_hasher
+
+    assert client.post("/api/users", json=TEST_USER_DATA).status_code == 201
+
+    max_pending = password_hasher.max_pending
+    password_hasher.configure(max_pending=0)
+    try:
+        response = client.post("/api/auth/login", json={
+            "email": TEST_USER_DATA["email"],
+            "password": TEST_USER_DATA["password"]
+        })
+    finally:
+        password_hasher.configure(max_pending=max_pending)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.json()["status"] == 503
+
+
+# ----------------------------------------------
+# Prueba de integración: caché de usuarios autenticados
+# ----------------------------------------------
+def test_me_is_served_from_principal_cache(client: TestClient):
+    """
+    Tras la primera petición, /users/me no consulta la base de datos hasta que
+    el usuario se modifica.
+    """
+    from sqlalchemy import event
+    from src.services.user import principal_cache
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    token = client.post("/api/auth/login", json={
+        "email": TEST_USER_DATA["email"],
+        "password": TEST_USER_DATA["password"]
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        first = client.get("/api/users/me", headers=headers).json()
+        assert first["id"] == user_id
+        assert len(statements) == 1
+
+        assert client.get("/api/users/me", headers=headers).json() == first
+        assert len(statements) == 1
+        assert principal_cache.hits >= 1
+
+        client.patch(f"/api/users/{user_id}", json={"first_name": "Misa"})
+        statements.clear()
+        assert client.get("/api/users/me", headers=headers).json()["first_name"] == "Misa"
+        assert len(statements) == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+        principal_cache.clear()
+
+
+# ----------------------------------------------
+# Prueba de integración: paginación por cursor
+# ----------------------------------------------
+def test_logs_keyset_pagination(client: TestClient, session: Session):
+    """
+    Recorre los logs de un usuario página a página siguiendo la cabecera X-Next-Cursor.
+    """
+    from sqlalchemy import text
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit_id = client.post("/api/habits", json={
+        "user_id": user_id,
+        "title": "Meditar",
+        "category": "Salud",
+        "goal_type": "daily",
+        "goal_value": 15
+    }).json()["id"]
+    for day in (3, 1, 5, 2, 4):
+        client.post("/api/habits/logs", json={
+            "habit_id": habit_id,
+            "user_id": user_id,
+            "log_date": f"2025-01-0{day}",
+            "progress_value": 50,
+            "status": "pending"
+        })
+
+    dates, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/api/habits/user/{user_id}/logs", params=params)
+        assert response.status_code == 200
+        dates += [log["log_date"] for log in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert dates == [f"2025-01-0{day}" for day in range(1, 6)]
+
+    assert client.get(f"/api/habits/user/{user_id}/logs", params={"cursor": "basura"}).status_code == 400
+    assert client.get(f"/api/habits/user/{user_id}/logs", params={"limit": 100000}).status_code == 422
+
+    # La página siguiente se resuelve con un rango sobre el índice compuesto, sin OFFSET
+    plan = session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM tbl_habit_logs WHERE user_id = :user_id "
+        "AND (log_date, id) > ('2025-01-02', '') ORDER BY log_date, id LIMIT 3"
+    ), {"user_id": UUID(user_id).hex}).all()
+    assert any("ix_tbl_habit_logs_user_id_log_date" in row[-1] for row in plan)
+
+
+# ----------------------------------------------
+# Benchmark: ingesta de logs en lote vs uno a uno
+# ----------------------------------------------
+def test_batch_log_ingestion_uses_bounded_statements(client: TestClient, session: Session):
+    """
+    Registra logs uno a uno y en lote y valida los resultados por elemento: 2000 elementos caben
+    en el presupuesto fijo de sentencias del lote. El throughput se mide en `benchmarks/`.
+    """
+    from datetime import date, timedelta
+    from sqlalchemy import func
+    from src.models.habit import HabitLog
+
+    def queries(response) -> int:
+        return int(re.findall(r'desc="(\d+)', response.headers["server-timing"])[0])
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit_id = client.post("/api/habits", json={
+        "user_id": user_id,
+        "title": "Caminar",
+        "category": "Salud",
+        "goal_type": "daily",
+        "goal_value": 30
+    }).json()["id"]
+
+    def log(day: int) -> dict:
+        return {
+            "habit_id": habit_id,
+            "user_id": user_id,
+            "log_date": (date(2020, 1, 1) + timedelta(days=day)).isoformat(),
+            "progress_value": 100,
+            "status": "completed"
+        }
+
+    single_count, batch_count = 10, 2000
+    for day in range(single_count):
+        assert client.post("/api/habits/logs", json=log(day)).status_code == 201
+
+    items = [log(single_count + day) for day in range(batch_count)]
+    items[1] = {**items[1], "habit_id": user_id}
+    response = client.post("/api/habits/logs/batch", json={"items": items})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"]) == (batch_count - 1, 1)
+    assert body["results"][1] == {"index": 1, "status": "error", "id": None, "detail": "Habit not found"}
+    assert [result["index"] for result in body["results"]] == list(range(batch_count))
+    assert session.exec(select(func.count()).select_from(HabitLog)).one() == single_count + batch_count - 1
+    assert queries(response) <= QUERY_BUDGETS[("POST", "/api/habits/logs/batch")]
+
+
+# ----------------------------------------------
+# Prueba de integración: upsert de logs por día
+# ----------------------------------------------
+def test_resubmitting_a_day_updates_the_same_log(client: TestClient, session: Session):
+    """
+    Volver a enviar el log de un día actualiza el existente con una sola sentencia.
+    """
+    from sqlalchemy import event, func
+    from src.models.habit import HabitLog
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit_id = client.post("/api/habits", json={
+        "user_id": user_id,
+        "title": "Dormir 8h",
+        "category": "Salud",
+        "goal_type": "daily",
+        "goal_value": 8
+    }).json()["id"]
+    log = {"habit_id": habit_id, "user_id": user_id, "log_date": "2025-03-01", "status": "pending"}
+
+    first = client.post("/api/habits/logs", json={**log, "progress_value": 50}).json()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        second = client.post("/api/habits/logs", json={**log, "progress_value": 80})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert second.status_code == 201
+    assert second.json()["id"] == first["id"]
+    assert second.json()["progress_value"] == 80
+    assert second.json()["created_at"] == first["created_at"]
+    log_writes = [sql for sql in statements if "tbl_habit_logs" in sql and not sql.lstrip().startswith("SELECT")]
+    assert len(log_writes) == 1 and "ON CONFLICT" in log_writes[0]
+
+    batch = client.post("/api/habits/logs/batch", json={"items": [
+        {**log, "progress_value": 90},
+        {**log, "log_date": "2025-03-02", "progress_value": 10},
+        {**log, "log_date": "2025-03-02", "progress_value": 20},
+    ]}).json()
+    assert (batch["created"], batch["updated"], batch["failed"]) == (1, 1, 1)
+    assert batch["results"][0] == {"index": 0, "status": "updated", "id": first["id"], "detail": None}
+    assert batch["results"][1]["status"] == "error"
+    assert session.exec(select(func.count()).select_from(HabitLog)).one() == 2
+
+
+# ----------------------------------------------
+# Prueba de integración: exportación en streaming
+# ----------------------------------------------
+def test_export_logs_streams_ndjson_and_csv(client: TestClient):
+    """
+    La exportación devuelve los mismos datos que el listado, en NDJSON y en CSV.
+    """
+    import csv
+    import io
+    import json
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit_id = client.post("/api/habits", json={
+        "user_id": user_id,
+        "title": "Escribir",
+        "category": "Estudio",
+        "goal_type": "daily",
+        "goal_value": 500
+    }).json()["id"]
+    client.post("/api/habits/logs/batch", json={"items": [
+        {
+            "habit_id": habit_id,
+            "user_id": user_id,
+            "log_date": f"2025-02-{day:02d}",
+            "progress_value": day,
+            "status": "pending"
+        }
+        for day in range(1, 21)
+    ]})
+    listed = client.get(f"/api/habits/user/{user_id}/logs").json()
+
+    ndjson = client.get(f"/api/habits/user/{user_id}/logs/export")
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in ndjson.text.splitlines()] == listed
+
+    exported_csv = client.get(f"/api/habits/user/{user_id}/logs/export", params={"format": "csv"})
+    assert exported_csv.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(exported_csv.text)))
+    assert [row["id"] for row in rows] == [log["id"] for log in listed]
+    assert rows[0]["log_date"] == "2025-02-01" and rows[0]["progress_value"] == "1"
+
+
+def test_habit_stats_are_maintained_incrementally(client: TestClient, session: Session):
+    """
+    Las estadísticas se actualizan con cada alta, edición y borrado de logs y coinciden con el recálculo completo.
+    """
+    from datetime import date, timedelta
+    from src.services.habit import HabitStatsService
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit_id = client.post("/api/habits", json={
+        "user_id": user_id,
+        "title": "Meditar",
+        "category": "Salud",
+        "goal_type": "daily",
+        "goal_value": 1
+    }).json()["id"]
+    today = date.today()
+
+    def log(days_ago: int, status: str = "completed") -> dict:
+        day = (today - timedelta(days=days_ago)).isoformat()
+        return client.post("/api/habits/logs", json={
+            "habit_id": habit_id, "user_id": user_id, "log_date": day, "status": status, "progress_value": 0
+        }).json()
+
+    def stats() -> dict:
+        response = client.get(f"/api/habits/{habit_id}/stats")
+        assert response.status_code == 200
+        return response.json()
+
+    for days_ago in (6, 5, 3, 2, 1, 0):
+        log(days_ago)
+    log(4, "pending")
+    assert (stats()["current_streak"], stats()["longest_streak"], stats()["total_logs"]) == (4, 4, 7)
+
+    gap = log(4)
+    assert (stats()["current_streak"], stats()["longest_streak"]) == (7, 7)
+    assert stats()["completion_rate"] == 1.0
+
+    client.patch(f"/api/habits/logs/{gap['id']}", json={"status": "missed"})
+    assert (stats()["current_streak"], stats()["longest_streak"], stats()["completed_logs"]) == (4, 4, 6)
+
+    latest = client.get(f"/api/habits/{habit_id}/logs", params={"start_date": today.isoformat(), "end_date": today.isoformat()})
+    client.delete(f"/api/habits/logs/{latest.json()[0]['id']}")
+    current = stats()
+    assert (current["current_streak"], current["longest_streak"], current["total_logs"]) == (3, 3, 6)
+    assert current["last_completed_date"] == (today - timedelta(days=1)).isoformat()
+
+    rebuilt = HabitStatsService(session).rebuild(UUID(habit_id))
+    assert (rebuilt.current_streak, rebuilt.longest_streak, rebuilt.total_logs, rebuilt.completed_logs) == (3, 3, 6, 5)
+    assert client.get(f"/api/habits/{UUID(int=0)}/stats").status_code == 404
+
+    # Una racha más antigua de la misma longitud pasa a ser la más larga, igual que en el recálculo
+    for days_ago in (10, 9, 8):
+        log(days_ago)
+    session.expire_all()
+    incremental = HabitStatsService(session).repository.get_by_habit_id(UUID(habit_id))
+    assert (incremental.longest_streak, incremental.longest_streak_end) == (3, today - timedelta(days=8))
+    assert HabitStatsService(session).rebuild(UUID(habit_id)).longest_streak_end == today - timedelta(days=8)
+
+    # Un lote retroactivo (que completa y descompleta días dentro de rachas) cabe en el presupuesto de la ruta
+    statuses = ["completed", "completed", "completed", "pending", "completed", "missed"]
+    items = [
+        {"habit_id": habit_id, "user_id": user_id, "log_date": (today - timedelta(days=days_ago)).isoformat(),
+         "status": statuses[days_ago % len(statuses)], "progress_value": 0}
+        for days_ago in range(1, 301)
+    ]
+    response = client.post("/api/habits/logs/batch", json={"items": items})
+    assert response.status_code == 200
+    assert int(re.findall(r'desc="(\d+)', response.headers["server-timing"])[0]) <= 7
+    items = [{**item, "status": "missed"} for item in items[::7]]
+    assert client.post("/api/habits/logs/batch", json={"items": items}).status_code == 200
+    session.expire_all()
+    fields = ("total_logs", "completed_logs", "current_streak", "last_completed_date", "longest_streak", "longest_streak_end")
+    incremental = HabitStatsService(session).repository.get_by_habit_id(UUID(habit_id))
+    incremental = [getattr(incremental, field) for field in fields]
+    rebuilt = HabitStatsService(session).rebuild(UUID(habit_id))
+    assert incremental == [getattr(rebuilt, field) for field in fields]
+
+
+def test_challenge_leaderboard_top_and_rank(client: TestClient, session: Session):
+    """
+    La clasificación en memoria sigue los cambios de puntuación y coincide con el orden de la base de datos.
+    """
+    import random
+    from datetime import date
+    from sqlalchemy import text
+    from src.models.challenge import Challenge, ChallengeParticipant
+    from src.services.challenge import leaderboard_cache
+
+    creator_id = UUID(client.post("/api/users", json=TEST_USER_DATA).json()["id"])
+    challenge = Challenge(created_by=creator_id, title="Reto", start_date=date(2025, 1, 1), end_date=date(2025, 2, 1))
+    session.add(challenge)
+    session.commit()
+    rng = random.Random(7)
+    participants = [
+        ChallengeParticipant(challenge_id=challenge.id, user_id=creator_id, current_score=rng.randint(0, 50))
+        for _ in range(300)
+    ]
+    session.add_all(participants)
+    session.commit()
+
+    assert [entry["current_score"] for entry in client.get(f"/api/challenges/{challenge.id}/leaderboard").json()] \
+        == sorted((p.current_score for p in participants), reverse=True)[:10]
+
+    target = participants[42]
+    lookups = leaderboard_cache.hits + leaderboard_cache.misses
+    client.patch(f"/api/challenges/participants/{target.id}", json={"current_score": 1000})
+    joined = client.post("/api/challenges/participants", json={
+        "challenge_id": str(challenge.id), "user_id": str(UUID(int=7))
+    }).json()
+    client.delete(f"/api/challenges/participants/{participants[0].id}")
+    # Las escrituras actualizan la clasificación cargada sin contar como aciertos ni fallos
+    assert leaderboard_cache.hits + leaderboard_cache.misses == lookups
+
+    top = client.get(f"/api/challenges/{challenge.id}/leaderboard", params={"limit": 3}).json()
+    assert top[0] == {"rank": 1, "participant_id": str(target.id), "user_id": str(creator_id), "current_score": 1000}
+
+    position = client.get(
+        f"/api/challenges/{challenge.id}/leaderboard/users/{UUID(int=7)}", params={"neighbours": 2}
+    ).json()
+    scores = [p.current_score for p in participants[1:]] + [0]
+    assert position["total_participants"] == 300
+    assert position["participant"]["participant_id"] == joined["id"]
+    assert position["participant"]["rank"] == 1 + sum(score > 0 for score in scores)
+    # Los empates se ordenan por id de participante, como en la base de datos
+    session.expire_all()
+    ordered = sorted(session.exec(select(ChallengeParticipant)).all(), key=lambda p: (-p.current_score, p.id))
+    index = [p.id for p in ordered].index(UUID(joined["id"]))
+    assert [entry["participant_id"] for entry in position["neighbours"]] \
+        == [str(p.id) for p in ordered[max(index - 2, 0):index + 3]]
+    assert client.get(f"/api/challenges/{challenge.id}/leaderboard/users/{UUID(int=8)}").status_code == 404
+
+    plan = session.exec(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM tbl_challenge_participants "
+        "WHERE challenge_id = :id ORDER BY current_score DESC, id LIMIT 10"
+    ), params={"id": challenge.id.hex}).all()
+    assert "ix_tbl_challenge_participants_challenge_id_score" in str(plan)
+    assert "TEMP B-TREE" not in str(plan)
+
+
+def test_read_endpoints_revalidate_with_etag(client: TestClient, session: Session, monkeypatch):
+    """
+    Las lecturas cacheables devuelven ETag/Last-Modified, responden 304 sin consultar la base
+    de datos y se invalidan al confirmar cambios en las filas de las que dependen.
+    """
+    from sqlalchemy import event
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit = client.post("/api/habits", json={
+        "user_id": user_id,
+        "title": "Leer",
+        "category": "Estudio",
+        "goal_type": "daily",
+        "goal_value": 1
+    }).json()
+
+    first = client.get(f"/api/habits/{habit['id']}")
+    assert first.status_code == 200 and first.json() == habit
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"].endswith("GMT")
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        cached = client.get(f"/api/habits/{habit['id']}", headers={"If-None-Match": etag})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert cached.status_code == 304 and cached.content == b"" and statements == []
+
+    # Sin entrada en caché (otro worker, expiración) el 304 sale de las filas sin serializar el cuerpo
+    from src.core import response_cache as response_cache_module
+
+    def fail_serialize(*args):
+        raise AssertionError("un 304 no debe serializar el cuerpo")
+
+    response_cache.clear()
+    with monkeypatch.context() as patch:
+        patch.setattr(response_cache_module, "_serialize", fail_serialize)
+        assert client.get(f"/api/habits/{habit['id']}", headers={"If-None-Match": etag}).status_code == 304
+    assert len(response_cache) == 0
+
+    client.patch(f"/api/habits/{habit['id']}", json={"title": "Leer 20 minutos"})
+    changed = client.get(f"/api/habits/{habit['id']}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["title"] == "Leer 20 minutos"
+    assert changed.headers["ETag"] != etag
+
+    challenge = {"created_by": user_id, "title": "Reto", "start_date": "2025-01-01", "end_date": "2025-02-01", "is_public": True}
+    client.post("/api/challenges", json=challenge)
+    public = client.get("/api/challenges/public")
+    assert len(public.json()) == 1
+    client.post("/api/challenges", json=challenge)
+    assert client.get("/api/challenges/public", headers={"If-None-Match": public.headers["ETag"]}).status_code == 200
+    assert len(client.get("/api/challenges/public").json()) == 2
+
+
+def test_file_engine_uses_tuned_pool_and_sqlite_pragmas(tmp_path):
+    """
+    Los motores SQLite en fichero usan WAL y el pool instrumentado con la configuración de Config.
+    """
+    from sqlalchemy import text
+    from src.core.config import CONFIG
+    from src.core.database import (
+        POOL_CHECKOUT_SECONDS, POOL_CHECKED_OUT, TimedQueuePool, configure_sqlite, engine_options
+    )
+
+    url = f"sqlite:///{tmp_path / 'habits.db'}"
+    file_engine = configure_sqlite(create_engine(url, **engine_options(url)))
+    assert isinstance(file_engine.pool, TimedQueuePool)
+    assert file_engine.pool.size() == CONFIG.DB_POOL_SIZE
+    assert "poolclass" not in engine_options("sqlite://")
+
+    checkouts = POOL_CHECKOUT_SECONDS.labels("sync").count
+    with file_engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == CONFIG.SQLITE_BUSY_TIMEOUT
+        assert POOL_CHECKED_OUT.labels("sync").value == 1
+    assert POOL_CHECKED_OUT.labels("sync").value == 0
+    assert POOL_CHECKOUT_SECONDS.labels("sync").count == checkouts + 1
+    file_engine.dispose()
+
+
+def test_dashboard_loads_in_a_fixed_number_of_queries(client: TestClient, session: Session):
+    """
+    El dashboard devuelve hábitos activos, logs de la semana y retos activos sin consultas N+1.
+    """
+    from datetime import date, timedelta
+    from sqlalchemy import event
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    client.post("/api/users/profiles", json={"user_id": user_id, "display_name": "Misa"})
+    token = client.post("/api/auth/login", json={
+        "email": TEST_USER_DATA["email"], "password": TEST_USER_DATA["password"]
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    today = date.today()
+
+    def add_habit(title: str) -> str:
+        habit_id = client.post("/api/habits", json={
+            "user_id": user_id, "title": title, "category": "Salud", "goal_type": "daily", "goal_value": 1
+        }).json()["id"]
+        for day in (today, today - timedelta(days=today.weekday()), today - timedelta(days=30)):
+            client.post("/api/habits/logs", json={
+                "habit_id": habit_id, "user_id": user_id, "log_date": day.isoformat(),
+                "progress_value": 100, "status": "completed"
+            })
+        return habit_id
+
+    def count_queries() -> tuple[int, dict]:
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            response = client.get("/api/users/me/dashboard", headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert response.status_code == 200
+        return len(statements), response.json()
+
+    add_habit("Correr")
+    client.patch(f"/api/habits/{add_habit('Inactivo')}", json={"enabled": False})
+    challenge_id = client.post("/api/challenges", json={
+        "created_by": user_id, "title": "Reto", "start_date": "2025-01-01", "end_date": "2025-02-01"
+    }).json()["id"]
+    client.post("/api/challenges/participants", json={"challenge_id": challenge_id, "user_id": user_id})
+
+    count_queries()
+    queries, dashboard = count_queries()
+    assert dashboard["profile"]["display_name"] == "Misa"
+    assert [habit["title"] for habit in dashboard["habits"]] == ["Correr"]
+    assert dashboard["habits"][0]["today_log"]["log_date"] == today.isoformat()
+    assert len(dashboard["habits"][0]["week_logs"]) == (1 if today.weekday() == 0 else 2)
+    assert len(dashboard["challenge_participations"]) == 1
+
+    for title in ("Leer", "Meditar", "Agua"):
+        add_habit(title)
+    more_queries, dashboard = count_queries()
+    assert len(dashboard["habits"]) == 4
+    assert more_queries == queries <= 5
+
+
+def test_metrics_endpoint_exports_route_metrics(client: TestClient):
+    """
+    /metrics exporta en formato Prometheus las peticiones por ruta, la latencia y el estado del threadpool.
+    El coste del middleware se mide en `benchmarks/test_middleware.py`.
+    """
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    client.get(f"/api/users/{user_id}")
+    client.get(f"/api/users/{UUID(int=0)}")
+    client.get("/no-existe")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/users/{user_id}",status="200"}' in body
+    assert 'http_requests_total{method="GET",route="/api/users/{user_id}",status="404"}' in body
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/api/users",le="+Inf"}' in body
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert "threadpool_saturation " in body and "http_requests_in_flight 1" in body
+
+
+def test_every_route_stays_within_its_query_budget(client: TestClient):
+    """
+    Todas las rutas de la API tienen presupuesto de consultas; la fixture `client` lo comprueba
+    en cada respuesta, así que aquí se recorren las rutas que no cubren otras pruebas.
+    """
+    api_routes = {
+        (method, route.path)
+        for route in app.routes if hasattr(route, "methods")
+        for method in route.methods - {"HEAD"}
+        if route.path.startswith("/api")
+    }
+    assert api_routes <= QUERY_BUDGETS.keys()
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    profile_id = client.post("/api/users/profiles", json={"user_id": user_id}).json()["id"]
+    habit_id = client.post("/api/habits", json={
+        "user_id": user_id, "title": "Leer", "category": "Estudio", "goal_type": "daily", "goal_value": 1
+    }).json()["id"]
+    log_id = client.post("/api/habits/logs", json={
+        "habit_id": habit_id, "user_id": user_id, "log_date": "2025-01-01", "progress_value": 1, "status": "pending"
+    }).json()["id"]
+    challenge_id = client.post("/api/challenges", json={
+        "created_by": user_id, "title": "Reto", "start_date": "2025-01-01", "end_date": "2025-02-01"
+    }).json()["id"]
+    participant_id = client.post("/api/challenges/participants", json={
+        "challenge_id": challenge_id, "user_id": user_id
+    }).json()["id"]
+    challenge_habit_id = client.post("/api/challenges/habits", json={
+        "challenge_id": challenge_id, "habit_id": habit_id
+    }).json()["id"]
+
+    for path in (
+        "/api/users",
+        f"/api/users/profiles/{profile_id}",
+        f"/api/users/{user_id}/profile",
+        "/api/habits",
+        f"/api/habits/logs/{log_id}",
+        f"/api/habits/user/{user_id}/logs/export",
+        "/api/challenges",
+        f"/api/challenges/creator/{user_id}",
+        f"/api/challenges/{challenge_id}",
+        f"/api/challenges/participants/{participant_id}",
+        f"/api/challenges/{challenge_id}/participants",
+        f"/api/challenges/{challenge_id}/leaderboard/users/{user_id}",
+        f"/api/challenges/user/{user_id}/participations",
+        f"/api/challenges/habits/{challenge_habit_id}",
+        f"/api/challenges/{challenge_id}/habits",
+    ):
+        assert client.get(path).status_code == 200, path
+
+    assert client.patch(f"/api/users/profiles/{profile_id}", json={"display_name": "Misa"}).status_code == 200
+    assert client.patch(f"/api/challenges/{challenge_id}", json={"title": "Reto 2"}).status_code == 200
+    assert client.delete(f"/api/challenges/habits/{challenge_habit_id}").status_code == 204
+    assert client.delete(f"/api/challenges/participants/{participant_id}").status_code == 204
+    assert client.delete(f"/api/challenges/{challenge_id}").status_code == 204
+    assert client.delete(f"/api/habits/{habit_id}").status_code == 204
+    assert client.delete(f"/api/users/profiles/{profile_id}").status_code == 204
+    assert client.delete(f"/api/users/{user_id}").status_code == 204
+
+
+def test_seed_tool_is_deterministic_and_consistent():
+    """
+    El generador de datos produce las mismas filas para la misma semilla y estadísticas iguales al recálculo.
+    """
+    from datetime import date
+    from src.models import HabitLog, HabitStats
+    from src.tools.habit_stats import rebuild_stats
+    from src.tools.seed import SeedOptions, seed
+
+    options = SeedOptions(users=4, habits_per_user=2, days=60, end_date=date(2025, 3, 1), challenges=2,
+                          participants_per_challenge=3, seed=7)
+    engines = [create_engine("sqlite://", poolclass=StaticPool) for _ in range(2)]
+    counts = [seed(seed_engine, options, chunk_size=50) for seed_engine in engines]
+    assert counts[0] == counts[1]
+    assert counts[0]["tbl_habits"] == 8 and counts[0]["tbl_challenge_participants"] == 6
+    assert 0 < counts[0]["tbl_habit_logs"] <= 8 * 60
+
+    def dump(seed_engine, model) -> list:
+        with Session(seed_engine) as seed_session:
+            return [row.model_dump(exclude={"id", "created_at", "updated_at"} if model is HabitStats else set())
+                    for row in seed_session.exec(select(model).order_by(model.id))]
+
+    assert dump(engines[0], HabitLog) == dump(engines[1], HabitLog)
+    seeded = dump(engines[0], HabitStats)
+    with Session(engines[0]) as seed_session:
+        assert rebuild_stats(seed_session) == 8
+    assert sorted(seeded, key=str) == sorted(dump(engines[0], HabitStats), key=str)
+
+
+def test_fast_json_responses_match_fastapi_output(monkeypatch, client: TestClient):
+    """
+    Con FAST_JSON_RESPONSES los listados y lecturas cacheadas devuelven exactamente los mismos bytes.
+    """
+    import src.schemas as schemas
+    from src.core.config import Config
+    from src.core.serialization import supports
+
+    assert all(supports(getattr(schemas, name)) for name in schemas.__all__ if name.endswith("Read"))
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit_id = client.post("/api/habits", json={
+        "user_id": user_id, "title": "Leer ñandú", "category": "Estudio", "goal_type": "daily", "goal_value": 2
+    }).json()["id"]
+    for day in range(1, 4):
+        client.post("/api/habits/logs", json={
+            "habit_id": habit_id, "user_id": user_id, "log_date": f"2025-04-0{day}",
+            "progress_value": day, "status": "completed"
+        })
+    challenge_id = client.post("/api/challenges", json={
+        "created_by": user_id, "title": "Abril", "start_date": "2025-04-01", "end_date": "2025-04-30", "is_public": True
+    }).json()["id"]
+    client.post("/api/challenges/participants", json={"challenge_id": challenge_id, "user_id": user_id})
+    urls = [
+        "/api/users", f"/api/users/{user_id}", "/api/habits", f"/api/habits/{habit_id}",
+        f"/api/habits/user/{user_id}", f"/api/habits/{habit_id}/logs?limit=2", f"/api/habits/user/{user_id}/logs",
+        "/api/challenges", "/api/challenges/public", f"/api/challenges/{challenge_id}",
+        f"/api/challenges/{challenge_id}/participants", f"/api/challenges/user/{user_id}/participations",
+    ]
+
+    def responses() -> list:
+        response_cache.clear()
+        return [(response.status_code, response.content, response.headers.get("link"))
+                for response in map(client.get, urls)]
+
+    expected = responses()
+    assert all(status == 200 for status, _, _ in expected)
+    monkeypatch.setattr(Config, "FAST_JSON_RESPONSES", True)
+    assert responses() == expected
+
+
+def test_lifespan_creates_schema_lazily_and_disposes_engine(monkeypatch, tmp_path):
+    """
+    Crear la aplicación no toca la base de datos: el esquema se crea al arrancar y el motor se libera al apagar.
+    """
+    from sqlalchemy import inspect
+    from src.core import database
+    from src.core.config import Config
+
+    monkeypatch.setattr(Config, "DB_URL", f"sqlite:///{tmp_path / 'lifespan.db'}")
+    monkeypatch.setattr(database, "_engine", None)
+    lazy_app = create_app({})
+    assert database._engine is None
+    with TestClient(lazy_app) as lazy_client:
+        assert lazy_client.get("/health").status_code == 200
+        assert "tbl_users" in inspect(database.get_engine()).get_table_names()
+    assert database._engine is None
+
+    monkeypatch.setattr(Config, "DB_URL", f"sqlite:///{tmp_path / 'migrated.db'}")
+    monkeypatch.setattr(Config, "DB_CREATE_SCHEMA", False)
+    with TestClient(create_app({})):
+        assert inspect(database.get_engine()).get_table_names() == []
+    assert database._engine is None
+
+
+def test_admission_control_rejects_overload_quickly(monkeypatch, tmp_path):
+    """
+    Los token buckets devuelven 429 con Retry-After y los grupos saturados rechazan en lugar de encolar sin límite.
+    """
+    import anyio
+    from src.core import database
+    from src.core.admission import ConcurrencyLimiter, RateLimiter
+    from src.core.config import Config
+    from src.core.middleware import route_group
+
+    assert route_group("POST", "/api/auth/login") == "auth"
+    assert route_group("POST", "/api/users") == "auth"
+    assert route_group("GET", "/api/habits/user/1/logs/export") == "exports"
+    assert route_group("PATCH", "/api/habits/1") == "writes"
+    assert route_group("GET", "/api/habits/user/1/logs") == "reads"
+    assert route_group("GET", "/metrics") is None
+
+    bucket = RateLimiter(rate=2, burst=2)
+    assert [bucket.acquire("ip", now=0.0) for _ in range(3)] == [0, 0, 0.5]
+    assert bucket.acquire("ip", now=0.6) == 0 and bucket.acquire("other", now=0.6) == 0
+
+    async def saturate() -> list:
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=0.05)
+        results = [await limiter.acquire()]
+        async with anyio.create_task_group() as tasks:
+            async def queued():
+                results.append(await limiter.acquire())
+            tasks.start_soon(queued)
+            await anyio.sleep(0.01)
+            results.append(await limiter.acquire())
+        limiter.release()
+        results.append(await limiter.acquire())
+        return results
+
+    assert anyio.run(saturate) == [True, False, False, True]
+
+    monkeypatch.setattr(Config, "DB_URL", f"sqlite:///{tmp_path / 'admission.db'}")
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(Config, "RATE_LIMIT_IP_RATE", 0.01)
+    monkeypatch.setattr(Config, "RATE_LIMIT_IP_BURST", 2)
+    with TestClient(create_app({})) as limited:
+        assert [limited.get("/api/users").status_code for _ in range(3)] == [200, 200, 429]
+        rejected = limited.get("/api/users")
+        assert int(rejected.headers["retry-after"]) >= 1
+        assert rejected.json()["status"] == 429
+        assert limited.get("/health").status_code == 200
+
+    # Detrás de un proxy de confianza cada cliente tiene su propio token bucket
+    monkeypatch.setattr(Config, "TRUSTED_PROXIES", "testclient")
+    with TestClient(create_app({})) as proxied:
+        def status_from(address: str) -> int:
+            return proxied.get("/api/users", headers={"X-Forwarded-For": address}).status_code
+
+        assert [status_from("203.0.113.1") for _ in range(3)] == [200, 200, 429]
+        assert status_from("203.0.113.2") == 200
+
+
+def test_signup_queues_confirmation_email_and_worker_retries(client: TestClient, session: Session):
+    """
+    El correo de confirmación se guarda en el mismo commit que el usuario y el worker lo envía
+    con reintentos: backoff exponencial ante fallos temporales y `failed` ante rechazos permanentes.
+    """
+    import smtplib
+    from datetime import datetime, timedelta, timezone
+    from urllib.parse import urlparse
+    from src.models.email import EmailOutbox
+    from src.services.email import EmailOutboxWorker
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    message = session.exec(select(EmailOutbox)).one()
+    assert message.recipient == TEST_USER_DATA["email"] and message.status == "pending"
+
+    link = urlparse(re.search(r"https?://\S+", message.body).group())
+    assert client.get(f"{link.path}?{link.query}").json() == {"email": TEST_USER_DATA["email"], "is_confirmed": True}
+    assert client.get(f"/api/users/{user_id}").json()["is_confirmed"] is True
+    assert client.get("/api/auth/confirm", params={"token": "invalido"}).status_code == 400
+
+    class FlakyMailer:
+        def __init__(self, errors):
+            self.errors, self.sent, self.closed = list(errors), [], 0
+
+        def send(self, recipient, subject, body):
+            # La reserva ya está confirmada: el envío no mantiene abierta ninguna transacción
+            with Session(engine) as other:
+                claimed = other.exec(select(EmailOutbox).where(EmailOutbox.recipient == recipient)).one()
+                assert claimed.status == "sending"
+            error = self.errors.pop(0) if self.errors else None
+            if error is not None:
+                raise error
+            self.sent.append(recipient)
+
+        def close(self):
+            self.closed += 1
+
+    session.add(EmailOutbox(recipient="rechazado@example.com", subject="s", body="b"))
+    session.commit()
+    mailer = FlakyMailer([
+        smtplib.SMTPResponseException(451, b"try later"),
+        smtplib.SMTPRecipientsRefused({"rechazado@example.com": (550, b"no such user")}),
+    ])
+    worker = EmailOutboxWorker(
+        lambda: Session(engine), mailer, batch_size=10, max_attempts=3, backoff=30, max_backoff=45, poll_interval=0,
+        lease=60
+    )
+    now = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    assert worker.drain_once(now) == 2
+    session.expire_all()
+    first = session.exec(select(EmailOutbox).where(EmailOutbox.recipient == TEST_USER_DATA["email"])).one()
+    second = session.exec(select(EmailOutbox).where(EmailOutbox.recipient == "rechazado@example.com")).one()
+    assert (first.status, first.attempts) == ("pending", 1)
+    assert first.next_attempt_at.replace(tzinfo=timezone.utc) == now + timedelta(seconds=30)
+    assert (second.status, second.attempts) == ("failed", 1) and "SMTPRecipientsRefused" in second.last_error
+    assert mailer.closed == 1
+
+    assert worker.drain_once(now) == 0
+    assert worker.drain_once(now + timedelta(seconds=30)) == 1
+    session.refresh(first)
+    assert (first.status, first.attempts, first.last_error) == ("sent", 2, None)
+    assert mailer.sent == [TEST_USER_DATA["email"]]
+
+    unavailable = FlakyMailer([ConnectionRefusedError()] * 3)
+    session.add_all([EmailOutbox(recipient=f"u{i}@example.com", subject="s", body="b") for i in range(3)])
+    session.commit()
+    worker.mailer = unavailable
+    worker.max_attempts = 1
+    assert worker.drain_once(now) == 1
+    pending = list(session.exec(select(EmailOutbox).where(EmailOutbox.recipient.like("u%@example.com"))))
+    # Con el servidor caído no se gasta ningún intento: todo el lote vuelve a `pending` tras el backoff
+    assert {(m.status, m.attempts) for m in pending} == {("pending", 0)}
+    assert {m.next_attempt_at.replace(tzinfo=timezone.utc) for m in pending} == {now + timedelta(seconds=30)}
+
+    # Una reserva vencida (worker muerto a mitad de lote) se vuelve a enviar
+    session.add(EmailOutbox(recipient="huerfano@example.com", subject="s", body="b", status="sending", next_attempt_at=now))
+    session.commit()
+    worker.mailer = FlakyMailer([])
+    assert worker.drain_once(now + timedelta(seconds=30)) == 4
+    assert sorted(worker.mailer.sent) == ["huerfano@example.com"] + [f"u{i}@example.com" for i in range(3)]
+
+
+def test_email_outbox_lease_covers_a_whole_batch(monkeypatch, tmp_path):
+    """
+    La reserva por defecto cubre un lote entero agotando SMTP_TIMEOUT y una reserva más corta impide arrancar.
+    """
+    from src.core.config import Config
+    from src.services.email import outbox_lease
+
+    assert outbox_lease(50, 10.0) == 1000
+    assert outbox_lease(50, 10.0, 1200) == 1200
+    with pytest.raises(ValueError, match="EMAIL_OUTBOX_LEASE"):
+        outbox_lease(50, 10.0, 300)
+
+    monkeypatch.setattr(Config, "DB_URL", f"sqlite:///{tmp_path / 'outbox.db'}")
+    monkeypatch.setattr(Config, "SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setattr(Config, "EMAIL_OUTBOX_LEASE", 300.0)
+    with pytest.raises(ValueError):
+        with TestClient(create_app({})):
+            pass
+    assert not (tmp_path / "outbox.db").exists()
+
+
+def test_email_outbox_worker_delivers_over_smtp():
+    """
+    Integración con un servidor SMTP real (aiosmtpd): un lote se envía por una sola conexión.
+    """
+    import socket
+    from aiosmtpd import controller as aiosmtpd_controller
+    from src.models.email import EmailOutbox
+    from src.services.email import EmailOutboxWorker, SMTPMailer
+
+    class Recorder:
+        def __init__(self):
+            self.sessions, self.recipients = set(), []
+
+        async def handle_DATA(self, server, smtp_session, envelope):
+            self.sessions.add(id(smtp_session))
+            self.recipients.extend(envelope.rcpt_tos)
+            return "250 OK"
+
+    # Controller.start() comprueba el servidor conectándose a su puerto, así que no admite port=0
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Recorder()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        outbox_engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        SQLModel.metadata.create_all(outbox_engine)
+        with Session(outbox_engine) as outbox_session:
+            outbox_session.add_all([EmailOutbox(recipient=f"u{i}@example.com", subject="s", body="b") for i in range(5)])
+            outbox_session.commit()
+        mailer = SMTPMailer("127.0.0.1", port, starttls=False)
+        worker = EmailOutboxWorker(
+            lambda: Session(outbox_engine), mailer, batch_size=10, max_attempts=3, backoff=1, max_backoff=1, poll_interval=0,
+            lease=60
+        )
+        assert worker.drain_once() == 5
+        assert sorted(handler.recipients) == [f"u{i}@example.com" for i in range(5)]
+        assert len(handler.sessions) == 1
+        with Session(outbox_engine) as outbox_session:
+            assert {m.status for m in outbox_session.exec(select(EmailOutbox))} == {"sent"}
+    finally:
+        controller.stop()
+
+
+def test_list_routes_fetch_many_ids_in_request_order(monkeypatch, client: TestClient, session: Session):
+    """
+    `?ids=` devuelve los registros pedidos en ese orden con una consulta `IN` por grupo de ids.
+    """
+    from src.core.config import Config
+    from src.repositories import base
+    from src.repositories.habit import HabitRepository
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit_ids = [
+        client.post("/api/habits", json={
+            "user_id": user_id, "title": f"Hábito {i}", "category": "Salud", "goal_type": "daily", "goal_value": 1
+        }).json()["id"]
+        for i in range(5)
+    ]
+    challenge_id = client.post("/api/challenges", json={
+        "created_by": user_id, "title": "Reto", "start_date": "2025-01-01", "end_date": "2025-02-01"
+    }).json()["id"]
+    missing = "00000000-0000-0000-0000-000000000000"
+
+    wanted = [habit_ids[3], missing, habit_ids[0], habit_ids[3], habit_ids[1]]
+    response = client.get("/api/habits", params={"ids": ",".join(wanted)})
+    assert [habit["id"] for habit in response.json()] == [habit_ids[3], habit_ids[0], habit_ids[1]]
+    assert "x-next-cursor" not in response.headers
+    repeated = client.get("/api/habits", params=[("ids", habit_ids[2]), ("ids", habit_ids[4])])
+    assert [habit["id"] for habit in repeated.json()] == [habit_ids[2], habit_ids[4]]
+    assert client.get("/api/habits", params={"ids": ""}).json() == []
+
+    assert [user["id"] for user in client.get(f"/api/users?ids={user_id}").json()] == [user_id]
+    assert [c["id"] for c in client.get(f"/api/challenges?ids={missing},{challenge_id}").json()] == [challenge_id]
+    assert client.get("/api/habits?ids=no-es-un-uuid").status_code == 400
+    monkeypatch.setattr(Config, "MAX_PAGE_SIZE", 2)
+    assert client.get("/api/habits", params={"ids": ",".join(habit_ids[:3])}).status_code == 400
+
+    monkeypatch.setattr(base, "IN_CHUNK_SIZE", 2)
+    reversed_ids = [UUID(habit_id) for habit_id in reversed(habit_ids)]
+    assert [habit.id for habit in HabitRepository(session).get_many(reversed_ids)] == reversed_ids
+
+
+def test_deletes_cascade_with_set_based_statements(monkeypatch, client: TestClient, session: Session):
+    """
+    Borrar un usuario elimina todo su historial sin cargarlo en memoria y, por encima del umbral,
+    el borrado se completa en segundo plano por lotes.
+    """
+    from sqlalchemy import func
+    from src.core.config import Config
+    from src.models.user import UserProfile
+    from src.models.habit import HabitLog, HabitStats
+    from src.models.challenge import Challenge, ChallengeParticipant, ChallengeHabit
+
+    def create_history(suffix: str) -> tuple[str, str, str]:
+        user_id = client.post("/api/users", json={
+            **TEST_USER_DATA, "username": f"user{suffix}", "email": f"user{suffix}@example.com"
+        }).json()["id"]
+        client.post("/api/users/profiles", json={"user_id": user_id})
+        habit_id = client.post("/api/habits", json={
+            "user_id": user_id, "title": "Leer", "category": "Estudio", "goal_type": "daily", "goal_value": 1
+        }).json()["id"]
+        client.post("/api/habits/logs/batch", json={"items": [
+            {"habit_id": habit_id, "user_id": user_id, "log_date": f"2025-01-{day:02d}", "progress_value": 1,
+             "status": "completed"}
+            for day in range(1, 21)
+        ]})
+        challenge_id = client.post("/api/challenges", json={
+            "created_by": user_id, "title": "Reto", "start_date": "2025-01-01", "end_date": "2025-02-01"
+        }).json()["id"]
+        client.post("/api/challenges/participants", json={"challenge_id": challenge_id, "user_id": user_id})
+        client.post("/api/challenges/habits", json={"challenge_id": challenge_id, "habit_id": habit_id})
+        return user_id, habit_id, challenge_id
+
+    def count(model) -> int:
+        return session.exec(select(func.count()).select_from(model)).one()
+
+    tables = (User, UserProfile, Habit, HabitLog, HabitStats, Challenge, ChallengeParticipant, ChallengeHabit)
+    kept_user, kept_habit, _ = create_history("kept")
+    before = {model: count(model) for model in tables}
+    user_id, habit_id, challenge_id = create_history("gone")
+    assert client.get(f"/api/challenges/{challenge_id}/leaderboard").json()
+
+    assert client.delete(f"/api/users/{user_id}").status_code == 204
+    assert {model: count(model) for model in tables} == before
+    assert client.get(f"/api/users/{user_id}").status_code == 404
+    assert client.get(f"/api/challenges/{challenge_id}/leaderboard").json() == []
+    assert client.delete(f"/api/users/{user_id}").status_code == 404
+    assert client.delete(f"/api/habits/{habit_id}").status_code == 404
+
+    monkeypatch.setattr(Config, "PURGE_BACKGROUND_THRESHOLD", 10)
+    monkeypatch.setattr(Config, "PURGE_CHUNK_SIZE", 7)
+    assert client.delete(f"/api/habits/{kept_habit}").status_code == 202
+    assert session.exec(select(HabitLog).where(HabitLog.habit_id == UUID(kept_habit))).first() is None
+    assert client.get(f"/api/habits/{kept_habit}").status_code == 404
+    assert client.get(f"/api/users/{kept_user}").status_code == 200
+    # Por debajo del umbral el borrado es inmediato
+    assert client.delete(f"/api/users/{kept_user}").status_code == 204
+    assert count(User) == before[User] - 1
+
+    paths = app.openapi()["paths"]
+    for path in ("/api/users/{user_id}", "/api/habits/{habit_id}", "/api/challenges/{challenge_id}"):
+        assert set(paths[path]["delete"]["responses"]) >= {"202", "204"}
+
+
+def test_writes_use_a_single_returning_statement(client: TestClient, session: Session):
+    """
+    Las altas y ediciones devuelven la fila de `INSERT/UPDATE ... RETURNING` sin SELECT previo ni posterior,
+    conservando `updated_at`, el hash de la contraseña y el 404 de los ids inexistentes.
+    """
+    from src.models.habit import HabitLog
+
+    def queries(response) -> int:
+        return int(re.findall(r'desc="(\d+)', response.headers["server-timing"])[0])
+
+    user = client.post("/api/users", json=TEST_USER_DATA).json()
+    habit = client.post("/api/habits", json={
+        "user_id": user["id"], "title": "Leer", "category": "Estudio", "goal_type": "daily", "goal_value": 1
+    }).json()
+    log = client.post("/api/habits/logs", json={
+        "habit_id": habit["id"], "user_id": user["id"], "log_date": "2025-01-01", "progress_value": 1, "status": "pending"
+    }).json()
+
+    response = client.patch(f"/api/habits/logs/{log['id']}", json={"progress_value": 5})
+    assert queries(response) == 1
+    updated = response.json()
+    assert (updated["progress_value"], updated["status"], updated["created_at"]) == (5, "pending", log["created_at"])
+    assert updated["updated_at"] > log["updated_at"]
+    assert session.get(HabitLog, UUID(log["id"])).progress_value == 5
+
+    completed = client.patch(f"/api/habits/logs/{log['id']}", json={"progress_value": 100}).json()
+    assert completed["status"] == "completed"
+    assert client.get(f"/api/habits/{habit['id']}/stats").json()["completed_logs"] == 1
+
+    response = client.patch(f"/api/users/{user['id']}", json={"password": "otraclave123"})
+    assert queries(response) == 1
+    stored = session.exec(select(User.password).where(User.id == UUID(user["id"]))).one()
+    assert verify_password("otraclave123", stored)
+    assert client.post("/api/auth/login", json={"email": user["email"], "password": "otraclave123"}).status_code == 200
+
+    missing = "00000000-0000-0000-0000-000000000000"
+    assert client.patch(f"/api/habits/logs/{missing}", json={"progress_value": 2}).status_code == 404
+    assert client.patch(f"/api/habits/{missing}", json={"title": "Nada"}).status_code == 404
+    assert client.patch(f"/api/users/{missing}", json={"first_name": "Nadie"}).status_code == 404
+
+
+def test_unit_of_work_commits_once_and_nests_savepoints(client: TestClient, session: Session, tmp_path):
+    """
+    `POST /api/challenges/full` confirma el reto, sus hábitos y la inscripción en un solo commit;
+    un bloque anidado que falla solo deshace su SAVEPOINT y un fallo en el externo lo deshace todo.
+    """
+    from datetime import date
+    from fastapi import HTTPException
+    from sqlalchemy import event
+    from src.core.database import configure_sqlite, engine_options, unit_of_work
+    from src.models.challenge import Challenge, ChallengeParticipant
+    from src.schemas import ChallengeCreate, ChallengeParticipantCreate, ChallengeUpdate
+    from src.services import ChallengeParticipantService, ChallengeService
+
+    user_id = client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+    habit_ids = [
+        client.post("/api/habits", json={
+            "user_id": user_id, "title": title, "category": "Estudio", "goal_type": "daily", "goal_value": 1
+        }).json()["id"]
+        for title in ("Leer", "Correr")
+    ]
+    commits = []
+    count_commit = commits.append
+    event.listen(session, "after_commit", count_commit)
+    payload = {
+        "created_by": user_id, "title": "Reto", "start_date": "2025-01-01", "end_date": "2025-02-01",
+        "habits": [{"habit_id": habit_ids[0], "points_per_completion": 3}, {"habit_id": habit_ids[1]}]
+    }
+    response = client.post("/api/challenges/full", json=payload)
+    event.remove(session, "after_commit", count_commit)
+    assert response.status_code == 201
+    assert len(commits) == 1
+    challenge = response.json()
+    assert [habit["points_per_completion"] for habit in challenge["habits"]] == [3, 1]
+    assert [participant["user_id"] for participant in challenge["participants"]] == [user_id]
+    assert len(client.get(f"/api/challenges/{challenge['id']}/habits").json()) == 2
+    assert client.get(f"/api/challenges/{challenge['id']}/leaderboard").json()[0]["user_id"] == user_id
+
+    payload["habits"].append({"habit_id": "00000000-0000-0000-0000-000000000000"})
+    assert client.post("/api/challenges/full", json=payload).status_code == 404
+    assert len(client.get(f"/api/challenges/creator/{user_id}").json()) == 1
+
+    # SAVEPOINT reales sobre una base en fichero configurada como en producción
+    url = f"sqlite:///{tmp_path / 'uow.db'}"
+    file_engine = configure_sqlite(create_engine(url, **engine_options(url)))
+    SQLModel.metadata.create_all(file_engine)
+    data = ChallengeCreate(created_by=user_id, title="Anidado", start_date=date(2025, 1, 1), end_date=date(2025, 2, 1))
+    try:
+        with Session(file_engine) as uow_session:
+            challenges, participants = ChallengeService(uow_session), ChallengeParticipantService(uow_session)
+            with unit_of_work(uow_session):
+                kept = challenges.create_challenge(data)
+                with pytest.raises(ValueError):
+                    with unit_of_work(uow_session):
+                        participants.create_participant(ChallengeParticipantCreate(challenge_id=kept.id, user_id=user_id))
+                        raise ValueError("se deshace solo el SAVEPOINT")
+                challenges.update_challenge(kept.id, ChallengeUpdate(title="Anidado 2"))
+
+            with pytest.raises(HTTPException):
+                with unit_of_work(uow_session):
+                    challenges.create_challenge(data)
+                    challenges.update_challenge(UUID(int=0), ChallengeUpdate(title="Nada"))
+
+        with Session(file_engine) as check:
+            assert check.exec(select(Challenge.title)).all() == ["Anidado 2"]
+            assert check.exec(select(ChallengeParticipant)).all() == []
+    finally:
+        file_engine.dispose()
+
+
+def test_reads_go_to_replicas_with_read_your_writes(monkeypatch, tmp_path):
+    """
+    Con dos ficheros SQLite (primario y réplica) las escrituras van al primario y las lecturas a la
+    réplica, salvo para el cliente que acaba de escribir; las réplicas caídas se saltan.
+    """
+    import sqlite3
+    from datetime import timedelta
+    from starlette.requests import Request
+    from src.core import database
+    from src.core.config import Config
+    from src.core.security import create_access_token
+    from src.schemas.user import TokenData
+
+    primary, replica, down = tmp_path / "primary.db", tmp_path / "replica.db", tmp_path / "down"
+    down.mkdir()
+    monkeypatch.setattr(Config, "DB_URL", f"sqlite:///{primary}")
+    monkeypatch.setattr(Config, "DB_REPLICA_URLS", f"sqlite:///{down}, sqlite:///{replica}")
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(database, "_replica_router", None)
+    database.read_your_writes.clear()
+
+    def replicate():
+        with sqlite3.connect(primary) as source, sqlite3.connect(replica) as target:
+            source.backup(target)
+
+    try:
+        with TestClient(create_app({})) as routed:
+            replicate()
+            user_id = routed.post("/api/users", json=TEST_USER_DATA).json()["id"]
+            replica_reads = database.DB_READS.labels("replica").value
+
+            # El cliente que escribió lee del primario durante DB_READ_YOUR_WRITES_SECONDS
+            assert routed.get(f"/api/users/{user_id}").status_code == 200
+            assert database.DB_READS.labels("replica").value == replica_reads
+
+            # Otro cliente, o el mismo pasada la ventana, lee de la réplica, que aún no tiene el usuario
+            primary_checkouts = database.POOL_CHECKOUT_SECONDS.labels("sync").count
+            replica_checkouts = database.POOL_CHECKOUT_SECONDS.labels("replica1").count
+            other = create_access_token(TokenData(username="otrousuario", email="otro@example.com"), timedelta(minutes=5))
+            assert routed.get(f"/api/users/{user_id}", headers={"Authorization": f"Bearer {other}"}).status_code == 404
+            # Cada réplica tiene sus propias series de métricas del pool, separadas de las del primario
+            assert database.POOL_CHECKOUT_SECONDS.labels("sync").count == primary_checkouts
+            assert database.POOL_CHECKOUT_SECONDS.labels("replica1").count > replica_checkouts
+            assert database.POOL_CHECKED_OUT.labels("replica1").value == 0
+            # Detrás de un proxy de confianza cada cliente anónimo se distingue por X-Forwarded-For
+            monkeypatch.setattr(Config, "TRUSTED_PROXIES", "testclient")
+            assert routed.get(f"/api/users/{user_id}", headers={"X-Forwarded-For": "203.0.113.9"}).status_code == 404
+            monkeypatch.setattr(Config, "TRUSTED_PROXIES", "")
+            database.read_your_writes.clear()
+            assert routed.get(f"/api/users/{user_id}").status_code == 404
+            assert database.DB_READS.labels("replica").value == replica_reads + 3
+
+            replicate()
+            assert routed.get(f"/api/users/{user_id}").status_code == 200
+            assert routed.get("/api/users").json()[0]["id"] == user_id
+
+            router = database.get_replica_router()
+            assert [router.is_healthy(index) for index in range(2)] == [False, True]
+            assert [router.choose() for _ in range(3)] == [router.engines[1]] * 3
+    finally:
+        response_cache.clear()
+        database.read_your_writes.clear()
+
+    def request(peer: str, **headers: str) -> Request:
+        raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+        return Request({"type": "http", "headers": raw, "client": (peer, 1234)})
+
+    monkeypatch.setattr(Config, "TRUSTED_PROXIES", "10.0.0.1, 10.0.0.2")
+    forwarded = "198.51.100.1, 203.0.113.9, 10.0.0.2"
+    assert database.client_key(request("10.0.0.1", x_forwarded_for=forwarded)) == "ip:203.0.113.9"
+    assert database.client_key(request("192.0.2.5", x_forwarded_for=forwarded)) == "ip:192.0.2.5"
+    assert database.client_key(request("10.0.0.1", authorization="Bearer roto")) == "ip:10.0.0.1"
+    assert database.client_key(request("10.0.0.1", authorization=f"Bearer {other}")) == "user:otrousuario"
+
+    balanced = database.ReplicaRouter([database.get_engine(), create_engine(f"sqlite:///{replica}")], 60)
+    assert [balanced.choose() for _ in range(3)] == [balanced.engines[0], balanced.engines[1], balanced.engines[0]]
+    balanced.mark_down(balanced.engines[1])
+    assert [balanced.choose() for _ in range(2)] == [balanced.engines[0]] * 2
+    balanced.dispose()
+
+
+def test_leaderboard_cache_follows_committed_participants_only(tmp_path):
+    """
+    Las altas en una clasificación ya cacheada solo se reflejan al confirmar la transacción externa:
+    un SAVEPOINT deshecho o una unidad de trabajo fallida no dejan participantes fantasma.
+    """
+    from datetime import date
+    from uuid import uuid4
+    from src.core.database import configure_sqlite, engine_options, unit_of_work
+    from src.schemas import ChallengeCreate, ChallengeParticipantCreate
+    from src.services import ChallengeParticipantService, ChallengeService, LeaderboardService
+    from src.services.challenge import leaderboard_cache
+
+    url = f"sqlite:///{tmp_path / 'leaderboard.db'}"
+    file_engine = configure_sqlite(create_engine(url, **engine_options(url)))
+    SQLModel.metadata.create_all(file_engine)
+    creator, joined, rolled_back, failed = uuid4(), uuid4(), uuid4(), uuid4()
+    try:
+        with Session(file_engine) as uow_session:
+            participants, leaderboard = ChallengeParticipantService(uow_session), LeaderboardService(uow_session)
+            challenge = ChallengeService(uow_session).create_challenge(ChallengeCreate(
+                created_by=creator, title="Reto", start_date=date(2025, 1, 1), end_date=date(2025, 2, 1)
+            ))
+
+            def enroll(user_id: UUID) -> None:
+                participants.create_participant(ChallengeParticipantCreate(challenge_id=challenge.id, user_id=user_id))
+
+            def ranked() -> set[UUID]:
+                return {entry.user_id for entry in leaderboard.get_top(challenge.id, 10)}
+
+            enroll(creator)
+            assert ranked() == {creator} and challenge.id in leaderboard_cache._data
+
+            with unit_of_work(uow_session):
+                enroll(joined)
+                with pytest.raises(ValueError):
+                    with unit_of_work(uow_session):
+                        enroll(rolled_back)
+                        raise ValueError("se deshace el SAVEPOINT")
+                assert ranked() == {creator}
+            assert ranked() == {creator, joined}
+
+            with pytest.raises(ValueError):
+                with unit_of_work(uow_session):
+                    enroll(failed)
+                    raise ValueError("se deshace todo")
+            assert ranked() == {creator, joined}
+    finally:
+        leaderboard_cache.clear()
+        file_engine.dispose()
+
+
+def test_sqlite_sessions_that_read_then_write_wait_for_the_lock(tmp_path):
+    """
+    Con dos conexiones a un fichero WAL, una sesión que lee y luego escribe mientras otra confirma
+    espera al bloqueo (`BEGIN IMMEDIATE` + `busy_timeout`) en lugar de fallar con `database is locked`,
+    y una sesión de solo lectura (`BEGIN DEFERRED`) no retrasa a los escritores.
+    """
+    import threading
+    import time
+    from sqlalchemy import text
+    from src.core.database import SQLITE_BEGIN, configure_sqlite, engine_options
+
+    url = f"sqlite:///{tmp_path / 'locks.db'}"
+    file_engine = configure_sqlite(create_engine(url, **engine_options(url)))
+    with Session(file_engine) as setup:
+        setup.execute(text("CREATE TABLE counter (value INTEGER NOT NULL)"))
+        setup.execute(text("INSERT INTO counter VALUES (0)"))
+        setup.commit()
+
+    def increment(session: Session) -> None:
+        value = session.execute(text("SELECT value FROM counter")).scalar_one()
+        session.execute(text("UPDATE counter SET value = :value"), {"value": value + 1})
+        session.commit()
+
+    errors = []
+
+    def concurrent_increment():
+        try:
+            with Session(file_engine) as other:
+                increment(other)
+        except Exception as error:
+            errors.append(error)
+
+    try:
+        with Session(file_engine) as first:
+            value = first.execute(text("SELECT value FROM counter")).scalar_one()
+            writer = threading.Thread(target=concurrent_increment)
+            writer.start()
+            time.sleep(0.2)
+            first.execute(text("UPDATE counter SET value = :value"), {"value": value + 1})
+            first.commit()
+            writer.join()
+        assert errors == []
+
+        with Session(file_engine.execution_options(**{SQLITE_BEGIN: "DEFERRED"})) as reader:
+            reader.execute(text("SELECT value FROM counter")).scalar_one()
+            start = time.perf_counter()
+            with Session(file_engine) as writer_session:
+                increment(writer_session)
+            assert time.perf_counter() - start < 1
+
+        with Session(file_engine) as check:
+            assert check.execute(text("SELECT value FROM counter")).scalar_one() == 3
+    finally:
+        file_engine.dispose()
+
+
+def test_response_cache_invalidation_follows_the_outer_commit(monkeypatch, tmp_path):
+    """
+    Las respuestas cacheadas se invalidan al confirmar la transacción externa, no al liberar un
+    SAVEPOINT, y un SAVEPOINT deshecho no descarta las filas escritas antes de abrirlo.
+    """
+    from src.core import database
+    from src.core.config import Config
+    from src.core.database import unit_of_work
+    from src.schemas import HabitUpdate
+    from src.services import HabitService
+
+    monkeypatch.setattr(Config, "DB_URL", f"sqlite:///{tmp_path / 'uow_cache.db'}")
+    monkeypatch.setattr(database, "_engine", None)
+    try:
+        with TestClient(create_app({})) as file_client:
+            user_id = file_client.post("/api/users", json=TEST_USER_DATA).json()["id"]
+            habit_id = file_client.post("/api/habits", json={
+                "user_id": user_id, "title": "Leer", "category": "Estudio", "goal_type": "daily", "goal_value": 1
+            }).json()["id"]
+            assert file_client.get(f"/api/habits/{habit_id}").json()["title"] == "Leer"
+
+            with Session(database.get_engine()) as uow_session:
+                habits = HabitService(uow_session)
+                with unit_of_work(uow_session):
+                    habits.update_habit(UUID(habit_id), HabitUpdate(title="Escribir"))
+                    generation = response_cache.generation
+                    with unit_of_work(uow_session):
+                        habits.update_habit(UUID(habit_id), HabitUpdate(category="Ocio"))
+                    assert response_cache.generation == generation
+                    with pytest.raises(ValueError):
+                        with unit_of_work(uow_session):
+                            habits.update_habit(UUID(habit_id), HabitUpdate(title="Deshecho"))
+                            raise ValueError("se deshace solo el SAVEPOINT")
+                    assert response_cache.generation == generation
+
+            habit = file_client.get(f"/api/habits/{habit_id}").json()
+            assert (habit["title"], habit["category"]) == ("Escribir", "Ocio")
+    finally:
+        response_cache.clear()